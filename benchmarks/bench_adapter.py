@@ -0,0 +1,198 @@
+#!/usr/bin/python3
+
+# End to end benchmark of adapterProcess against the simulated household in sonossim.  For each household size the
+# adapter is started the way sofabase starts it and three things are measured:
+#
+#   ready     discovery to every player set up and subscribed (startSonosConnection)
+#   events    a player state change to the update reaching dataset.ingest, one at a time and as a burst from all players
+#   commands  round trip of a SOAP command sent through the adapter's per player lanes, one at a time and all at once,
+#             and a relative volume change for the whole household through the batch operations
+#
+# The adapter runs against sofabase when it is on the path, and otherwise against the minimal stand-ins in
+# benchmarks/standins.  Results are written as json so runs can be compared over time.
+#
+#   python3 benchmarks/bench_adapter.py --players 1 10 50 --group-size 5 --output results.json
+
+import sys, os
+sys.path.append(os.path.join(os.path.dirname(__file__),'..'))
+try:
+    import sofabase
+except ImportError:
+    sys.path.append(os.path.join(os.path.dirname(__file__),'standins'))
+
+import argparse
+import asyncio
+import json
+import logging
+import platform
+import statistics
+import time
+import types
+
+import sonos
+from sonossim import simulatedHousehold
+
+
+def summarize(samples):
+    samples=sorted(samples)
+    if not samples:
+        return {}
+    return {'count': len(samples), 'mean_ms': round(statistics.mean(samples)*1000, 3), 'p50_ms': round(samples[len(samples)//2]*1000, 3),
+            'p95_ms': round(samples[min(len(samples)-1, int(len(samples)*.95))]*1000, 3), 'max_ms': round(samples[-1]*1000, 3)}
+
+
+def merge(target, update):
+    for key, value in update.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            merge(target[key], value)
+        else:
+            target[key]=value
+
+
+class ingestRecorder(object):
+
+    # The end of the pipeline in place of the sofabase dataset.  Ingests are merged into nativeDevices, which is all the
+    # adapter reads back, and every ingest is checked against the changes the benchmark is waiting for.
+
+    def __init__(self):
+        self.nativeDevices={}
+        self.ingests=0
+        self.waiting=[]
+
+    async def ingest(self, data, overwriteLevel=None):
+        self.ingests+=1
+        if overwriteLevel==None:
+            merge(self.nativeDevices, data)
+        arrived=time.perf_counter()
+        for check, future in list(self.waiting):
+            if not future.done() and check(data):
+                future.set_result(arrived)
+                self.waiting.remove((check, future))
+
+    def waitFor(self, check):
+        future=asyncio.get_event_loop().create_future()
+        self.waiting.append((check, future))
+        return future
+
+
+def volumeIngested(uid, volume):
+    def check(data):
+        try:
+            return data['player'][uid]['RenderingControl']['volume']['Master']==str(volume)
+        except (KeyError, TypeError):
+            return False
+    return check
+
+
+def adapterConfig(addresses, web_port):
+    # the adapter_config defaults, pointed at the simulated players
+    return types.SimpleNamespace(players=addresses, event_mode='gena', event_address='', web_port=web_port, soco_workers=8, setup_concurrency=8,
+                                    discovery='manual', discovery_interval=60, discovery_timeout=3, health_backoff=2, health_backoff_max=300,
+                                    actions_max_age=600, art_connections=2, art_cache_bytes=32*1024*1024, art_cache_dir='',
+                                    art_disk_bytes=256*1024*1024, art_retry_delay=60, art_workers=2, art_prefetch_depth=3,
+                                    soap_connections=2, soap_timeout=5, art_base_url='')
+
+
+async def waitUntil(condition, timeout=60):
+    started=time.perf_counter()
+    while not condition():
+        if time.perf_counter()-started>timeout:
+            raise TimeoutError()
+        await asyncio.sleep(.005)
+
+
+async def run(count, network, web_port, samples, log, groupsize=1):
+    household=simulatedHousehold(count, network=network, groupsize=groupsize)
+    await household.start()
+    dataset=ingestRecorder()
+    adapter=sonos.sonos.adapterProcess(log=log, loop=asyncio.get_event_loop(), dataset=dataset, config=adapterConfig(household.addresses, web_port))
+    adapter.running=True
+    result={}
+    task=None
+    try:
+        started=time.perf_counter()
+        task=asyncio.ensure_future(adapter.start())
+        await waitUntil(lambda: not adapter.connect_needed or task.done())
+        result['ready']={'seconds': round(time.perf_counter()-started, 3), 'players_ready': len(adapter.registry),
+                            'subscriptions': len(adapter.subscriptions), 'discovery_seconds': round(adapter.stats['discovery_seconds'], 3)}
+        # let the initial events from every subscription settle before timing anything
+        await asyncio.sleep(.5)
+
+        volumes={ player.uid: player.volume for player in household.players }
+        def nextVolume(player):
+            volumes[player.uid]=(volumes[player.uid]+1) % 100
+            return volumes[player.uid]
+
+        latencies=[]
+        for sample in range(samples):
+            player=household.players[sample % count]
+            volume=nextVolume(player)
+            arrived=dataset.waitFor(volumeIngested(player.uid, volume))
+            sent=time.perf_counter()
+            await player.setVolume(volume)
+            latencies.append(await asyncio.wait_for(arrived, 10)-sent)
+        burst=[]
+        for sample in range(max(1, samples//count)):
+            waits=[dataset.waitFor(volumeIngested(player.uid, nextVolume(player))) for player in household.players]
+            sent=time.perf_counter()
+            await asyncio.gather(*[player.setVolume(volumes[player.uid]) for player in household.players])
+            burst.append(max(await asyncio.wait_for(asyncio.gather(*waits), 10))-sent)
+        result['events']={'single': summarize(latencies), 'burst_all_players': summarize(burst)}
+
+        players=list(adapter.registry)
+        roundtrips=[]
+        for sample in range(samples):
+            player=players[sample % len(players)]
+            sent=time.perf_counter()
+            await adapter.runPlayer(player, setattr, player, 'volume', sample % 100)
+            roundtrips.append(time.perf_counter()-sent)
+        concurrent=[]
+        for sample in range(max(1, samples//count)):
+            sent=time.perf_counter()
+            await asyncio.gather(*[adapter.runPlayer(player, player.play) for player in players])
+            concurrent.append(time.perf_counter()-sent)
+        batch=[]
+        for sample in range(max(1, samples//count)):
+            sent=time.perf_counter()
+            await adapter.batchRelativeVolume(players, 1 if sample % 2 else -1)
+            batch.append(time.perf_counter()-sent)
+        result['commands']={'single': summarize(roundtrips), 'all_players': summarize(concurrent), 'batch_volume': summarize(batch)}
+        result['ingests']=dataset.ingests
+        result['soap_actions']=household.stats
+        result['stages']=adapter.metrics.snapshot()['stages']
+    finally:
+        adapter.running=False
+        if adapter.eventqueue:
+            adapter.eventqueue.put_nowait(None)
+        try:
+            # start() stops the adapter once processEvents sees running go false
+            await asyncio.wait_for(task, 10)
+        except (asyncio.TimeoutError, TypeError):
+            await adapter.stop()
+        await household.stop()
+    return result
+
+
+async def main(args):
+    log=logging.getLogger('sonos.bench')
+    results={'python': platform.python_version(), 'started': time.strftime('%Y-%m-%dT%H:%M:%S'), 'samples': args.samples, 'group_size': args.group_size, 'players': {}}
+    for run_number, count in enumerate(args.players):
+        # every run gets its own addresses, so soco's per address caches from the last run do not help
+        results['players'][count]=await run(count, '127.0.%s.' % (run_number+1), args.web_port, args.samples, log, groupsize=args.group_size)
+    return results
+
+
+if __name__ == '__main__':
+    parser=argparse.ArgumentParser()
+    parser.add_argument('--players', type=int, nargs='+', default=[1, 10, 50])
+    parser.add_argument('--samples', type=int, default=100)
+    parser.add_argument('--group-size', type=int, default=1)
+    parser.add_argument('--web-port', type=int, default=14010)
+    parser.add_argument('--output')
+    args=parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+    results=asyncio.get_event_loop().run_until_complete(main(args))
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2)
@@ -0,0 +1,95 @@
+#!/usr/bin/python3
+
+# Micro-benchmark of GENA event decoding: soco's parse_event_xml followed by the adapter's old unpackEvent against
+# the single pass decodeEvent, on the recorded NOTIFY bodies in benchmarks/payloads.  Both results are compared
+# before timing, so the benchmark fails if the decoder output ever drifts from the old shape.
+#
+#   python3 benchmarks/bench_decoder.py --number 2000
+
+import sys, os
+sys.path.append(os.path.join(os.path.dirname(__file__),'..'))
+
+import argparse
+import glob
+import json
+import timeit
+import xml.etree.ElementTree as et
+from collections import defaultdict
+
+import soco
+from soco.events_base import parse_event_xml
+
+from sonosevents import decodeEvent
+
+# soco memoizes parse_event_xml, which would time dict lookups on a repeated body rather than parsing.  Bodies from
+# real players differ from one event to the next, so the uncached function is measured.
+parse_event_xml=getattr(parse_event_xml, '__wrapped__', parse_event_xml)
+
+
+# The decoding as it was written in adapterProcess before decodeEvent existed
+def etree_to_dict(t):
+    d = {t.tag: {} if t.attrib else None}
+    children = list(t)
+    if children:
+        dd = defaultdict(list)
+        for dc in map(etree_to_dict, children):
+            for k, v in dc.items():
+                dd[k].append(v)
+        d = {t.tag: {k: v[0] if len(v) == 1 else v for k, v in dd.items()}}
+    if t.attrib:
+        d[t.tag].update(('@' + k, v) for k, v in t.attrib.items())
+    if t.text:
+        text = t.text.strip()
+        if children or t.attrib:
+            if text:
+                d[t.tag]['#text'] = text
+        else:
+            d[t.tag] = text
+    return d
+
+def didlunpack(didl):
+    if str(type(didl)).lower().find('didl')>-1:
+        didl=didl.to_dict()
+        for item in didl:
+            didl[item]=didlunpack(didl[item])
+    elif type(didl)==list:
+        for i, item in enumerate(didl):
+            didl[i]=didlunpack(item)
+    elif type(didl)==dict:
+        for item in didl:
+            didl[item]=didlunpack(didl[item])
+    return didl
+
+def unpackEvent(variables):
+    eventVars={}
+    for item in variables:
+        eventVars[item]=didlunpack(variables[item])
+        if isinstance(eventVars[item], soco.exceptions.SoCoFault):
+            eventVars[item]={}
+        elif str(eventVars[item])[:1]=="<":
+            eventVars[item]=etree_to_dict(et.fromstring(str(eventVars[item])))
+    return eventVars
+
+def legacyDecode(body):
+    return unpackEvent(parse_event_xml(body))
+
+
+def run(path, number):
+    with open(path, 'rb') as payload:
+        body=payload.read()
+    legacy=legacyDecode(body)
+    decoded, elements=decodeEvent(body)
+    if legacy!=decoded:
+        raise AssertionError('decodeEvent output differs from unpackEvent for %s' % os.path.basename(path))
+    legacytime=min(timeit.repeat(lambda: legacyDecode(body), number=number, repeat=5))/number
+    decodedtime=min(timeit.repeat(lambda: decodeEvent(body), number=number, repeat=5))/number
+    return {'bytes': len(body), 'variables': len(decoded), 'legacy_us': round(legacytime*1e6, 1), 'decoder_us': round(decodedtime*1e6, 1),
+            'speedup': round(legacytime/decodedtime, 1)}
+
+
+if __name__ == '__main__':
+    parser=argparse.ArgumentParser()
+    parser.add_argument('--number', type=int, default=1000)
+    parser.add_argument('payloads', nargs='*', default=sorted(glob.glob(os.path.join(os.path.dirname(__file__), 'payloads', '*.xml'))))
+    args=parser.parse_args()
+    print(json.dumps({ os.path.basename(path): run(path, args.number) for path in args.payloads }, indent=2))
@@ -0,0 +1,84 @@
+#!/usr/bin/python3
+
+# Micro-benchmark of player lookups: the old linear scans over adapterProcess.players against playerRegistry.
+#
+#   python3 benchmarks/bench_registry.py --players 60
+
+import sys, os
+sys.path.append(os.path.join(os.path.dirname(__file__),'..'))
+
+import argparse
+import json
+import random
+import timeit
+from collections import namedtuple
+
+from sonostopology import playerRegistry, zoneTopology
+
+fakePlayer=namedtuple('fakePlayer', ['uid', 'player_name', 'ip_address'])
+fakeDevice=namedtuple('fakeDevice', ['endpointId'])
+
+
+def makeHousehold(count, groupsize=3):
+    players=[fakePlayer('RINCON_%012X01400' % i, 'Room %s' % i, '10.0.%s.%s' % (i//250, i%250+1)) for i in range(count)]
+    groups=[]
+    for start in range(0, count, groupsize):
+        members=players[start:start+groupsize]
+        groups.append('<ZoneGroup Coordinator="%s" ID="%s:1">%s</ZoneGroup>' % (members[0].uid, members[0].uid,
+                        ''.join('<ZoneGroupMember UUID="%s" ZoneName="%s" Location="http://%s:1400/xml/device_description.xml"/>' % (p.uid, p.player_name, p.ip_address) for p in members)))
+    zgs='<ZoneGroupState><ZoneGroups>%s</ZoneGroups></ZoneGroupState>' % ''.join(groups)
+    return players, zgs
+
+
+# The lookups as they were written before the registry existed
+def scanPlayer(players, device):
+    for player in players:
+        if 'sonos:player:%s' % player.uid==device.endpointId:
+            return player
+
+def scanCoordinator(players, coordinators, device):
+    for player in players:
+        if 'sonos:player:%s' % player.uid==device.endpointId:
+            if player.uid!=coordinators[player.uid]:
+                for other in players:
+                    if other.uid==coordinators[player.uid]:
+                        return other
+            return player
+
+def scanByName(players, name):
+    for player in players:
+        if player.player_name==name or player.uid==name:
+            return player
+
+
+def run(count, number):
+    players, zgs=makeHousehold(count)
+    topology=zoneTopology()
+    topology.update(zgs)
+    registry=playerRegistry(topology)
+    registry.set(players)
+    coordinators={ uid: topology.coordinator(uid) for uid in topology.players }
+    rng=random.Random(1)
+    devices=[fakeDevice('sonos:player:%s' % rng.choice(players).uid) for i in range(number)]
+    names=[rng.choice(players).player_name for i in range(number)]
+
+    cases={
+        'getPlayer': (lambda: [scanPlayer(players, d) for d in devices], lambda: [registry.byEndpointId(d.endpointId) for d in devices]),
+        'getPlayerOrCoordinator': (lambda: [scanCoordinator(players, coordinators, d) for d in devices],
+                                   lambda: [registry.coordinator(registry.byEndpointId(d.endpointId)) for d in devices]),
+        'getGroupName': (lambda: [scanByName(players, n) for n in names], lambda: [registry.byName(n) for n in names]),
+    }
+    results={}
+    for name, (scan, indexed) in cases.items():
+        scantime=min(timeit.repeat(scan, number=1, repeat=5))/number
+        indexedtime=min(timeit.repeat(indexed, number=1, repeat=5))/number
+        results[name]={'scan_us': round(scantime*1e6, 3), 'registry_us': round(indexedtime*1e6, 3), 'speedup': round(scantime/indexedtime, 1)}
+    return results
+
+
+if __name__ == '__main__':
+    parser=argparse.ArgumentParser()
+    parser.add_argument('--players', type=int, nargs='+', default=[12, 50, 100])
+    parser.add_argument('--lookups', type=int, default=10000)
+    args=parser.parse_args()
+    print(json.dumps({ count: run(count, args.lookups) for count in args.players }, indent=2))
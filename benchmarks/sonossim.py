@@ -0,0 +1,559 @@
+#!/usr/bin/python3
+
+# Local stand-in for a household of Sonos players, so the adapter can be exercised without real speakers.  Every
+# simulated player binds its own loopback address on port 1400 (soco always talks to port 1400) and answers the UPnP
+# SOAP actions the adapter uses, GENA SUBSCRIBE/UNSUBSCRIBE with NOTIFY delivery, the device description and /getaa
+# album art.  Linux routes all of 127.0.0.0/8 to the loopback interface; elsewhere the addresses need aliasing first.
+#
+#   python3 benchmarks/sonossim.py --players 10
+
+import argparse
+import asyncio
+import itertools
+import os
+import urllib.parse
+import xml.etree.ElementTree as et
+from xml.sax.saxutils import escape, quoteattr
+
+import aiohttp
+from aiohttp import web
+
+household_id='Sonos_SimulatedHousehold00000001'
+software_version='78.1-52020'
+soap_envelope=('<?xml version="1.0"?><s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/" '
+                's:encodingStyle="http://schemas.xmlsoap.org/soap/encoding/"><s:Body>%s</s:Body></s:Envelope>')
+soap_fault=('<s:Fault><faultcode>s:Client</faultcode><faultstring>UPnPError</faultstring><detail>'
+            '<UPnPError xmlns="urn:schemas-upnp-org:control-1-0"><errorCode>%s</errorCode></UPnPError></detail></s:Fault>')
+didl_namespaces=('xmlns:dc="http://purl.org/dc/elements/1.1/" xmlns:upnp="urn:schemas-upnp-org:metadata-1-0/upnp/" '
+                    'xmlns:r="urn:schemas-rinconnetworks-com:metadata-1-0/" xmlns="urn:schemas-upnp-org:metadata-1-0/DIDL-Lite/"')
+device_description=('<?xml version="1.0" encoding="utf-8"?><root xmlns="urn:schemas-upnp-org:device-1-0"><specVersion><major>1</major>'
+                    '<minor>0</minor></specVersion><device><deviceType>urn:schemas-upnp-org:device:ZonePlayer:1</deviceType>'
+                    '<friendlyName>%(ip)s - Sonos One (simulated)</friendlyName><manufacturer>Sonos, Inc.</manufacturer>'
+                    '<modelNumber>S18</modelNumber><modelName>Sonos One</modelName><softwareVersion>%(version)s</softwareVersion>'
+                    '<hardwareVersion>1.16.4.1-2.0</hardwareVersion><serialNum>%(serial)s</serialNum><UDN>uuid:%(uid)s</UDN>'
+                    '<iconList><icon><mimetype>image/png</mimetype><width>48</width><height>48</height><depth>24</depth>'
+                    '<url>/img/icon-S18.png</url></icon></iconList><displayVersion>15.9</displayVersion><roomName>%(name)s</roomName>'
+                    '</device></root>')
+
+# in arguments of every action the players answer, which is also what the served SCPD documents describe
+instance=['InstanceID']
+service_actions={
+    'DeviceProperties': {'GetHouseholdID': [], 'GetZoneAttributes': []},
+    'ZoneGroupTopology': {'GetZoneGroupState': [], 'GetZoneGroupAttributes': []},
+    'AVTransport': {'GetTransportInfo': instance, 'GetTransportSettings': instance, 'GetCurrentTransportActions': instance,
+                    'GetPositionInfo': instance, 'GetMediaInfo': instance, 'Play': instance+['Speed'], 'Pause': instance, 'Stop': instance,
+                    'Next': instance, 'Previous': instance, 'Seek': instance+['Unit', 'Target'], 'SetPlayMode': instance+['NewPlayMode'],
+                    'SetAVTransportURI': instance+['CurrentURI', 'CurrentURIMetaData'], 'BecomeCoordinatorOfStandaloneGroup': instance},
+    'RenderingControl': {'GetVolume': instance+['Channel'], 'SetVolume': instance+['Channel', 'DesiredVolume'],
+                    'SetRelativeVolume': instance+['Channel', 'Adjustment'], 'GetMute': instance+['Channel'], 'SetMute': instance+['Channel', 'DesiredMute'],
+                    'GetBass': instance, 'SetBass': instance+['DesiredBass'], 'GetTreble': instance, 'SetTreble': instance+['DesiredTreble'],
+                    'GetLoudness': instance+['Channel'], 'SetLoudness': instance+['Channel', 'DesiredLoudness']},
+    'GroupRenderingControl': {'GetGroupVolume': instance, 'SetGroupVolume': instance+['DesiredVolume'], 'SetRelativeGroupVolume': instance+['Adjustment'],
+                    'GetGroupMute': instance, 'SetGroupMute': instance+['DesiredMute'], 'SnapshotGroupVolume': instance},
+    'ContentDirectory': {'Browse': ['ObjectID', 'BrowseFlag', 'Filter', 'StartingIndex', 'RequestedCount', 'SortCriteria']},
+}
+
+event_namespaces={'AVTransport': 'urn:schemas-upnp-org:metadata-1-0/AVT/', 'RenderingControl': 'urn:schemas-upnp-org:metadata-1-0/RCS/'}
+transport_actions={'PLAYING': 'Set, Stop, Pause, Next, Previous, X_DLNA_SeekTime, X_DLNA_SeekTrackNr',
+                    'PAUSED_PLAYBACK': 'Set, Stop, Play, Next, Previous, X_DLNA_SeekTime, X_DLNA_SeekTrackNr',
+                    'STOPPED': 'Set, Play, Next, Previous, X_DLNA_SeekTime, X_DLNA_SeekTrackNr'}
+
+
+class upnpError(Exception):
+
+    def __init__(self, code):
+        self.code=code
+
+
+def makeCatalog(count=24):
+
+    tracks=[]
+    for number in range(count):
+        uri='x-sonos-http:librarytrack%%3ai.%06d.mp4?sid=204&flags=8224&sn=1' % number
+        tracks.append({ 'uri': uri, 'title': 'Track %s' % number, 'creator': 'Artist %s' % (number % 5), 'album': 'Album %s' % (number % 7),
+                        'album_art_uri': '/getaa?s=1&u=%s' % urllib.parse.quote(uri, safe=''), 'duration': '0:03:%02d' % (10+number) })
+    return tracks
+
+
+def trackDidl(track, item_id='-1', parent_id='-1'):
+
+    return ('<DIDL-Lite %s><item id=%s parentID=%s restricted="true"><res protocolInfo="sonos.com-http:*:audio/mp4:*" duration="%s">%s</res>'
+            '<upnp:albumArtURI>%s</upnp:albumArtURI><dc:title>%s</dc:title><upnp:class>object.item.audioItem.musicTrack</upnp:class>'
+            '<dc:creator>%s</dc:creator><upnp:album>%s</upnp:album></item></DIDL-Lite>') % (didl_namespaces, quoteattr(item_id), quoteattr(parent_id),
+            track['duration'], escape(track['uri']), escape(track['album_art_uri']), escape(track['title']), escape(track['creator']), escape(track['album']))
+
+
+def scpdDocument(service_id):
+
+    actions=service_actions.get(service_id, {})
+    names=sorted(set(name for arguments in actions.values() for name in arguments))
+    return ('<?xml version="1.0" encoding="utf-8"?><scpd xmlns="urn:schemas-upnp-org:service-1-0"><specVersion><major>1</major><minor>0</minor></specVersion>'
+            '<actionList>%s</actionList><serviceStateTable>%s</serviceStateTable></scpd>') % (
+            ''.join('<action><name>%s</name><argumentList>%s</argumentList></action>' % (action, ''.join(
+                '<argument><name>%s</name><direction>in</direction><relatedStateVariable>A_ARG_TYPE_%s</relatedStateVariable></argument>' % (name, name)
+                for name in arguments)) for action, arguments in actions.items()),
+            ''.join('<stateVariable sendEvents="no"><name>A_ARG_TYPE_%s</name><dataType>string</dataType></stateVariable>' % name for name in names))
+
+
+def propertySet(variables):
+
+    return ('<e:propertyset xmlns:e="urn:schemas-upnp-org:event-1-0">%s</e:propertyset>' %
+            ''.join('<e:property><%s>%s</%s></e:property>' % (name, escape(str(value)), name) for name, value in variables))
+
+
+def lastChange(service_id, variables):
+
+    # LastChange values are xml inside an attribute inside xml, hence the double escaping
+    inner=''.join('<%s%s val=%s/>' % (name, ' channel="%s"' % channel if channel else '', quoteattr(str(value))) for name, channel, value in variables)
+    event='<Event xmlns="%s" xmlns:r="urn:schemas-rinconnetworks-com:metadata-1-0/"><InstanceID val="0">%s</InstanceID></Event>' % (event_namespaces[service_id], inner)
+    return propertySet([('LastChange', event)])
+
+
+class simulatedPlayer(object):
+
+    def __init__(self, household, index, ip):
+        self.household=household
+        self.index=index
+        self.ip=ip
+        self.uid='RINCON_5CAAFD%06X01400' % index
+        self.name='Room %s' % index
+        self.coordinator=self
+        # subs, surrounds and bridges are members of a group but not rooms of their own
+        self.invisible=False
+        self.volume=20
+        self.mute=0
+        self.bass=0
+        self.treble=0
+        self.loudness=1
+        self.transport_state='STOPPED'
+        self.play_mode='NORMAL'
+        self.track=0
+        self.subscriptions={}
+        self.runner=None
+        self.stats={'commands': 0, 'notifies': 0, 'art': 0}
+        self.app=web.Application()
+        self.app.router.add_get('/xml/device_description.xml', self.handleDescription)
+        self.app.router.add_get('/xml/{service}1.xml', self.handleScpd)
+        self.app.router.add_get('/getaa', self.handleArt)
+        self.app.router.add_post('/{path:.*}/Control', self.handleControl)
+        self.app.router.add_route('SUBSCRIBE', '/{path:.*}/Event', self.handleSubscribe)
+        self.app.router.add_route('UNSUBSCRIBE', '/{path:.*}/Event', self.handleUnsubscribe)
+
+    @property
+    def members(self):
+        return [player for player in self.household.players if player.coordinator is self.coordinator]
+
+    @property
+    def current(self):
+        return self.household.catalog[self.coordinator.track]
+
+    async def start(self):
+        self.runner=web.AppRunner(self.app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.ip, self.household.port).start()
+
+    async def stop(self):
+        if self.runner:
+            await self.runner.cleanup()
+            self.runner=None
+
+    # Event bodies, built from the current state the way a player sends them
+
+    def eventBody(self, service_id, names=None):
+        if service_id=='AVTransport':
+            return lastChange(service_id, self.transportVariables(names))
+        if service_id=='RenderingControl':
+            return lastChange(service_id, self.renderingVariables(names))
+        if service_id=='GroupRenderingControl':
+            return propertySet([('GroupVolume', self.groupVolume()), ('GroupMute', self.groupMute()), ('GroupVolumeChangeable', 1)])
+        if service_id=='ZoneGroupTopology':
+            return propertySet([('ZoneGroupState', self.household.zoneGroupState()), ('ZoneGroupName', self.coordinator.name),
+                                ('ZoneGroupID', '%s:%s' % (self.coordinator.uid, self.household.generation)),
+                                ('ZonePlayerUUIDsInGroup', ','.join(member.uid for member in self.members))])
+        if service_id=='DeviceProperties':
+            return propertySet([('ZoneName', self.name), ('Icon', 'x-rincon-roomicon:living'), ('Invisible', int(self.invisible)), ('IsZoneBridge', 0),
+                                ('Configuration', 1), ('ChannelMapSet', ''), ('HTSatChanMapSet', ''), ('MicEnabled', 0), ('AirPlayEnabled', 1)])
+        return propertySet([])
+
+    def transportVariables(self, names=None):
+        coordinator=self.coordinator
+        track=self.current
+        variables=[ ('TransportState', None, coordinator.transport_state), ('CurrentPlayMode', None, coordinator.play_mode),
+                    ('NumberOfTracks', None, len(self.household.catalog)), ('CurrentTrack', None, coordinator.track+1),
+                    ('CurrentTrackURI', None, track['uri']), ('CurrentTrackDuration', None, track['duration']),
+                    ('CurrentTrackMetaData', None, trackDidl(track)), ('AVTransportURI', None, 'x-rincon-queue:%s#0' % coordinator.uid),
+                    ('AVTransportURIMetaData', None, ''), ('CurrentTransportActions', None, transport_actions[coordinator.transport_state]),
+                    ('TransportStatus', None, 'OK') ]
+        return [variable for variable in variables if names is None or variable[0] in names]
+
+    def renderingVariables(self, names=None):
+        variables=[ ('Volume', 'Master', self.volume), ('Volume', 'LF', 100), ('Volume', 'RF', 100), ('Mute', 'Master', self.mute),
+                    ('Bass', None, self.bass), ('Treble', None, self.treble), ('Loudness', 'Master', self.loudness), ('OutputFixed', None, 0) ]
+        return [variable for variable in variables if names is None or variable[0] in names]
+
+    def groupVolume(self):
+        members=self.members
+        return round(sum(member.volume for member in members)/len(members))
+
+    def groupMute(self):
+        return int(all(member.mute for member in self.members))
+
+    # GENA
+
+    async def handleSubscribe(self, request):
+        service_id=request.match_info['path'].rsplit('/', 1)[-1]
+        timeout=request.headers.get('TIMEOUT', 'Second-1800')
+        sid=request.headers.get('SID')
+        if sid:
+            if sid not in self.subscriptions:
+                return web.Response(status=412)
+            return web.Response(status=200, headers={'SID': sid, 'TIMEOUT': timeout})
+        callback=request.headers.get('CALLBACK', '').strip('<>')
+        if not callback or request.headers.get('NT')!='upnp:event':
+            return web.Response(status=412)
+        sid='uuid:%s_sub%010d' % (self.uid, next(self.household.sids))
+        self.subscriptions[sid]={'service': service_id, 'callback': callback, 'seq': itertools.count(), 'lock': asyncio.Lock()}
+        # like a real player, the initial event usually races the SUBSCRIBE response
+        asyncio.ensure_future(self.notifySubscription(sid, self.eventBody(service_id)))
+        return web.Response(status=200, headers={'SID': sid, 'TIMEOUT': timeout, 'Server': 'Linux UPnP/1.0 Sonos/%s' % software_version})
+
+    async def handleUnsubscribe(self, request):
+        if self.subscriptions.pop(request.headers.get('SID'), None) is None:
+            return web.Response(status=412)
+        return web.Response(status=200)
+
+    async def notifySubscription(self, sid, body):
+        subscription=self.subscriptions.get(sid)
+        if subscription is None:
+            return False
+        async with subscription['lock']:
+            headers={'NT': 'upnp:event', 'NTS': 'upnp:propchange', 'SID': sid, 'SEQ': str(next(subscription['seq'])), 'Content-Type': 'text/xml; charset="utf-8"'}
+            try:
+                async with self.household.session.request('NOTIFY', subscription['callback'], data=body.encode('utf-8'), headers=headers) as response:
+                    self.stats['notifies']+=1
+                    return response.status==200
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                return False
+
+    async def notify(self, service_id, names=None):
+        body=self.eventBody(service_id, names)
+        sids=[sid for sid, subscription in self.subscriptions.items() if subscription['service']==service_id]
+        await asyncio.gather(*[self.notifySubscription(sid, body) for sid in sids])
+
+    def changed(self, service_id, names=None):
+        asyncio.ensure_future(self.notify(service_id, names))
+
+    # State changes that can also be driven directly by a benchmark, each followed by the events a player would send
+
+    async def setVolume(self, volume):
+        self.volume=max(0, min(100, int(volume)))
+        await asyncio.gather(self.notify('RenderingControl', ['Volume']), self.coordinator.notify('GroupRenderingControl'))
+
+    async def setTransportState(self, state):
+        self.coordinator.transport_state=state
+        await asyncio.gather(*[member.notify('AVTransport') for member in self.members])
+
+    async def skipTrack(self, step=1):
+        self.coordinator.track=(self.coordinator.track+step) % len(self.household.catalog)
+        await asyncio.gather(*[member.notify('AVTransport') for member in self.members])
+
+    # SOAP
+
+    async def handleControl(self, request):
+        soapaction=request.headers.get('SOAPACTION', '').strip('"')
+        service_type, action=soapaction.split('#', 1) if '#' in soapaction else ('', '')
+        service_id=service_type.split(':')[-2] if service_type.count(':')>=2 else ''
+        try:
+            body=et.fromstring(await request.read())
+            arguments={ element.tag: element.text or '' for element in body.find('{http://schemas.xmlsoap.org/soap/envelope/}Body')[0] }
+        except (et.ParseError, TypeError, IndexError):
+            return self.soapFault(402)
+        handler=getattr(self, 'soap%s%s' % (service_id, action), None)
+        if handler is None or action not in service_actions.get(service_id, {}):
+            return self.soapFault(401)
+        self.stats['commands']+=1
+        self.household.stats[action]=self.household.stats.get(action, 0)+1
+        try:
+            result=handler(arguments) or []
+        except upnpError as error:
+            return self.soapFault(error.code)
+        except (KeyError, ValueError):
+            return self.soapFault(402)
+        response='<u:%sResponse xmlns:u="%s">%s</u:%sResponse>' % (action, service_type,
+                    ''.join('<%s>%s</%s>' % (name, escape(str(value)), name) for name, value in result), action)
+        return web.Response(text=soap_envelope % response, content_type='text/xml', charset='utf-8')
+
+    def soapFault(self, code):
+        return web.Response(status=500, text=soap_envelope % (soap_fault % code), content_type='text/xml', charset='utf-8')
+
+    def soapDevicePropertiesGetHouseholdID(self, arguments):
+        return [('CurrentHouseholdID', household_id)]
+
+    def soapDevicePropertiesGetZoneAttributes(self, arguments):
+        return [('CurrentZoneName', self.name), ('CurrentIcon', 'x-rincon-roomicon:living'), ('CurrentConfiguration', 1),
+                ('CurrentTargetRoomName', ''), ('CurrentAvailableRooms', '')]
+
+    def soapZoneGroupTopologyGetZoneGroupState(self, arguments):
+        return [('ZoneGroupState', self.household.zoneGroupState())]
+
+    def soapZoneGroupTopologyGetZoneGroupAttributes(self, arguments):
+        return [('CurrentZoneGroupName', self.coordinator.name), ('CurrentZoneGroupID', '%s:%s' % (self.coordinator.uid, self.household.generation)),
+                ('CurrentZonePlayerUUIDsInGroup', ','.join(member.uid for member in self.members)), ('CurrentMuseHouseholdId', household_id)]
+
+    def soapAVTransportGetTransportInfo(self, arguments):
+        return [('CurrentTransportState', self.coordinator.transport_state), ('CurrentTransportStatus', 'OK'), ('CurrentSpeed', 1)]
+
+    def soapAVTransportGetTransportSettings(self, arguments):
+        return [('PlayMode', self.coordinator.play_mode), ('RecQualityMode', 'NOT_IMPLEMENTED')]
+
+    def soapAVTransportGetCurrentTransportActions(self, arguments):
+        return [('Actions', transport_actions[self.coordinator.transport_state])]
+
+    def soapAVTransportGetPositionInfo(self, arguments):
+        track=self.current
+        return [('Track', self.coordinator.track+1), ('TrackDuration', track['duration']), ('TrackMetaData', trackDidl(track)),
+                ('TrackURI', track['uri']), ('RelTime', '0:00:42'), ('AbsTime', 'NOT_IMPLEMENTED'), ('RelCount', 2147483647), ('AbsCount', 2147483647)]
+
+    def soapAVTransportGetMediaInfo(self, arguments):
+        return [('NrTracks', len(self.household.catalog)), ('MediaDuration', 'NOT_IMPLEMENTED'), ('CurrentURI', 'x-rincon-queue:%s#0' % self.coordinator.uid),
+                ('CurrentURIMetaData', ''), ('NextURI', ''), ('NextURIMetaData', ''), ('PlayMedium', 'NETWORK'), ('RecordMedium', 'NOT_IMPLEMENTED'),
+                ('WriteStatus', 'NOT_IMPLEMENTED')]
+
+    def setTransport(self, state):
+        # members forward transport control to their coordinator, which is what the adapter relies on
+        self.coordinator.transport_state=state
+        for member in self.members:
+            member.changed('AVTransport', ['TransportState', 'CurrentTransportActions'])
+
+    def soapAVTransportPlay(self, arguments):
+        self.setTransport('PLAYING')
+
+    def soapAVTransportPause(self, arguments):
+        if self.coordinator.transport_state=='STOPPED':
+            raise upnpError(701)
+        self.setTransport('PAUSED_PLAYBACK')
+
+    def soapAVTransportStop(self, arguments):
+        self.setTransport('STOPPED')
+
+    def moveTrack(self, track):
+        self.coordinator.track=track % len(self.household.catalog)
+        for member in self.members:
+            member.changed('AVTransport')
+
+    def soapAVTransportNext(self, arguments):
+        self.moveTrack(self.coordinator.track+1)
+
+    def soapAVTransportPrevious(self, arguments):
+        self.moveTrack(self.coordinator.track-1)
+
+    def soapAVTransportSeek(self, arguments):
+        if arguments['Unit']=='TRACK_NR':
+            self.moveTrack(int(arguments['Target'])-1)
+
+    def soapAVTransportSetPlayMode(self, arguments):
+        self.coordinator.play_mode=arguments['NewPlayMode']
+        for member in self.members:
+            member.changed('AVTransport', ['CurrentPlayMode'])
+
+    def soapAVTransportSetAVTransportURI(self, arguments):
+        self.moveTrack(self.coordinator.track)
+
+    def soapAVTransportBecomeCoordinatorOfStandaloneGroup(self, arguments):
+        self.household.regroup(self, self)
+
+    def soapRenderingControlGetVolume(self, arguments):
+        return [('CurrentVolume', self.volume)]
+
+    def soapRenderingControlSetVolume(self, arguments):
+        self.volume=max(0, min(100, int(arguments['DesiredVolume'])))
+        self.changed('RenderingControl', ['Volume'])
+        self.coordinator.changed('GroupRenderingControl')
+
+    def soapRenderingControlSetRelativeVolume(self, arguments):
+        self.volume=max(0, min(100, self.volume+int(arguments['Adjustment'])))
+        self.changed('RenderingControl', ['Volume'])
+        self.coordinator.changed('GroupRenderingControl')
+        return [('NewVolume', self.volume)]
+
+    def soapRenderingControlGetMute(self, arguments):
+        return [('CurrentMute', self.mute)]
+
+    def soapRenderingControlSetMute(self, arguments):
+        self.mute=int(arguments['DesiredMute'] in ('1', 'true', 'True'))
+        self.changed('RenderingControl', ['Mute'])
+        self.coordinator.changed('GroupRenderingControl')
+
+    def soapRenderingControlGetBass(self, arguments):
+        return [('CurrentBass', self.bass)]
+
+    def soapRenderingControlSetBass(self, arguments):
+        self.bass=int(arguments['DesiredBass'])
+        self.changed('RenderingControl', ['Bass'])
+
+    def soapRenderingControlGetTreble(self, arguments):
+        return [('CurrentTreble', self.treble)]
+
+    def soapRenderingControlSetTreble(self, arguments):
+        self.treble=int(arguments['DesiredTreble'])
+        self.changed('RenderingControl', ['Treble'])
+
+    def soapRenderingControlGetLoudness(self, arguments):
+        return [('CurrentLoudness', self.loudness)]
+
+    def soapRenderingControlSetLoudness(self, arguments):
+        self.loudness=int(arguments['DesiredLoudness'] in ('1', 'true', 'True'))
+        self.changed('RenderingControl', ['Loudness'])
+
+    def groupOnly(self):
+        # GroupRenderingControl only answers on the coordinator
+        if self.coordinator is not self:
+            raise upnpError(701)
+
+    def soapGroupRenderingControlGetGroupVolume(self, arguments):
+        self.groupOnly()
+        return [('CurrentVolume', self.groupVolume())]
+
+    def soapGroupRenderingControlSnapshotGroupVolume(self, arguments):
+        self.groupOnly()
+
+    def adjustGroupVolume(self, adjustment):
+        # like a player, spread the change over the members keeping their relative levels
+        for member in self.members:
+            member.volume=max(0, min(100, member.volume+adjustment))
+            member.changed('RenderingControl', ['Volume'])
+        self.changed('GroupRenderingControl')
+
+    def soapGroupRenderingControlSetGroupVolume(self, arguments):
+        self.groupOnly()
+        self.adjustGroupVolume(int(arguments['DesiredVolume'])-self.groupVolume())
+
+    def soapGroupRenderingControlSetRelativeGroupVolume(self, arguments):
+        self.groupOnly()
+        self.adjustGroupVolume(int(arguments['Adjustment']))
+        return [('NewVolume', self.groupVolume())]
+
+    def soapGroupRenderingControlGetGroupMute(self, arguments):
+        self.groupOnly()
+        return [('CurrentMute', self.groupMute())]
+
+    def soapGroupRenderingControlSetGroupMute(self, arguments):
+        self.groupOnly()
+        mute=int(arguments['DesiredMute'] in ('1', 'true', 'True'))
+        for member in self.members:
+            member.mute=mute
+            member.changed('RenderingControl', ['Mute'])
+        self.changed('GroupRenderingControl')
+
+    def soapContentDirectoryBrowse(self, arguments):
+        if arguments['ObjectID'].startswith('Q:0'):
+            start=int(arguments.get('StartingIndex') or 0)
+            count=int(arguments.get('RequestedCount') or 100)
+            catalog=self.household.catalog
+            tracks=catalog[start:start+count]
+            items=''.join(trackDidl(track, 'Q:0/%s' % (start+offset+1), 'Q:0')[len('<DIDL-Lite %s>' % didl_namespaces):-len('</DIDL-Lite>')] for offset, track in enumerate(tracks))
+            return [('Result', '<DIDL-Lite %s>%s</DIDL-Lite>' % (didl_namespaces, items)), ('NumberReturned', len(tracks)), ('TotalMatches', len(catalog)), ('UpdateID', 1)]
+        # favorites, playlists and the music library are empty
+        return [('Result', '<DIDL-Lite %s></DIDL-Lite>' % didl_namespaces), ('NumberReturned', 0), ('TotalMatches', 0), ('UpdateID', 1)]
+
+    # Plain http
+
+    async def handleDescription(self, request):
+        return web.Response(text=device_description % {'ip': self.ip, 'version': software_version, 'uid': self.uid, 'name': escape(self.name),
+                                'serial': '5C-AA-FD-%02X-%02X-%02X:A' % ((self.index>>16)&255, (self.index>>8)&255, self.index&255)},
+                            content_type='text/xml', charset='utf-8')
+
+    async def handleScpd(self, request):
+        if request.match_info['service'] not in service_actions:
+            return web.Response(status=404)
+        return web.Response(text=scpdDocument(request.match_info['service']), content_type='text/xml', charset='utf-8')
+
+    async def handleArt(self, request):
+        self.stats['art']+=1
+        return web.Response(body=self.household.art, content_type='image/png')
+
+
+class simulatedHousehold(object):
+
+    def __init__(self, count=1, network='127.0.1.', port=1400, groupsize=1, art=None, invisible=0):
+        self.port=port
+        self.catalog=makeCatalog()
+        self.art=art or open(os.path.join(os.path.dirname(__file__), '..', 'sonoslogo.png'), 'rb').read()
+        self.players=[simulatedPlayer(self, index, '%s%s' % (network, index+1)) for index in range(count)]
+        self.byip={ player.ip: player for player in self.players }
+        self.sids=itertools.count(1)
+        self.generation=1
+        self.session=None
+        self.stats={}
+        for start in range(0, count, groupsize):
+            for player in self.players[start:start+groupsize]:
+                player.coordinator=self.players[start]
+        # the last players in the household are satellites bonded to the first room, like a sub or surrounds, and answer
+        # with that room's name
+        for player in self.players[count-invisible:] if invisible else []:
+            player.invisible=True
+            player.coordinator=self.players[0]
+            player.name=self.players[0].name
+
+    @property
+    def addresses(self):
+        return [player.ip for player in self.players]
+
+    async def start(self):
+        self.session=aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=10))
+        await asyncio.gather(*[player.start() for player in self.players])
+
+    async def stop(self):
+        await asyncio.gather(*[player.stop() for player in self.players])
+        if self.session:
+            await self.session.close()
+            self.session=None
+
+    def zoneGroupState(self):
+        groups=[]
+        for coordinator in [player for player in self.players if player.coordinator is player]:
+            rooms=[member for member in coordinator.members if not member.invisible]
+            # satellites are nested in the room they are bonded to, as real home theatre setups send them
+            satellites=''.join(self.zoneGroupMember('Satellite', member, ' Invisible="1"') for member in coordinator.members if member.invisible)
+            members=''.join(self.zoneGroupMember('ZoneGroupMember', member, '', satellites if member is coordinator else '') for member in rooms)
+            groups.append('<ZoneGroup Coordinator="%s" ID="%s:%s">%s</ZoneGroup>' % (coordinator.uid, coordinator.uid, self.generation, members))
+        return '<ZoneGroupState><ZoneGroups>%s</ZoneGroups><VanishedDevices></VanishedDevices></ZoneGroupState>' % ''.join(groups)
+
+    def zoneGroupMember(self, tag, member, extra, children=''):
+        attributes=('UUID="%s" Location="http://%s:%s/xml/device_description.xml" ZoneName=%s Icon="" Configuration="1" '
+                    'SoftwareVersion="%s" SWGen="2" MinCompatibleVersion="77.0-00000" LegacyCompatibleVersion="58.0-00000" BootSeq="8" '
+                    'WirelessMode="0" ChannelFreq="2437" WifiEnabled="1" EthLink="1" MicEnabled="0" AirPlayEnabled="1" IdleState="1"%s'
+                    % (member.uid, member.ip, self.port, quoteattr(member.name), software_version, extra))
+        if children:
+            return '<%s %s>%s</%s>' % (tag, attributes, children, tag)
+        return '<%s %s/>' % (tag, attributes)
+
+    def regroup(self, player, coordinator):
+        player.coordinator=coordinator
+        self.generation+=1
+        for member in self.players:
+            member.changed('ZoneGroupTopology')
+            member.changed('AVTransport')
+
+
+async def serve(count, network, groupsize):
+    household=simulatedHousehold(count, network=network, groupsize=groupsize)
+    await household.start()
+    print('.. %s simulated sonos players on %s' % (count, ', '.join(household.addresses)))
+    try:
+        while True:
+            await asyncio.sleep(3600)
+    finally:
+        await household.stop()
+
+
+if __name__ == '__main__':
+    parser=argparse.ArgumentParser()
+    parser.add_argument('--players', type=int, default=3)
+    parser.add_argument('--network', default='127.0.1.')
+    parser.add_argument('--groupsize', type=int, default=1)
+    args=parser.parse_args()
+    try:
+        asyncio.get_event_loop().run_until_complete(serve(args.players, args.network, args.groupsize))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,29 @@
+#!/usr/bin/python3
+
+# Minimal stand-in for the sofabase devices module, enough for sonos.py's controller classes to be defined and for a
+# controller to be built around a device in the adapter tests.  Only used when the real devices module is not on the path.
+
+class controller(object):
+
+    def __init__(self, *args, device=None, **kwargs):
+        self.device=device
+
+
+class EndpointHealth(controller):
+    pass
+
+
+class InputController(controller):
+    pass
+
+
+class SpeakerController(controller):
+    pass
+
+
+class ModeController(controller):
+    pass
+
+
+class MusicController(controller):
+    pass
@@ -0,0 +1,17 @@
+#!/usr/bin/python3
+
+# Minimal stand-in for the parts of sofabase that sonos.py touches when it is imported and when adapterProcess is
+# driven directly, as bench_adapter.py and the adapter tests do.  Only used when the real sofabase is not on the path.
+
+class sofabase(object):
+    pass
+
+
+class adapterbase(object):
+    pass
+
+
+class configbase(object):
+
+    def set_or_default(self, name, default=None):
+        return default
@@ -7,6 +7,13 @@ sys.path.append(os.path.join(os.path.dirname(__file__),'../../base'))
 
 from sofabase import sofabase, adapterbase, configbase
 import devices
+from sonosevents import genaReceiver, genaSubscription, coalesceEvents
+from sonostopology import zoneTopology, playerRegistry
+from sonosart import artCache, thumbnailSize, renderThumbnail, contentHash, contentType
+from sonosssdp import ssdpDiscovery, usnUid
+from sonosmetrics import adapterMetrics, timedCommand
+from sonossoap import soapClient
+import sonosart
 
 
 import requests
@@ -17,9 +24,10 @@ from collections import defaultdict
 import xml.etree.ElementTree as et
 import time
 import json
+import queue
 import asyncio
 import aiohttp
-import xmltodict
+from aiohttp import web
 import re
 
 import base64
@@ -31,6 +39,20 @@ import soco.exceptions
 from soco.events import event_listener
 from operator import itemgetter
 import concurrent.futures
+import functools
+import copy
+
+
+# strips bracketed qualifiers like (Remastered 2011) or [Live] from track titles
+title_cleanup=re.compile(r"[\(\[].*?[\)\]]")
+
+# errors that mean a speaker could not be reached, as opposed to a command it refused or a bad payload
+connection_errors=(requests.exceptions.ConnectionError, requests.exceptions.Timeout, aiohttp.ClientConnectionError, asyncio.TimeoutError, ConnectionError)
+
+# stands in for a value that has never been ingested, since None is a real value
+missing=object()
+
+empty_now_playing={'source': '', 'artist': '', 'title': '', 'album': '', 'art': '/image/sonos/logo', 'url': ''}
 
 
 class sonos(sofabase):
@@ -39,13 +61,49 @@ class sonos(sofabase):
     
         def adapter_fields(self):
             self.players=self.set_or_default('players', default=[])
+            # 'gena' receives events on the adapter's own asyncio server, 'soco' uses the threaded soco event_listener
+            self.event_mode=self.set_or_default('event_mode', default='gena')
+            self.event_address=self.set_or_default('event_address', default='')
+            # the adapter's own http server, which takes GENA callbacks and serves images
+            self.web_port=self.set_or_default('web_port', default=1401)
+            # number of threads available for blocking soco calls across all players
+            self.soco_workers=self.set_or_default('soco_workers', default=8)
+            # how many players are set up (speaker info, group and subscriptions) at the same time
+            self.setup_concurrency=self.set_or_default('setup_concurrency', default=8)
+            # 'ssdp' finds players with the adapter's own asyncio search and keeps watching for new or restarted ones,
+            # 'soco' uses the blocking soco.discover() and 'manual' only probes the addresses listed in players
+            self.discovery=self.set_or_default('discovery', default='ssdp')
+            self.discovery_interval=self.set_or_default('discovery_interval', default=60)
+            self.discovery_timeout=self.set_or_default('discovery_timeout', default=3)
+            # a player that fails is repaired on its own, retrying after health_backoff seconds and doubling up to health_backoff_max
+            self.health_backoff=self.set_or_default('health_backoff', default=2)
+            self.health_backoff_max=self.set_or_default('health_backoff_max', default=300)
+            # seconds that transport actions learned from AVTransport events are trusted before asking the player again
+            self.actions_max_age=self.set_or_default('actions_max_age', default=600)
+            # keep-alive connections held open to each speaker for album art
+            self.art_connections=self.set_or_default('art_connections', default=2)
+            # album art is kept in memory up to art_cache_bytes and on disk in art_cache_dir up to art_disk_bytes
+            self.art_cache_bytes=self.set_or_default('art_cache_bytes', default=32*1024*1024)
+            self.art_cache_dir=self.set_or_default('art_cache_dir', default=os.path.join(os.path.dirname(__file__), 'artcache'))
+            self.art_disk_bytes=self.set_or_default('art_disk_bytes', default=256*1024*1024)
+            # seconds to wait before trying an art url again after it failed
+            self.art_retry_delay=self.set_or_default('art_retry_delay', default=60)
+            # background art downloads run art_workers at a time, looking art_prefetch_depth tracks ahead in each queue
+            self.art_workers=self.set_or_default('art_workers', default=2)
+            self.art_prefetch_depth=self.set_or_default('art_prefetch_depth', default=3)
+            # keep-alive connections held open to each speaker for UPnP actions, and the seconds each action may take
+            self.soap_connections=self.set_or_default('soap_connections', default=2)
+            self.soap_timeout=self.set_or_default('soap_timeout', default=5)
+            # now playing art urls are relative paths served through sofabase.  Set this to something like
+            # http://192.168.1.10:1401 to point them at the adapter's own web server instead, which answers with 304s
+            self.art_base_url=self.set_or_default('art_base_url', default='')
 
   
     class EndpointHealth(devices.EndpointHealth):
 
         @property            
         def connectivity(self):
-            return 'OK'
+            return self.adapter.getConnectivity(self.device)
 
     class InputController(devices.InputController):
 
@@ -53,32 +111,34 @@ class sonos(sofabase):
         def input(self):
             try:
                 player=self.adapter.getPlayer(self.device)
-                if player==None or player.group==None:
+                coordinator=self.adapter.registry.coordinator(player) if player else None
+                if coordinator==None:
                     self.log.warning('.! warning - InputController.input could not get a player for %s' % self.device.endpointId)
                     return ""
                 #return "sonos:player:%s" % player.group.coordinator.uid
-                return player.group.coordinator.player_name
+                return self.adapter.registry.name(coordinator)
             except:
                 self.log.error('!! error getting input (coordinator) for %s' % (self.device.endpointId, self.device), exc_info=True)
             return ""
 
+        @timedCommand
         async def SelectInput(self, payload, correlationToken=''):
+            player=None
             try:
                 player=self.adapter.getPlayer(self.device)
-                coordinator=player.group.coordinator
-                self.log.debug('.. Changing input for %s/%s from %s to %s' % (player.player_name, player.uid, player.group.coordinator.player_name, payload['input']))
-                if payload['input']=='' or payload['input']==player.player_name:
-                    player.unjoin()
+                name=self.adapter.registry.name(player)
+                self.log.debug('.. Changing input for %s/%s from %s to %s' % (name, player.uid, self.adapter.registry.coordinator(player), payload['input']))
+                if payload['input']=='' or payload['input']==name:
+                    await self.adapter.runPlayer(player, player.unjoin)
                 else:
-                    for otherplayer in self.adapter.players:
-                        if (payload['input'].endswith(otherplayer.uid) or otherplayer.player_name==payload['input']) and otherplayer.is_visible:
-                            player.join(otherplayer)
-                            break
+                    otherplayer=self.adapter.registry.find(payload['input'])
+                    if otherplayer and self.adapter.registry.isVisible(otherplayer):
+                        await self.adapter.runPlayer(player, player.join, otherplayer)
 
                 return self.device.Response(correlationToken)
             except:
                 self.log.error('!! Error during SelectInput', exc_info=True)
-                self.adapter.connect_needed=True
+                self.adapter.commandFailed(self.device, player)
                 return None
                 
     class SpeakerController(devices.SpeakerController):
@@ -91,27 +151,72 @@ class sonos(sofabase):
         def mute(self):
             return self.nativeObject['RenderingControl']['mute']['Master']=="1"
 
+        @timedCommand
         async def SetVolume(self, payload, correlationToken=''):
+            player=None
             try:
                 self.log.info('-> setting volume on %s to %s' % (self.device, int(payload['volume'])))
                 player=self.adapter.getPlayer(self.device)
-                player.volume=int(payload['volume'])
+                await self.adapter.setPlayerValue(player, 'volume', int(payload['volume']))
                 return self.device.Response(correlationToken)
             except:
                 self.log.error('!! Error during SetVolume', exc_info=True)
-                self.adapter.connect_needed=True
+                self.adapter.commandFailed(self.device, player)
                 return None
 
+        @timedCommand
         async def SetMute(self, payload, correlationToken=''):
+            player=None
             try:
                 player=self.adapter.getPlayer(self.device)
-                player.mute=payload['mute']
+                await self.adapter.setPlayerValue(player, 'mute', payload['mute'])
                 return self.device.Response(correlationToken)
 
             except:
                 self.log.error('!! Error during SetVolume', exc_info=True)
-                self.adapter.connect_needed=True
+                self.adapter.commandFailed(self.device, player)
                 return None
+
+        @timedCommand
+        async def AdjustVolume(self, payload, correlationToken=''):
+            player=None
+            try:
+                player=self.adapter.getPlayer(self.device)
+                await self.adapter.setRelativeVolume(player, int(payload['volume']))
+                return self.device.Response(correlationToken)
+            except:
+                self.log.error('!! Error during AdjustVolume', exc_info=True)
+                self.adapter.commandFailed(self.device, player)
+            return self.device.ErrorResponse(correlationToken)
+
+        @timedCommand
+        async def AdjustGroupVolume(self, payload, correlationToken=''):
+            # a relative change for this player's whole group, or for the players listed in the payload
+            player=None
+            try:
+                player=self.adapter.getPlayer(self.device)
+                players=self.adapter.batchPlayers(payload, self.adapter.registry.groupMembers(player))
+                result=await self.adapter.batchRelativeVolume(players, int(payload['volume']))
+                if not result['failed']:
+                    return self.device.Response(correlationToken)
+            except:
+                self.log.error('!! Error during AdjustGroupVolume', exc_info=True)
+                self.adapter.commandFailed(self.device, player)
+            return self.device.ErrorResponse(correlationToken)
+
+        @timedCommand
+        async def SetGroupMute(self, payload, correlationToken=''):
+            player=None
+            try:
+                player=self.adapter.getPlayer(self.device)
+                players=self.adapter.batchPlayers(payload, self.adapter.registry.groupMembers(player))
+                result=await self.adapter.batchMute(players, bool(payload['mute']))
+                if not result['failed']:
+                    return self.device.Response(correlationToken)
+            except:
+                self.log.error('!! Error during SetGroupMute', exc_info=True)
+                self.adapter.commandFailed(self.device, player)
+            return self.device.ErrorResponse(correlationToken)
                 
     class FavoriteController(devices.ModeController):
 
@@ -125,6 +230,7 @@ class sonos(sofabase):
                 self.log.error('!! error getting surround mode', exc_info=True)
                 return ""
 
+        @timedCommand
         async def SetMode(self, payload, correlationToken=''):
             try:
                 fv=""
@@ -134,9 +240,9 @@ class sonos(sofabase):
                         fv=ndfav['item_id']
                         break
                 player=await self.adapter.getPlayerOrCoordinator(self.device)
-                if 'Play' in await self.adapter.getPlayerActions(player):
+                if 'Play' in await self.adapter.getPlayerActions(player, 'Play'):
                     self.log.info('.. play favorite %s' % fv)
-                    player.play_uri(uri=fv)
+                    await self.adapter.runPlayer(player, player.play_uri, uri=fv)
 
             except:
                 self.adapter.log.error('Error setting mode status %s / %s / %s' % (payload, fav, fv), exc_info=True)
@@ -146,135 +252,23 @@ class sonos(sofabase):
 
         @property            
         def artist(self):
-            try:
-                coordinator=self.adapter.getCoordinator(self.device)
-                # Images for services like soundcloud do not seem to use the album_art_uri - they populate it with a link that will
-                # generate a 404.  In these cases you must get the data from avtransport/enqueued_transport_uri_meta_data
-                try:
-                    if coordinator['AVTransport']['av_transport_uri_meta_data']['item_id']=='lineinput':
-                        return ''
-                except:
-                    pass
-
-                try:
-                    if coordinator['AVTransport']['av_transport_uri_meta_data']['title'].startswith('AirPlay Device:'):
-                        return ''
-                except:
-                    pass
-
-                
-                if 'creator' in coordinator['AVTransport']['current_track_meta_data']:
-                    return coordinator['AVTransport']['current_track_meta_data']['creator']
-                if 'artist' in coordinator['AVTransport']['current_track_meta_data']:
-                    return coordinator['AVTransport']['current_track_meta_data']['artist']
-                if 'enqueued_transport_uri_meta_data' in coordinator['AVTransport'] and 'creator' in coordinator['AVTransport']['enqueued_transport_uri_meta_data']:
-                    if coordinator['AVTransport']['enqueued_transport_uri_meta_data']['creator']:
-                        return coordinator['AVTransport']['enqueued_transport_uri_meta_data']['creator']
-            except:
-                return ""
+            return self.adapter.getNowPlaying(self.device)['artist']
 
         @property            
         def title(self):
-            try:
-                coordinator=self.adapter.getCoordinator(self.device)
-                try:
-                    if coordinator['AVTransport']['av_transport_uri_meta_data']['item_id']=='lineinput':
-                        return 'Line-In'
-                except:
-                    pass
-
-
-                # CHEESE 6/13 - Sonos has clearly made some changes to the way they are handling lineinput in their data reporting
-                # and the above process no longer works. Now the line-in seems to get labeled "AirPlay Device: (device name)"
-                try:
-                    if coordinator['AVTransport']['av_transport_uri_meta_data']['title'].startswith('AirPlay Device:'):
-                        return 'Line-In'
-                except:
-                    pass
-
-
-                
-                if coordinator['AVTransport']['current_track_meta_data']['title']:
-                    return re.sub("[\(\[].*?[\)\]]", "",coordinator['AVTransport']['current_track_meta_data']['title'])
-                if 'enqueued_transport_uri_meta_data' in coordinator['AVTransport'] and 'title' in coordinator['AVTransport']['enqueued_transport_uri_meta_data']:
-                    if coordinator['AVTransport']['enqueued_transport_uri_meta_data']['title']:
-                        return re.sub("[\(\[].*?[\)\]]", "",coordinator['AVTransport']['enqueued_transport_uri_meta_data']['title'])
-            except:
-                return ""
+            return self.adapter.getNowPlaying(self.device)['title']
        
         @property            
         def album(self):
-            try:
-                coordinator=self.adapter.getCoordinator(self.device)
-                try:
-                    if coordinator['AVTransport']['av_transport_uri_meta_data']['item_id']=='lineinput':
-                        return ''
-                except:
-                    pass
-                
-                try:
-                    if coordinator['AVTransport']['av_transport_uri_meta_data']['title'].startswith('AirPlay Device:'):
-                        return ''
-                except:
-                    pass
-
-
-                
-                return coordinator['AVTransport']['current_track_meta_data']['album']
-            except:
-                return ""
+            return self.adapter.getNowPlaying(self.device)['album']
                 
         @property            
         def art(self):
-
-            coordinator=self.adapter.getCoordinator(self.device)
-            try:
-                if coordinator['AVTransport']['av_transport_uri_meta_data']['item_id']=='lineinput':
-                    return "/image/sonos/logo"
-            except:
-                pass
-                
-            try:
-                if coordinator['AVTransport']['av_transport_uri_meta_data']['title'].startswith('AirPlay Device:'):
-                    return "/image/sonos/logo"
-            except:
-                pass
-                
-
-            try:
-                # Images for services like soundcloud do not seem to use the album_art_uri - they populate it with a link that will
-                # generate a 404.  In these cases you must get the data from avtransport/enqueued_transport_uri_meta_data
-                if 'enqueued_transport_uri_meta_data' in coordinator['AVTransport'] and 'album_art_uri' in coordinator['AVTransport']['enqueued_transport_uri_meta_data']:
-                    if coordinator['AVTransport']['enqueued_transport_uri_meta_data']['album_art_uri']!="":
-                        return "/image/sonos/player/%s/AVTransport/enqueued_transport_uri_meta_data/album_art_uri" % (coordinator['speaker']['uid'])
-                if 'album' in coordinator['AVTransport']['current_track_meta_data']:
-                    if 'album_art_uri' in coordinator['AVTransport']['current_track_meta_data']:
-                        return "/image/sonos/player/%s/AVTransport/current_track_meta_data/album_art_uri?album=%s" % (coordinator['speaker']['uid'], coordinator['AVTransport']['current_track_meta_data']['album'])
-                    if 'album_art' in coordinator['AVTransport']['current_track_meta_data']:
-                        return "/image/sonos/player/%s/AVTransport/current_track_meta_data/album_art?album=%s" % (coordinator['speaker']['uid'], coordinator['AVTransport']['current_track_meta_data']['album'])
-                return "/image/sonos/logo"
-            except:
-                return "/image/sonos/logo"
+            return self.adapter.getNowPlaying(self.device)['art']
 
         @property            
         def url(self):
-            try:
-                coordinator=self.adapter.getCoordinator(self.device)
-                try:
-                    if coordinator['AVTransport']['av_transport_uri_meta_data']['item_id']=='lineinput':
-                        return "lineinput"
-                except:
-                    pass
-
-                try:
-                    if coordinator['AVTransport']['av_transport_uri_meta_data']['title'].startswith('AirPlay Device:'):
-                        return "lineinput"
-                except:
-                    pass
-
-                return coordinator['AVTransport']['enqueued_transport_uri']
-            except:
-                return ""
+            return self.adapter.getNowPlaying(self.device)['url']
 
         @property            
         def linked(self):
@@ -302,103 +296,135 @@ class sonos(sofabase):
                 return 'STOPPED'
 
 
+        @timedCommand
         async def Play(self, correlationToken=''):
+            player=None
             try:
                 player=await self.adapter.getPlayerOrCoordinator(self.device)
                 #player=await self.adapter.getPlayerOrCoordinator(self.device)
-                if 'Play' in await self.adapter.getPlayerActions(player):
-                    player.play()
+                if 'Play' in await self.adapter.getPlayerActions(player, 'Play'):
+                    await self.adapter.runPlayer(player, player.play)
                 return self.device.Response(correlationToken)
             except:
                 self.log.error('!! Error during Play', exc_info=True)
-            self.adapter.connect_needed=True
+                self.adapter.commandFailed(self.device, player)
             return self.device.ErrorResponse(correlationToken)
 
 
+        @timedCommand
         async def PlayFavorite(self, payload, correlationToken=''):
+            player=None
             try:
                 player=await self.adapter.getPlayerOrCoordinator(self.device)
-                if 'Play' in await self.adapter.getPlayerActions(player):
-                    player.playFavorite(payload['favorite'])
+                if 'Play' in await self.adapter.getPlayerActions(player, 'Play'):
+                    await self.adapter.runPlayer(player, player.playFavorite, payload['favorite'])
                 return self.device.Response(correlationToken)
 
             except:
                 self.log.error('!! Error during Play', exc_info=True)
-            self.adapter.connect_needed=True
+                self.adapter.commandFailed(self.device, player)
             return self.device.ErrorResponse(correlationToken)
 
+        @timedCommand
         async def Pause(self, correlationToken=''):
+            player=None
             try:
                 player=await self.adapter.getPlayerOrCoordinator(self.device)
                 #player=await self.adapter.getPlayerOrCoordinator(self.device)
-                if 'Pause' in await self.adapter.getPlayerActions(player):
-                    player.pause()
+                if 'Pause' in await self.adapter.getPlayerActions(player, 'Pause'):
+                    await self.adapter.runPlayer(player, player.pause)
                 return self.device.Response(correlationToken)
             except soco.exceptions.SoCoUPnPException:
                 self.log.warning('!! Error during Pause (Soco UPNP Exception - Transition not available)')
             except:
                 self.log.error('!! Error during Pause', exc_info=True)
-            self.adapter.connect_needed=True
+                self.adapter.commandFailed(self.device, player)
             return self.device.ErrorResponse(correlationToken, error_type="NOT_SUPPORTED_IN_CURRENT_MODE", error_message="Transition not available")
                 
+        @timedCommand
         async def Stop(self, correlationToken=''):
+            player=None
             try:
                 #player=await self.adapter.getPlayerOrCoordinator(self.device)
                 player=await self.adapter.getPlayerOrCoordinator(self.device)
                 #self.log.debug('.. Preparing to send stop to %s with available actions %s' % (self.device, self.adapter.getPlayerActions(player)))
-                if 'Stop' in await self.adapter.getPlayerActions(player):
-                    player.stop()
+                if 'Stop' in await self.adapter.getPlayerActions(player, 'Stop'):
+                    await self.adapter.runPlayer(player, player.stop)
                 return self.device.Response(correlationToken)
             except soco.exceptions.SoCoUPnPException:
                 self.log.warning('!! Error during Stop (Soco UPNP Exception - Transition not available)')
             except:
                 self.log.error('!! Error during Stop', exc_info=True)
-            self.adapter.connect_needed=True
+                self.adapter.commandFailed(self.device, player)
             return self.device.ErrorResponse(correlationToken, error_type="NOT_SUPPORTED_IN_CURRENT_MODE", error_message="Transition not available")
+
+        @timedCommand
+        async def PauseAll(self, payload=None, correlationToken=''):
+            return await self.transportAll('Pause', payload, correlationToken)
+
+        @timedCommand
+        async def StopAll(self, payload=None, correlationToken=''):
+            return await self.transportAll('Stop', payload, correlationToken)
+
+        async def transportAll(self, action, payload, correlationToken):
+            # every visible player in the household, or the players listed in the payload, one command per group
+            try:
+                players=self.adapter.batchPlayers(payload, [player for player in self.adapter.registry if self.adapter.registry.isVisible(player)])
+                result=await self.adapter.batchTransport(players, action)
+                if not result['failed']:
+                    return self.device.Response(correlationToken)
+            except:
+                self.log.error('!! Error during %sAll' % action, exc_info=True)
+            return self.device.ErrorResponse(correlationToken)
                 
+        @timedCommand
         async def Skip(self, correlationToken=''):
+            player=None
             try:
                 player=await self.adapter.getPlayerOrCoordinator(self.device)
                 #player=await self.adapter.getPlayerOrCoordinator(self.device)
-                if 'Next' in await self.adapter.getPlayerActions(player):
-                    player.next()
+                if 'Next' in await self.adapter.getPlayerActions(player, 'Next'):
+                    await self.adapter.runPlayer(player, player.next)
                 return self.device.Response(correlationToken)
             except soco.exceptions.SoCoUPnPException:
                 self.log.warning('!! Error during Skip (Soco UPNP Exception - Transition not available)')
             except:
                 self.log.error('!! Error during Skip', exc_info=True)
-            self.adapter.connect_needed=True
+                self.adapter.commandFailed(self.device, player)
             return self.device.ErrorResponse(correlationToken, error_type="NOT_SUPPORTED_IN_CURRENT_MODE", error_message="Transition not available")
                 
+        @timedCommand
         async def Previous(self, correlationToken=''):
+            player=None
             try:
                 player=await self.adapter.getPlayerOrCoordinator(self.device)
-                if 'Previous' in await self.adapter.getPlayerActions(player):
-                    player.previous()
+                if 'Previous' in await self.adapter.getPlayerActions(player, 'Previous'):
+                    await self.adapter.runPlayer(player, player.previous)
                 return self.device.Response(correlationToken)
             except soco.exceptions.SoCoUPnPException:
                 self.log.warning('!! Error during Previous (Soco UPNP Exception - Transition not available)')
             except:
                 self.log.error('!! Error during Previous', exc_info=True)
-            self.adapter.connect_needed=True
+                self.adapter.commandFailed(self.device, player)
             return self.device.ErrorResponse(correlationToken, error_type="NOT_SUPPORTED_IN_CURRENT_MODE", error_message="Transition not available")
 
+        @timedCommand
         async def SelectInput(self, payload, correlationToken=''):
+            player=None
             try:
                 player=self.adapter.getPlayer(self.device)
                 self.log.info('Changing input for %s: %s' % (player.uid, payload['input']))
                 if payload['input']=='':
-                    player.unjoin()
+                    await self.adapter.runPlayer(player, player.unjoin)
                 else:
-                    for otherplayer in self.players:
-                        if otherplayer.uid==payload['input'].split(':')[2]:
-                            player.join(otherplayer)
-                            break
+                    otherplayer=self.adapter.registry.get(payload['input'].split(':')[2])
+                    if otherplayer:
+                        await self.adapter.runPlayer(player, player.join, otherplayer)
 
                 return self.device.Response(correlationToken)
             except:
                 self.log.error('!! Error during SelectInput', exc_info=True)
-            self.adapter.connect_needed=True
+                self.adapter.commandFailed(self.device, player)
             return self.device.ErrorResponse(correlationToken)
 
 
@@ -421,8 +447,54 @@ class sonos(sofabase):
             self.notify=notify
             self.polltime=.1
             self.subscriptions=[]
-            self.artcache={}
-            self.artqueue=[]
+            self.players=[]
+            self.discovered={}
+            self.topologyfetch=None
+            self.setuptasks=[]
+            self.setuplimit=None
+            self.setupstarted=0
+            self.bootids={}
+            self.health={}
+            self.repairs={}
+            self.ssdp=None
+            self.artcache=artCache(log=self.log, max_bytes=self.config.art_cache_bytes, directory=self.config.art_cache_dir, 
+                                    max_disk_bytes=self.config.art_disk_bytes)
+            self.artpaths={}
+            self.artinflight={}
+            self.artfailures={}
+            self.thumbnailinflight={}
+            self.artqueue=None
+            self.artqueued=set()
+            self.artjobs={}
+            self.artworkers=[]
+            self.artsequence=0
+            self.lasttrack={}
+            self.trackinfo={}
+            self.ingested={}
+            self.stagedingest={}
+            self.pendingingest={}
+            self.pendingoverwrites={}
+            self.pendingnowplaying=set()
+            self.eventqueue=None
+            self.receiver=None
+            self.executor=concurrent.futures.ThreadPoolExecutor(max_workers=self.config.soco_workers)
+            self.lanes={}
+            self.activesets=set()
+            self.pendingsets={}
+            self.transportactions={}
+            self.topology=zoneTopology()
+            self.registry=playerRegistry(self.topology)
+            self.nowplaying={}
+            self.http=None
+            self.soap=soapClient(log=self.log, connections=self.config.soap_connections, timeout=self.config.soap_timeout)
+            self.webapp=web.Application()
+            self.webapp.router.add_get('/image/sonos/{path:.*}', self.imageHandler)
+            self.webapp.router.add_get('/metrics', self.metricsHandler)
+            self.webrunner=None
+            self.logohashes={}
+            self.stats=defaultdict(int)
+            self.metrics=adapterMetrics()
+            self.addGauges()
             self.connect_needed=True
             if not loop:
                 self.loop = asyncio.new_event_loop()
@@ -435,89 +507,505 @@ class sonos(sofabase):
             sonoslogofile = open(os.path.join(os.path.dirname(__file__),"sonoslogo.png"), "rb")
             self.sonoslogo = sonoslogofile.read()
             self.lightlogo = self.sonoslogo
+            self.logohashes['logo']=contentHash(self.sonoslogo)
+            self.logohashes['lightlogo']=self.logohashes['logo']
 
         def readDarkLogoImage(self):
             try:
                 sonoslogofile = open(os.path.join(os.path.dirname(__file__),"sonosdark.png"), "rb")
                 self.darklogo = sonoslogofile.read()
+                self.logohashes['darklogo']=contentHash(self.darklogo)
             except:
                 self.log.error('Error getting dark logo', exc_info=True)
                
                 
+        async def runSoco(self, func, *args, **kwargs):
+            
+            # Blocking soco network calls run on the shared thread pool so a slow speaker cannot stall the event loop
+            return await asyncio.get_event_loop().run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+
+        async def runPlayer(self, player, func, *args, **kwargs):
+            
+            # Calls for the same player are serialized through its lane (asyncio.Lock is FIFO) so commands keep their
+            # order, while different players run in parallel on the pool.
+            lane=self.lanes.setdefault(player.ip_address, asyncio.Lock())
+            queued=time.perf_counter()
+            async with lane:
+                started=time.perf_counter()
+                self.metrics.observe('lane_wait', started-queued)
+                try:
+                    return await self.runSoco(func, *args, **kwargs)
+                finally:
+                    self.metrics.observe('soco_call', time.perf_counter()-started)
+
+        async def runAction(self, service, action, arguments=(), timeout=None):
+            
+            # A UPnP action on one of a player's soco services, sent with the async client instead of a soco call on the
+            # thread pool.  It shares the player's lane with runPlayer so the two kinds of call stay in order.
+            player=service.soco
+            lane=self.lanes.setdefault(player.ip_address, asyncio.Lock())
+            queued=time.perf_counter()
+            async with lane:
+                self.metrics.observe('lane_wait', time.perf_counter()-queued)
+                with self.metrics.timer('soap.%s' % action):
+                    return await self.soap.call(player.ip_address, service.control_url, 'urn:schemas-upnp-org:service:%s:%s' % (service.service_type, service.version), 
+                                                action, arguments, timeout=timeout)
+
+        async def setPlayerValue(self, player, name, value):
+            
+            # Last write wins for volume and mute.  While a set for the same player and property is in flight, newer
+            # values share one waiting slot and only the latest is sent when the speaker is free.  Callers whose value was
+            # replaced get the result of the set that replaced it.
+            key=(player.uid, name)
+            self.stats['set_commands']+=1
+            waiting=self.pendingsets.get(key)
+            if waiting:
+                self.stats['set_commands_dropped']+=1
+                waiting['value']=value
+                return await asyncio.shield(waiting['future'])
+            slot={'value': value, 'future': asyncio.get_event_loop().create_future()}
+            if key in self.activesets:
+                self.pendingsets[key]=slot
+            else:
+                self.activesets.add(key)
+                asyncio.ensure_future(self.sendPlayerValues(player, name, slot))
+            return await asyncio.shield(slot['future'])
+
+        async def sendPlayerValues(self, player, name, slot):
+            
+            # runs apart from the callers, so a cancelled directive cannot strand the values queued behind it
+            key=(player.uid, name)
+            try:
+                while slot:
+                    try:
+                        self.stats['set_commands_sent']+=1
+                        await self.sendPlayerValue(player, name, slot['value'])
+                        slot['future'].set_result(True)
+                    except Exception as e:
+                        slot['future'].set_exception(e)
+                    slot=self.pendingsets.pop(key, None)
+            finally:
+                self.activesets.discard(key)
+
+        async def sendPlayerValue(self, player, name, value):
+            
+            # the same actions soco's volume and mute setters send
+            if name=='volume':
+                return await self.runAction(player.renderingControl, 'SetVolume', [('InstanceID', 0), ('Channel', 'Master'), ('DesiredVolume', max(0, min(int(value), 100)))])
+            if name=='mute':
+                return await self.runAction(player.renderingControl, 'SetMute', [('InstanceID', 0), ('Channel', 'Master'), ('DesiredMute', '1' if value else '0')])
+            return await self.runPlayer(player, setattr, player, name, value)
+
+        @property
+        def connect_needed(self):
+            return self._connect_needed
+
+        @connect_needed.setter
+        def connect_needed(self, value):
+            self._connect_needed=value
+            # wake the event loop so it can reconnect even when no events are arriving
+            if value and self.eventqueue:
+                self.eventqueue.put_nowait(None)
+
+        def httpSession(self):
+            
+            # One long lived session for art downloads, so repeated /getaa requests reuse the connection to each speaker
+            trace=aiohttp.TraceConfig()
+            trace.on_connection_create_end.append(self.countConnection)
+            trace.on_connection_reuseconn.append(self.countConnection)
+            connector=aiohttp.TCPConnector(limit_per_host=self.config.art_connections, keepalive_timeout=60)
+            return aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=10), trace_configs=[trace])
+
+        async def countConnection(self, session, context, params):
+            
+            if isinstance(params, aiohttp.TraceConnectionReuseconnParams):
+                self.stats['art_connections_reused']+=1
+            else:
+                self.stats['art_connections_created']+=1
+
         async def start(self):
             try:
                 self.log.info('.. Starting Sonos')
-                await self.startSonosConnection()
-                await self.pollSubscriptions()
+                self.http=self.httpSession()
+                if self.config.discovery=='ssdp':
+                    self.ssdp=ssdpDiscovery(log=self.log, on_found=self.playerFound, interval=self.config.discovery_interval, 
+                                            timeout=self.config.discovery_timeout, interface=self.config.event_address)
+                    self.ssdp.start()
+                self.artqueue=asyncio.PriorityQueue()
+                self.artworkers=[asyncio.ensure_future(self.artWorker()) for worker in range(self.config.art_workers)]
+                if self.config.event_mode=='gena':
+                    self.eventqueue=asyncio.Queue()
+                    self.receiver=genaReceiver(log=self.log, queue=self.eventqueue, app=self.webapp, port=self.config.web_port, 
+                                                address=self.config.event_address, on_expired=self.subscriptionExpired, metrics=self.metrics)
+                if not await self.startWebServer() and self.receiver:
+                    # GENA callbacks to a port nobody serves would never arrive, so use soco's own event listener instead
+                    self.log.error('!! No GENA callbacks without the web server on port %s, falling back to soco events' % self.config.web_port)
+                    self.receiver=None
+                    self.eventqueue=None
+                if self.receiver:
+                    await self.receiver.start()
+                    await self.startSonosConnection()
+                    await self.processEvents()
+                else:
+                    await self.startSonosConnection()
+                    await self.pollSubscriptions()
             except:
                 self.log.error('Error starting sonos service',exc_info=True)
+            await self.stop()
+
+        async def startWebServer(self):
+            
+            try:
+                self.webrunner=web.AppRunner(self.webapp)
+                await self.webrunner.setup()
+                site=web.TCPSite(self.webrunner, '0.0.0.0', self.config.web_port)
+                await site.start()
+                self.log.info('.. Sonos adapter web server listening on port %s' % self.config.web_port)
+                return True
+            except:
+                self.log.error('Error starting sonos web server', exc_info=True)
+            return False
+
+        async def stop(self):
+            
+            try:
+                if self.ssdp:
+                    self.ssdp.stop()
+                    self.ssdp=None
+                for worker in self.artworkers:
+                    worker.cancel()
+                await asyncio.gather(*self.artworkers, return_exceptions=True)
+                self.artworkers=[]
+                if self.receiver:
+                    await self.receiver.stop()
+                    self.receiver=None
+                if self.webrunner:
+                    await self.webrunner.cleanup()
+                    self.webrunner=None
+                if self.http:
+                    await self.http.close()
+                    self.http=None
+                await self.soap.stop()
+                await self.artcache.drain()
+                self.executor.shutdown(wait=False)
+            except:
+                self.log.error('Error stopping sonos service',exc_info=True)
                 
         async def startSonosConnection(self):
             
             try:
+                started=time.time()
+                for repair in list(self.repairs.values()):
+                    repair.cancel()
+                self.repairs={}
+                self.health={}
+                await self.unsubscribeAll()
                 self.subscriptions=[]
-                self.players=await self.sonosDiscovery()
+                self.transportactions={}
+                # players are added back to the registry one at a time as soon as each is subscribed
+                self.registry.set([])
+                self.players=[]
+                self.discovered={}
+                # fresh subscriptions start with the full state of every service, so all of it is sent again
+                self.ingested={}
+                self.stagedingest={}
+                self.pendingingest={}
+                self.pendingoverwrites={}
+                self.setuptasks=[]
+                self.setuplimit=asyncio.Semaphore(self.config.setup_concurrency)
+                self.setupstarted=started
+                if self.ssdp:
+                    # setup starts for each player the moment it answers the search
+                    await self.ssdp.search()
+                    if not self.players:
+                        for player in await self.sonosDiscovery(manual=True) or []:
+                            self.addPlayer(player)
+                else:
+                    for player in await self.sonosDiscovery(manual=self.config.discovery=='manual') or []:
+                        self.addPlayer(player)
                 if self.players:
-                    for player in self.players:
-                        await self.subscribe_player(player)
-                    await self.sonosGetSonosFavorites(self.players[0])
+                    self.stats['discovery_seconds']=time.time()-started
+                    results=await asyncio.gather(*self.setuptasks)
+                    # favorites have to come from a real room, not a bridge or a satellite speaker
+                    favoriteplayer=next((player for player in self.registry if self.registry.isVisible(player)), None)
+                    if favoriteplayer:
+                        await self.sonosGetSonosFavorites(favoriteplayer)
+                    self.stats['ready_seconds']=time.time()-started
+                    self.log.info('.. %s of %s sonos players ready in %.2fs' % (results.count(True), len(self.players), self.stats['ready_seconds']))
                     self.connect_needed=False
             except:
                 self.log.error('Error starting sonos connections',exc_info=True)
 
             
+        def addPlayer(self, player):
+            
+            # soco hands out one SoCo per address, so the same speaker listed twice is the same object
+            if player in self.players:
+                return
+            self.players.append(player)
+            self.setuptasks.append(asyncio.ensure_future(self.setupPlayer(player, self.setuplimit, self.setupstarted or time.time())))
+
+        def playerFound(self, ip, headers):
+            
+            # BOOTID changes every time a player restarts, and a restarted player has forgotten its subscriptions.  Players
+            # are known by the uid in the USN, which stays the same when a speaker's address changes.
+            bootid=headers.get('BOOTID.UPNP.ORG')
+            uid=usnUid(headers.get('USN'))
+            player=self.discovered.get(uid) or next((player for player in self.players if player.ip_address==ip), None)
+            if player==None:
+                if self.setuplimit==None:
+                    # the first search in startSonosConnection will pick it up
+                    return
+                self.log.info('.. discovered sonos player at %s' % ip)
+                player=soco.SoCo(ip)
+                if uid:
+                    self.discovered[uid]=player
+                self.addPlayer(player)
+            elif player.ip_address!=ip:
+                self.movePlayer(player, ip)
+            elif bootid and self.bootids.get(uid or ip) not in (None, bootid):
+                self.log.info('.. sonos player at %s restarted, resubscribing' % ip)
+                asyncio.ensure_future(self.resubscribePlayer(player))
+            if bootid:
+                self.bootids[uid or ip]=bootid
+
+        def movePlayer(self, player, ip):
+            
+            # A speaker that comes back on a new address, usually a new DHCP lease after a power cycle, is set up again
+            # there.  Everything keyed by the old address is dropped, including a repair that would retry it forever.
+            try:
+                uid=player.uid
+                oldip=player.ip_address
+                self.log.info('.. sonos player %s moved from %s to %s' % (self.registry.name(player), oldip, ip))
+                repair=self.repairs.pop(oldip, None)
+                if repair:
+                    repair.cancel()
+                subscriptions=[subscription for subscription in self.subscriptions if subscription.service.soco is player]
+                for subscription in subscriptions:
+                    self.subscriptions.remove(subscription)
+                asyncio.ensure_future(self.forgetAddress(player, subscriptions))
+                self.health.pop(oldip, None)
+                self.registry.remove(uid)
+                self.forgetIngested(uid)
+                self.dropPlayer(player)
+                moved=soco.SoCo(ip)
+                self.discovered[uid]=moved
+                self.addPlayer(moved)
+            except:
+                self.log.error('Error moving sonos player %s to %s' % (player.ip_address, ip), exc_info=True)
+
+        async def forgetAddress(self, player, subscriptions):
+            
+            # the old address has usually gone away, so this runs on its own rather than holding up the move
+            for subscription in subscriptions:
+                try:
+                    if isinstance(subscription, genaSubscription):
+                        await subscription.unsubscribe()
+                    else:
+                        await self.runPlayer(player, subscription.unsubscribe)
+                except:
+                    self.log.debug('.. could not unsubscribe %s at its old address' % subscription.sid)
+            self.lanes.pop(player.ip_address, None)
+
+        def dropPlayer(self, player):
+            
+            if player in self.players:
+                self.players.remove(player)
+
+        async def loadTopology(self, player):
+            
+            # One GetZoneGroupState describes the whole household, so players being set up at the same time share a request
+            try:
+                if self.topologyfetch==None or self.topologyfetch.done():
+                    self.topologyfetch=asyncio.ensure_future(self.runAction(player.zoneGroupTopology, 'GetZoneGroupState'))
+                state=await asyncio.shield(self.topologyfetch)
+                if self.topology.update(state['ZoneGroupState']):
+                    self.registry.refresh()
+                    self.ingestGroups()
+                    await self.flushIngest()
+            except:
+                self.log.error('Error getting zone group state from %s' % player.ip_address, exc_info=True)
+
+        async def resubscribePlayer(self, player):
+            
+            try:
+                for subscription in [subscription for subscription in self.subscriptions if subscription.service.soco is player]:
+                    self.subscriptions.remove(subscription)
+                    if isinstance(subscription, genaSubscription):
+                        await subscription.unsubscribe()
+                    else:
+                        await self.runPlayer(player, subscription.unsubscribe)
+                self.forgetIngested(player.uid)
+                return await self.subscribe_player(player)
+            except:
+                self.log.error('Error resubscribing to %s' % player.ip_address, exc_info=True)
+            return False
+
+        def pollUid(self, player):
+            
+            # soco takes the uid from a zone group state it caches for the whole household, which can predate a player
+            # that has just joined, and then the uid comes back as None.  Runs in the soco executor.
+            player.zone_group_state.clear_cache()
+            return player.uid
+
+        async def setupPlayer(self, player, limit, started):
+            
+            async with limit:
+                try:
+                    spinfo=await self.runPlayer(player, player.get_speaker_info)
+                    if not spinfo.get('uid'):
+                        spinfo['uid']=await self.runPlayer(player, self.pollUid, player)
+                    known=self.discovered.setdefault(spinfo['uid'], player)
+                    if known is not player:
+                        self.log.info('.. %s at %s is already set up from %s' % (spinfo['zone_name'], player.ip_address, known.ip_address))
+                        self.dropPlayer(player)
+                        return False
+                    # SSDP answers for subs, surrounds, bridges and stereo pair members as well as rooms, which soco.discover
+                    # left out.  The topology says which are visible without asking each speaker.
+                    if self.topology.visible(spinfo['uid'])==None:
+                        await self.loadTopology(player)
+                    visible=self.topology.visible(spinfo['uid'])
+                    if visible==None and not self.topology.players:
+                        # without a zone group state a room cannot be told from a satellite, so try again later
+                        self.log.warning('.. no zone group state to set up %s at %s with' % (spinfo['zone_name'], player.ip_address))
+                        if player.ip_address not in self.repairs:
+                            self.playerFailed(player, ready=False)
+                        return False
+                    if not visible:
+                        self.log.info('.. skipping %s at %s, which is not a visible room' % (spinfo['zone_name'], player.ip_address))
+                        self.dropPlayer(player)
+                        return False
+                    ginfo=self.topology.groupInfo(spinfo['uid']) or await self.getGroupInfo(player)
+                    # the room name came with the speaker info, so there is no need for another request
+                    name=spinfo['zone_name']
+                    await self.dataset.ingest({"player": { spinfo["uid"]: { "group": ginfo, "speaker": spinfo, "name":name, "ip_address":player.ip_address }}})
+                    self.subtreeIngested((spinfo["uid"], 'group'), ginfo)
+                    result=await self.subscribe_player(player)
+                    self.registry.add(player, name)
+                    self.log.info('.. %s ready after %.2fs' % (name, time.time()-started))
+                    if result:
+                        self.playerOnline(player)
+                    elif player.ip_address not in self.repairs:
+                        self.playerFailed(player, ready=True)
+                    else:
+                        self.health[player.ip_address]['ready']=True
+                    return result
+                except:
+                    self.log.error('Error setting up player: %s' % player, exc_info=True)
+            if player.ip_address not in self.repairs:
+                self.playerFailed(player, ready=False)
+            return False
+
+        def getConnectivity(self, device):
+            
+            player=self.getPlayer(device)
+            if player and self.health.get(player.ip_address, {}).get('state')=='online':
+                return 'OK'
+            return 'UNREACHABLE'
+
+        def commandFailed(self, device, player=None, error=None):
+            
+            # Called from the controllers' except blocks.  Only a speaker that could not be reached needs repairing, a bad
+            # payload or a UPnP fault like 701 (transition not available) says nothing about the subscriptions.
+            error=error or sys.exc_info()[1]
+            if error!=None and not isinstance(error, connection_errors):
+                self.log.debug('.. %s failed without a connection error, not repairing: %s' % (device.endpointId, error))
+                return
+            self.playerFailed(player or self.getPlayer(device))
+
+        def playerOnline(self, player):
+            
+            if self.health.get(player.ip_address, {}).get('state')!='online':
+                self.log.info('.. %s is online' % player.ip_address)
+            self.health[player.ip_address]={'state': 'online', 'ready': True, 'failures': 0, 'since': time.time()}
+
+        def playerFailed(self, player, ready=None):
+            
+            # Only the failing player is repaired; every other room keeps its subscriptions
+            if player==None:
+                return
+            health=self.health.setdefault(player.ip_address, {'state': 'online', 'ready': False, 'failures': 0, 'since': time.time()})
+            if ready!=None:
+                health['ready']=ready
+            if health['state']=='online':
+                health['state']='reconnecting'
+                health['since']=time.time()
+            self.stats['player_failures']+=1
+            if player.ip_address not in self.repairs:
+                self.repairs[player.ip_address]=asyncio.ensure_future(self.repairPlayer(player))
+
+        async def repairPlayer(self, player):
+            
+            health=self.health[player.ip_address]
+            try:
+                while self.running:
+                    health['failures']+=1
+                    delay=min(self.config.health_backoff*2**(health['failures']-1), self.config.health_backoff_max)
+                    health['retry']=time.time()+delay
+                    self.log.info('.. repairing %s in %ss (attempt %s)' % (player.ip_address, delay, health['failures']))
+                    await asyncio.sleep(delay)
+                    try:
+                        if health['ready']:
+                            repaired=await self.resubscribePlayer(player)
+                        else:
+                            repaired=await self.setupPlayer(player, self.setuplimit or asyncio.Semaphore(1), time.time())
+                    except:
+                        self.log.error('Error repairing %s' % player.ip_address, exc_info=True)
+                        repaired=False
+                    if repaired:
+                        self.stats['player_repairs']+=1
+                        self.playerOnline(player)
+                        return
+                    # after the first retry fails treat the player as gone until it comes back
+                    health['state']='offline'
+            finally:
+                self.repairs.pop(player.ip_address, None)
+
         async def subscribe_player(self, player):
 
             try:
                 result=True
-                if player.is_visible:
-                    for subService in ['avTransport','deviceProperties','renderingControl','zoneGroupTopology']:
-                        try:
-                            newsub=self.subscribeSonos(player,subService)
-                            if newsub:
-                                self.log.info('++ sonos state subscription: %s/%s' % (player.player_name, newsub.service.service_type))
-                                self.subscriptions.append(newsub)
-                            else:
-                                result=False
-                                break
-                        except:
-                            result=False
-                            self.log.error('!! Error subscripting to sonos state: %s/%s' % (player.player_name, subService))
-                            break
+                visible=self.topology.visible(player.uid)
+                if visible==None:
+                    visible=await self.runPlayer(player, lambda: player.is_visible)
+                if visible:
+                    results=await asyncio.gather(*[self.subscribe_service(player, subService) for subService in ['avTransport','deviceProperties','renderingControl','zoneGroupTopology']])
+                    result=all(results)
             except requests.exceptions.ConnectionError:
                 self.log.error('!! Error connecting to player: %s' % player)
                 result=False
                 
             return result
+
+        async def subscribe_service(self, player, subService):
+
+            try:
+                if self.receiver:
+                    newsub=await self.subscribeGena(player,subService)
+                else:
+                    newsub=await self.runPlayer(player, self.subscribeSonos, player, subService)
+                if newsub:
+                    self.log.info('++ sonos state subscription: %s/%s' % (self.registry.name(player), newsub.service.service_type))
+                    self.subscriptions.append(newsub)
+                    return True
+            except:
+                self.log.error('!! Error subscripting to sonos state: %s/%s' % (self.registry.name(player), subService))
+            return False
             
 
-        def sonosQuery(self, resmd="", uri=""):
-        
-            player=self.config.players[0]
-            parentsource="MediaRenderer/"
-            source="AVTransport"
-            command="SetAVTransportURI"
-            resmd='<DIDL-Lite xmlns:dc="http://purl.org/dc/elements/1.1/" xmlns:upnp="urn:schemas-upnp-org:metadata-1-0/upnp/" xmlns:r="urn:schemas-rinconnetworks-com:metadata-1-0/" xmlns="urn:schemas-upnp-org:metadata-1-0/DIDL-Lite/"><item id="1006206clibrary%2fplaylists%2f56de4623-3f02-4dc8-8d62-3a580d5325eb%2f%23library_playlist" parentID="10082064library%2fplaylists%2f%23library_playlists" restricted="true"><dc:title>A fantastic raygun</dc:title><upnp:class>object.container.playlistContainer</upnp:class><desc id="cdudn" nameSpace="urn:schemas-rinconnetworks-com:metadata-1-0/">SA_RINCON51463_X_#Svc51463-0-Token</desc></item></DIDL-Lite>'
-            uri="x-rincon-cpcontainer:1006206clibrary%2fplaylists%2f56de4623-3f02-4dc8-8d62-3a580d5325eb%2f%23library_playlist"
-            payload="<InstanceID>0</InstanceID><CurrentURI>"+uri+"</CurrentURI><CurrentURIMetaData>"+resmd+"</CurrentURIMetaData>"
-            port=1400
-        
-            url="http://"+player+":"+str(port)+"/"+parentsource+source+"/Control"
-            template='<s:Envelope s:encodingStyle="http://schemas.xmlsoap.org/soap/encoding/" xmlns:s="http://schemas.xmlsoap.org/soap/envelope/"><s:Body><u:'+command+' xmlns:u="urn:schemas-upnp-org:service:'+source+':1">'+payload+'</u:'+command+'></s:Body></s:Envelope>'
-            headers={'SOAPACTION': 'urn:schemas-upnp-org:service:'+source+':1#'+command}
-            r = requests.post(url, data=template, headers=headers)
-            namespaces = {
-                'http://schemas.xmlsoap.org/soap/envelope/': None
-            }
-            response = dict(xmltodict.parse(r.text, namespaces=namespaces))
-            self.log.info('.. sonos raw query '+command+': '+str(response))
+        async def sonosQuery(self, player, service, action, arguments=(), timeout=None):
+            
+            # Raw UPnP action on any of a player's services, e.g. sonosQuery(player, 'avTransport', 'SetAVTransportURI',
+            # [('InstanceID', 0), ('CurrentURI', uri), ('CurrentURIMetaData', metadata)])
+            response=await self.runAction(getattr(player, service), action, arguments, timeout=timeout)
+            self.log.info('.. sonos raw query %s: %s' % (action, response))
             return response
 
         
-        async def sonosDiscovery(self):
+        async def sonosDiscovery(self, manual=False):
         
             try:
-                discovered=soco.discover()
+                discovered=None if manual else await self.runSoco(soco.discover)
                 if discovered:
                     discoverlist=list(discovered)
                     self.log.info('.. sonos players: %s' % discoverlist)
@@ -525,22 +1013,11 @@ class sonos(sofabase):
                     discoverlist=None
                     
                 if discoverlist==None:
-                    discoverlist=[]
-                    for playername in self.config.players:
-                        try:
-                            player=soco.SoCo(playername)
-                            try:
-                                spinfo=player.get_speaker_info()
-                                discoverlist.append(player)
-                                self.log.info('Added manual player: %s %s' % (player.player_name, playername))
-                            except requests.exceptions.ConnectionError:
-                                self.log.error('Error getting info from speaker - removed from discovery: %s' % playername)
-                            except:
-                                self.log.error('Error getting info from speaker - removed from discovery: %s' % playername, exc_info=True)
-                        except:
-                            self.log.error('Error discovering Sonos device: %s' % playername, exc_info=True)
+                    limit=asyncio.Semaphore(self.config.setup_concurrency)
+                    probes=await asyncio.gather(*[self.probePlayer(playername, limit) for playername in self.config.players])
+                    discoverlist=[player for player in probes if player]
                             
-                if discoverlist==None:
+                if not discoverlist:
                     self.log.error('Discover: No sonos devices detected')
                     self.connect_needed=True
                     self.polltime=self.polltime*2
@@ -548,40 +1025,60 @@ class sonos(sofabase):
                         self.polltime=5
                     return None
                 self.polltime=.1
-                for player in discoverlist:
-                    try:
-                        spinfo=player.get_speaker_info()
-                        ginfo=await self.getGroupInfo(player)
-                        await self.dataset.ingest({"player": { spinfo["uid"]: { "group": ginfo, "speaker": spinfo, "name":player.player_name, "ip_address":player.ip_address }}})
-                        ginfo=player.group
-                        
-                    except:
-                        self.log.error('Error getting speaker info: %s' % player, exc_info=True)
                 return discoverlist
             except:
                 self.log.error('Error discovering Sonos devices', exc_info=True)
 
+        async def probePlayer(self, playername, limit):
+            
+            async with limit:
+                try:
+                    player=soco.SoCo(playername)
+                    try:
+                        spinfo=await self.runPlayer(player, player.get_speaker_info)
+                        self.log.info('Added manual player: %s %s' % (spinfo.get('zone_name'), playername))
+                        return player
+                    except requests.exceptions.ConnectionError:
+                        self.log.error('Error getting info from speaker - removed from discovery: %s' % playername)
+                    except:
+                        self.log.error('Error getting info from speaker - removed from discovery: %s' % playername, exc_info=True)
+                except:
+                    self.log.error('Error discovering Sonos device: %s' % playername, exc_info=True)
+            return None
+
         async def getGroupInfo(self, player):
             
             try:
+                group=await self.runPlayer(player, lambda: player.group)
                 members=[]
-                pmembers=player.group.members
-                for member in pmembers:
+                for member in group.members:
                     members.append(member.uid)
-                return {"members": members, "coordinator": player.group.coordinator.uid }
+                return {"members": members, "coordinator": group.coordinator.uid }
             except:
                 self.log.error('Error getting group info', exc_info=True)
 
 
+        def ingestGroups(self):
+            
+            for player in self.registry:
+                ginfo=self.topology.groupInfo(player.uid)
+                # a topology change usually only moves a few players, the rest keep the group they already have.  The
+                # members and the coordinator go out in the same flush so the group is never seen half changed.
+                if ginfo and self.subtreeChanged((player.uid, 'group'), ginfo):
+                    self.queueOverwrite((player.uid, 'group'), ginfo, ginfo['members'], "/player/%s/group/members" % player.uid)
+                    self.queueIngest(player.uid, { "group": { "coordinator": ginfo['coordinator'] }})
+
+
         async def getGroupUUIDs(self, playerId):
         
             try:
                 linkedPlayers=[]
-                for player in self.players:
-                    if player.player_name==playerId or player.uid==playerId:
-                        for linked in player.group:
-                            if linked.is_visible:
-                                linkedPlayers.append(linked.uid)
+                player=self.registry.byName(playerId) or self.registry.get(playerId)
+                if player:
+                    ginfo=self.topology.groupInfo(player.uid)
+                    for linked in (ginfo['members'] if ginfo else []):
+                        if self.topology.visible(linked):
+                            linkedPlayers.append(linked)
                 if linkedPlayers:
                     return ','.join(linkedPlayers)
                 else:
@@ -593,9 +1090,9 @@ class sonos(sofabase):
         async def getGroupName(self, playerId):
         
             try:
-                for player in self.players:
-                    if player.player_name==playerId or player.uid==playerId:
-                        return player.group.short_label       
+                player=self.registry.byName(playerId) or self.registry.get(playerId)
+                if player:
+                    return self.topology.shortLabel(player.uid) or ''
                 return ''
             except:
                 self.log.error('Error getting group name', exc_info=True)
@@ -607,55 +1104,21 @@ class sonos(sofabase):
                 if self.connect_needed:
                     await self.startSonosConnection()
                 try:
+                    pending=[]
                     for device in list(self.subscriptions):
                         if device.is_subscribed:
-                            if not device.events.empty():
-                                x=device.events.get(timeout=0.2)
-                                update=self.unpackEvent(x)
-                                if device.service.service_id=='AVTransport':
-                                    # apparently the AVtransport update does not work for radio station data but get_current_track_info will
-                                    current_info=device.service.soco.get_current_track_info()
-                                    #self.log.info('update: %s' % update)
-                                    #self.log.info('gcti: %s' % current_info)
-                                    del current_info['metadata']
-                                    #self.log.info('UPDATE: %s %s' % (isinstance(update['current_track_meta_data'], str), update))
-                                    if update and 'current_track_meta_data' in update:
-                                        if isinstance(update['current_track_meta_data'], str):
-                                            update['current_track_meta_data']=dict()
-                                        for item in current_info:
-                                            update['current_track_meta_data'][item]=current_info[item]
-                                    try:
-                                        path='player/%s/AVTransport/current_track_meta_data/album_art_uri' % device.service.soco.uid
-                                        await self.getArt(path, update['current_track_meta_data']['album'], update['current_track_meta_data']['album_art_uri'], self.getPlayerByUID(device.service.soco.uid).ip_address)
-                                    except:
-                                        pass
-                                        #self.log.info('no art in %s' % update, exc_info=True)
-
-                                    
-                                if device.service.service_id=='ZoneGroupTopology':
-                                    # just do them all and see what's really updated
-                                    for player in self.players:
-                                        ginfo=await self.getGroupInfo(player)
-                                        q=await self.dataset.ingest(list(ginfo['members']), overwriteLevel="/player/%s/group/members" % player.uid )
-                                        #ginfo=await self.getGroupInfo(device.service.soco)
-                                        #q=await self.dataset.ingest(list(ginfo['members']), overwriteLevel="/player/%s/group/members" % device.service.soco.uid )
-                                    try:
-                                        if 'zone_group_state' in update:
-                                            #self.log.info('.. ZoneGroupTopology update, overwriting previous data: %s ' % update)
-                                            short_update=update['zone_group_state']['ZoneGroupState']['ZoneGroups']['ZoneGroup']
-                                            #q=await self.dataset.ingest(update, overwriteLevel="/player/%s/ZoneGroupTopology" % device.service.soco.uid )
-                                            q=await self.dataset.ingest(short_update, overwriteLevel="/player/%s/ZoneGroupTopology/zone_group_state/ZoneGroupState/ZoneGroups/ZoneGroup'" % device.service.soco.uid )
-                                        else:
-                                            self.log.debug('.. ignoring ZoneGroupTopology update (no zone_group_state): %s ' % update)
-                                    except:
-                                        self.log.error('.. error with ZGT update', exc_info=True)
-                                else:
-                                    self.log.debug('.. update from %s %s %s' % (device.service.soco.uid, device.service.service_id, update) )
-                                    q=await self.dataset.ingest({'player': { device.service.soco.uid : { device.service.service_id: update }}})
-
+                            while not device.events.empty():
+                                try:
+                                    pending.append(device.events.get_nowait())
+                                except queue.Empty:
+                                    break
                         else:
                             self.log.info("Subscription ended: %s" % device.__dict__)
                             self.subscriptions.remove(device)
+                            self.playerFailed(device.service.soco)
+
+                    if pending:
+                        await self.processCycle(pending)
                             
                     #time.sleep(self.polltime)
                     await asyncio.sleep(self.polltime)
@@ -663,6 +1126,104 @@ class sonos(sofabase):
                     self.log.error('Error polling', exc_info=True)
 
 
+        async def processEvents(self):
+            
+            while self.running:
+                try:
+                    if self.connect_needed:
+                        await self.startSonosConnection()
+                        if self.connect_needed:
+                            await asyncio.sleep(self.polltime)
+                            continue
+                    pending=[await self.eventqueue.get()]
+                    # drain whatever else arrived in the same burst so each player/service is only ingested once
+                    while not self.eventqueue.empty():
+                        pending.append(self.eventqueue.get_nowait())
+                    pending=[event for event in pending if event is not None]
+                    if pending:
+                        await self.processCycle(pending)
+                except:
+                    self.log.error('Error processing events', exc_info=True)
+
+
+        async def processCycle(self, pending):
+            
+            # One pass over a burst of events, timed stage by stage for /metrics
+            started=time.perf_counter()
+            now=time.time()
+            for event in pending:
+                self.metrics.observe('queue_wait', max(0, now-event.timestamp))
+            merged=coalesceEvents(pending)
+            self.stats['events_received']+=len(pending)
+            self.stats['events_handled']+=len(merged)
+            for event in merged:
+                with self.metrics.timer('handle_event.%s' % event.service.service_id):
+                    await self.handleEvent(event.service, event)
+            with self.metrics.timer('ingest'):
+                await self.flushIngest()
+            self.metrics.observe('cycle', time.perf_counter()-started)
+
+
+        async def handleEvent(self, service, event):
+            
+            try:
+                # events from the GENA receiver were already decoded in a single pass when they arrived
+                if event.decoded:
+                    update=event.variables
+                else:
+                    with self.metrics.timer('decode'):
+                        update=self.unpackEvent(event)
+                if service.service_id=='AVTransport':
+                    if update and 'current_transport_actions' in update:
+                        self.cacheTransportActions(service.soco.uid, update['current_transport_actions'])
+                    #self.log.info('UPDATE: %s %s' % (isinstance(update['current_track_meta_data'], str), update))
+                    if update and 'current_track_meta_data' in update:
+                        if isinstance(update['current_track_meta_data'], str):
+                            update['current_track_meta_data']=dict()
+                        current_info=await self.getTrackInfo(service.soco, update)
+                        if current_info:
+                            update['current_track_meta_data'].update(current_info)
+                    else:
+                        self.stats['track_info_saved_no_metadata']+=1
+                    try:
+                        path='player/%s/AVTransport/current_track_meta_data/album_art_uri' % service.soco.uid
+                        self.queueArt(0, path, update['current_track_meta_data']['album'], update['current_track_meta_data']['album_art_uri'], self.getPlayerByUID(service.soco.uid).ip_address, 
+                                            artist=update['current_track_meta_data'].get('creator', ''))
+                    except:
+                        pass
+                        #self.log.info('no art in %s' % update, exc_info=True)
+                    self.checkTrackChange(service.soco.uid, update)
+
+
+                if service.service_id=='ZoneGroupTopology':
+                    # Every speaker sends the same zone_group_state, so only re-ingest groups when the topology really changed
+                    zone_group_state=event.elements.get('zone_group_state') if event.decoded else event.variables.get('zone_group_state')
+                    if zone_group_state is not None and self.topology.update(zone_group_state):
+                        self.registry.refresh()
+                        self.ingestGroups()
+                    try:
+                        if 'zone_group_state' in update:
+                            #self.log.info('.. ZoneGroupTopology update, overwriting previous data: %s ' % update)
+                            short_update=update['zone_group_state']['ZoneGroupState']['ZoneGroups']['ZoneGroup']
+                            #q=await self.dataset.ingest(update, overwriteLevel="/player/%s/ZoneGroupTopology" % service.soco.uid )
+                            if self.subtreeChanged((service.soco.uid, 'ZoneGroupTopology'), short_update):
+                                self.queueOverwrite((service.soco.uid, 'ZoneGroupTopology'), short_update, short_update,
+                                                    "/player/%s/ZoneGroupTopology/zone_group_state/ZoneGroupState/ZoneGroups/ZoneGroup'" % service.soco.uid)
+                        else:
+                            self.log.debug('.. ignoring ZoneGroupTopology update (no zone_group_state): %s ' % update)
+                    except:
+                        self.log.error('.. error with ZGT update', exc_info=True)
+                else:
+                    self.log.debug('.. update from %s %s %s' % (service.soco.uid, service.service_id, update) )
+                    delta=self.changedVariables((service.soco.uid, service.service_id), update or {})
+                    if delta:
+                        self.queueIngest(service.soco.uid, { service.service_id: delta })
+                        if service.service_id=='AVTransport':
+                            self.pendingnowplaying.add(service.soco.uid)
+            except:
+                self.log.error('Error handling event from %s/%s' % (service.soco.uid, service.service_id), exc_info=True)
+
+
         def subscribeSonos(self,zone,sonosservice):
             
             try:
@@ -673,6 +1234,32 @@ class sonos(sofabase):
                 self.log.error('Error configuring subscription for %s/%s' % (zone, sonosservice))
                 return None
 
+        async def subscribeGena(self,zone,sonosservice):
+            
+            try:
+                subscription=genaSubscription(self.receiver, getattr(zone, sonosservice), timeout=180)
+                if await subscription.subscribe():
+                    return subscription
+            except:
+                self.log.error('Error configuring GENA subscription for %s/%s' % (zone, sonosservice), exc_info=True)
+            return None
+
+        def subscriptionExpired(self, subscription):
+            
+            self.log.info("Subscription ended: %s/%s" % (subscription.service.soco.uid, subscription.service.service_id))
+            if subscription in self.subscriptions:
+                self.subscriptions.remove(subscription)
+            self.playerFailed(subscription.service.soco)
+
+        async def unsubscribeAll(self):
+            
+            for subscription in list(self.subscriptions):
+                try:
+                    if isinstance(subscription, genaSubscription):
+                        await subscription.unsubscribe()
+                except:
+                    self.log.error('Error removing subscription %s' % subscription.sid, exc_info=True)
+
 
         def unpackEvent(self, event):
             
@@ -702,7 +1289,7 @@ class sonos(sofabase):
             try:
                 ml=soco.music_library.MusicLibrary(player)
                 favorites=[]
-                sonosfavorites=ml.get_sonos_favorites()
+                sonosfavorites=await self.runPlayer(player, ml.get_sonos_favorites)
                 #sonosfavorites=player.get_sonos_favorites()
                 # this does not currently get the album art
                 #self.log.info('fav: %s' % sonosfavorites)
@@ -719,6 +1306,9 @@ class sonos(sofabase):
                     favorites.append(newfav)
                 favorites=sorted(favorites, key=itemgetter('title')) 
                 self.log.info('favs: %s' % favorites)
+                for index, fav in enumerate(favorites):
+                    if fav.get('album_art_uri'):
+                        self.queueArt(2, 'favorite/%s/album_art_uri' % index, '', fav['album_art_uri'], player.ip_address)
                 #self.dataset.listIngest('favorites',favorites)
                 await self.dataset.ingest({"favorite":favorites})
                 # not sure why this line is here. causes errors, probably just left over
@@ -795,9 +1385,9 @@ class sonos(sofabase):
             
             try:
                 inputlist=[]
-                for player in self.players:
-                    if player.is_visible:
-                        inputlist.append(player.player_name)
+                for player in self.registry:
+                    if self.registry.isVisible(player):
+                        inputlist.append(self.registry.name(player))
                 return inputlist
             except:
                 self.log.error('Error getting input list', exc_info=True)
@@ -843,21 +1433,17 @@ class sonos(sofabase):
 
         def getPlayer(self, device): 
             try:
-                for player in self.players:
-                    if 'sonos:player:%s' % player.uid==device.endpointId:
-                        return player
-                self.log.warning('.! warning - did not find player for %s in %s' % (device.endpointId, self.players))
-                return None
+                player=self.registry.byEndpointId(device.endpointId)
+                if player==None:
+                    self.log.warning('.! warning - did not find player for %s in %s' % (device.endpointId, self.players))
+                return player
             except:
                 self.log.error('Error getting player', exc_info=True)
                 return None
 
         def getPlayerByUID(self, uid): 
             try:
-                for player in self.players:
-                    if player.uid==uid:
-                        return player
-                return None
+                return self.registry.get(uid)
             except:
                 self.log.error('Error getting player', exc_info=True)
                 return None
@@ -866,60 +1452,270 @@ class sonos(sofabase):
 
         async def getPlayerOrCoordinator(self, device, direct=False):
             
+            player=None
             try:
-                dev=self.dataset.getDeviceByEndpointId(device.endpointId)
-                try:
-                    coord=dev.endpointId
-                except AttributeError:
-                    self.log.error('!! Player is not available for command: %s %s %s %s.' % (endpointId, controller, command, payload))
+                player=self.registry.byEndpointId(device.endpointId)
+                if player==None:
+                    self.log.error('!! Player is not available for command: %s' % device.endpointId)
                     return None
-                try:
-                    if direct==False and dev.InputController.input and dev.InputController.input!=dev.friendlyName:
-                        coord=self.dataset.getDeviceByFriendlyName(dev.InputController.input).endpointId
-                        self.log.info('Setting %s to coordinator instead: %s' % (device.endpointId, dev.InputController.input))
-                except:
-                    coord=dev.endpointId
+                if direct:
+                    return player
+
+                coordinator=self.registry.coordinator(player)
+                if coordinator==None:
+                    # topology has not arrived yet for this player, so ask it directly
+                    coordinator_uid=await self.runPlayer(player, lambda: player.group.coordinator.uid)
+                    coordinator=self.registry.get(coordinator_uid) or player
+                if coordinator is not player:
+                    self.log.info('Setting %s to coordinator instead: %s' % (device.endpointId, coordinator.uid))
+                return coordinator
 
-                if self.players==None:
-                    self.log.error('!! No players are available for command: %s %s %s %s.' % (endpointId, controller, command, payload))
-                    return None
-                    
-                for player in self.players:
-                    if 'sonos:player:%s' % player.uid==coord:
-                        selected_player=player
-                        if selected_player.uid!=selected_player.group.coordinator.uid:
-                            for player in self.players:
-                                if player.uid==selected_player.group.coordinator.uid:
-                                    return player
-                        return selected_player
-                        
-                self.log.info('Could not find device: %s' % coord)
             except soco.exceptions.SoCoSlaveException:
-                self.log.error('Error from Soco while trying to issue command to a non-coordinator %s %s', (endpointId, command))
+                self.log.error('Error from Soco while trying to issue command to a non-coordinator %s' % device.endpointId)
             except soco.exceptions.SoCoUPnPException:
-                self.log.error('Error from Soco while trying to issue command %s against possible commands: %s' % (command, actions), exc_info=True)
-                self.log.error("It is likely that we have now lost connection, subscriptions are dead, and the adapter needs to be restarted")
-                self.connect_needed=True
+                # a fault is an answer, so the player is reachable and its subscriptions are fine
+                self.log.error('Error from Soco while trying to find the coordinator for %s' % device.endpointId, exc_info=True)
             except:
                 self.log.info('!! Error finding proper device or coordinator for %s' % device, exc_info=True)
+                if isinstance(sys.exc_info()[1], connection_errors):
+                    self.playerFailed(player)
             
             return None
             
             
-        async def getPlayerActions(self, player):
+        def queueIngest(self, uid, update):
+            
+            # Player updates are collected over a processing cycle and ingested together by flushIngest, so the dataset
+            # works out its change notifications once per burst instead of once per event
+            pending=self.pendingingest.setdefault(uid, {})
+            for name, value in update.items():
+                if isinstance(value, dict) and isinstance(pending.get(name), dict):
+                    pending[name]={**pending[name], **value}
+                else:
+                    pending[name]=value
+
+        def queueOverwrite(self, key, value, data, overwriteLevel):
+            
+            # Subtrees that replace what the dataset has at overwriteLevel are sent by flushIngest just ahead of the
+            # batched updates, and remembered as ingested once they are in
+            self.pendingoverwrites[key]=(value, data, overwriteLevel)
+
+        async def flushIngest(self):
+            
+            if not self.pendingingest and not self.pendingoverwrites:
+                return
+            pending, self.pendingingest=self.pendingingest, {}
+            staged, self.stagedingest=self.stagedingest, {}
+            overwrites, self.pendingoverwrites=self.pendingoverwrites, {}
+            nowplaying, self.pendingnowplaying=self.pendingnowplaying, set()
+            for key, (value, data, overwriteLevel) in overwrites.items():
+                try:
+                    with self.metrics.timer('ingest_overwrite'):
+                        await self.dataset.ingest(data, overwriteLevel=overwriteLevel)
+                    self.subtreeIngested(key, value)
+                except:
+                    self.log.error('Error ingesting %s' % overwriteLevel, exc_info=True)
+                    self.stats['ingest_failures']+=1
+            if not pending:
+                return
+            self.stats['ingest_batches']+=1
+            self.stats['ingest_batched_players']+=len(pending)
+            try:
+                await self.dataset.ingest({'player': pending})
+            except:
+                # nothing in the batch is remembered as sent, so the next event with the same values tries again
+                self.log.error('Error ingesting player updates for %s' % list(pending.keys()), exc_info=True)
+                self.stats['ingest_failures']+=1
+                return
+            for key, values in staged.items():
+                self.ingested.setdefault(key, {}).update(values)
+            # now playing is built from the dataset, so it has to wait until the batch is in
+            for uid in nowplaying:
+                self.updateNowPlaying(uid)
+
+        def changedVariables(self, key, update):
+            
+            # Only the variables that differ from what was last ingested for this player and service are sent on, since
+            # most events repeat the whole state of the service to change one or two values
+            # The delta is staged until flushIngest has really sent it, and only then becomes what was last ingested.
+            previous=self.ingested.get(key, {})
+            staged=self.stagedingest.setdefault(key, {})
+            delta={}
+            for name, value in update.items():
+                sent=staged[name] if name in staged else previous.get(name, missing)
+                if sent!=value:
+                    delta[name]=value
+            if not delta:
+                self.stats['ingest_suppressed']+=1
+                return delta
+            if len(delta)<len(update):
+                self.stats['ingest_shrunk']+=1
+                self.stats['ingest_variables_suppressed']+=len(update)-len(delta)
+            self.stats['ingest_sent']+=1
+            staged.update(copy.deepcopy(delta))
+            return delta
+
+        def subtreeChanged(self, key, value):
+            
+            # for data that is ingested with an overwriteLevel and replaced as a whole.  The caller records it with
+            # subtreeIngested once the ingest has gone through.  One that is already queued is what will be sent last.
+            queued=self.pendingoverwrites.get(key)
+            if (queued[0] if queued else self.ingested.get(key, missing))==value:
+                self.stats['ingest_suppressed']+=1
+                return False
+            self.stats['ingest_sent']+=1
+            return True
+
+        def subtreeIngested(self, key, value):
+            
+            self.ingested[key]=copy.deepcopy(value)
+
+        def forgetIngested(self, uid):
+            
+            # a resubscribed player starts over with its full state
+            for key in [key for key in self.ingested if key[0]==uid]:
+                del self.ingested[key]
+            for key in [key for key in self.stagedingest if key[0]==uid]:
+                del self.stagedingest[key]
+
+        async def getTrackInfo(self, player, update):
+            
+            # apparently the AVtransport update does not work for radio station data but get_current_track_info will.
+            # Only ask when the event left something out, and only once per track on the group coordinator.
+            try:
+                track=update['current_track_meta_data']
+                if track.get('title') and track.get('creator') and track.get('album') and not track.get('stream_content'):
+                    self.stats['track_info_saved_complete']+=1
+                    return None
+
+                coordinator=self.registry.coordinator(player) or player
+                # radio keeps the same uri for the whole stream, so the stream content tells songs apart.  Without a uri
+                # there is nothing to tell this track from the last one, so the answer is neither reused nor kept.
+                uri=update.get('current_track_uri')
+                key=(uri, track.get('stream_content'))
+                cached=self.trackinfo.get(coordinator.uid)
+                if uri and cached and cached[0]==key:
+                    self.stats['track_info_saved_cached']+=1
+                    return cached[1]
+
+                self.stats['track_info_queries']+=1
+                with self.metrics.timer('track_info'):
+                    current_info=await self.runPlayer(coordinator, coordinator.get_current_track_info)
+                del current_info['metadata']
+                if uri and current_info.get('uri') in (None, '', uri):
+                    self.trackinfo[coordinator.uid]=(key, current_info)
+                else:
+                    self.trackinfo.pop(coordinator.uid, None)
+                return current_info
+            except:
+                self.log.error('Error getting track info for %s' % self.registry.name(player), exc_info=True)
+            return None
+
+        def cacheTransportActions(self, uid, actions):
+            
+            self.transportactions[uid]={'actions': [action.strip() for action in actions.split(',') if action.strip()], 'updated': time.time()}
+
+        async def getPlayerActions(self, player, action=None):
             try:
-                #self.log.info("player: %s" % player)
+                # The cached set can trail a command the adapter has just sent, like a Pause right after a Play, so an
+                # action that is missing from it is confirmed with the player before it is reported as unavailable.
+                cached=self.transportactions.get(player.uid)
+                if cached and time.time()-cached['updated']<self.config.actions_max_age:
+                    if action==None or action in cached['actions']:
+                        self.stats['actions_cache_hit']+=1
+                        return cached['actions']
+                    self.stats['actions_cache_confirm']+=1
+
+                self.stats['actions_cache_miss']+=1
+                self.log.debug('.. transport actions cache miss for %s (%s hits / %s misses)' % (self.registry.name(player), self.stats['actions_cache_hit'], self.stats['actions_cache_miss']))
                 #self.log.info("actions: %s" % player.avTransport.GetCurrentTransportActions([('InstanceID', 0)]))
-                return player.avTransport.GetCurrentTransportActions([('InstanceID', 0)])['Actions'].split(', ')
+                actions=await self.runAction(player.avTransport, 'GetCurrentTransportActions', [('InstanceID', 0)])
+                self.cacheTransportActions(player.uid, actions['Actions'])
+                return self.transportactions[player.uid]['actions']
             except:
-                self.log.error('Could not get available actions for %s' % player.player_name, exc_info=True)
-                self.connect_needed=True
+                self.log.error('Could not get available actions for %s' % self.registry.name(player), exc_info=True)
+                # only a player that could not be reached needs repairing, as in commandFailed
+                if isinstance(sys.exc_info()[1], connection_errors):
+                    self.playerFailed(player)
             return []
             
+        async def runBatch(self, operation, calls):
+            
+            # calls are (player, coroutine) pairs.  Each goes through its player's lane, so different speakers and groups
+            # are driven in parallel while anything else sent to the same speaker keeps its order.
+            self.stats['batch_operations']+=1
+            self.stats['batch_calls']+=len(calls)
+            with self.metrics.timer('batch.%s' % operation):
+                results=await asyncio.gather(*[call for player, call in calls], return_exceptions=True)
+            failed={}
+            for (player, call), result in zip(calls, results):
+                if isinstance(result, Exception):
+                    self.log.warning('.! batch %s failed for %s: %s' % (operation, self.registry.name(player), result))
+                    failed[player.uid]=str(result)
+            self.stats['batch_failures']+=len(failed)
+            return {'operation': operation, 'players': [player.uid for player, call in calls], 'failed': failed}
+
+        async def setRelativeGroupVolume(self, coordinator, adjustment):
+            
+            # What soco's ZoneGroup.set_relative_volume sends, without first asking the speaker for player.group.  The
+            # snapshot keeps the members' volumes in proportion as the group volume moves.
+            await self.runAction(coordinator.groupRenderingControl, 'SnapshotGroupVolume', [('InstanceID', 0)])
+            response=await self.runAction(coordinator.groupRenderingControl, 'SetRelativeGroupVolume', [('InstanceID', 0), ('Adjustment', adjustment)])
+            return int(response['NewVolume'])
+
+        async def setRelativeVolume(self, player, adjustment):
+            
+            response=await self.runAction(player.renderingControl, 'SetRelativeVolume', [('InstanceID', 0), ('Channel', 'Master'), ('Adjustment', adjustment)])
+            return int(response['NewVolume'])
+
+        async def setGroupMute(self, coordinator, mute):
+            
+            await self.runAction(coordinator.groupRenderingControl, 'SetGroupMute', [('InstanceID', 0), ('DesiredMute', '1' if mute else '0')])
+
+        def batchPlayers(self, payload, default):
+            
+            # payload 'players' is a list of room names or endpointIds
+            if not payload or 'players' not in payload:
+                return default
+            players=[self.registry.find(reference) for reference in payload['players']]
+            missing=[reference for reference, player in zip(payload['players'], players) if player is None]
+            if missing:
+                raise KeyError('unknown players %s' % missing)
+            return players
+
+        async def batchRelativeVolume(self, players, adjustment):
+            
+            # Whole groups take one GroupRenderingControl call on the coordinator, anything else is set player by player
+            coordinators, singles=self.registry.partition(players)
+            return await self.runBatch('volume', [(coordinator, self.setRelativeGroupVolume(coordinator, adjustment)) for coordinator in coordinators]+
+                                                    [(player, self.runPlayer(player, player.set_relative_volume, adjustment)) for player in singles])
+
+        async def batchMute(self, players, mute):
+            
+            coordinators, singles=self.registry.partition(players)
+            return await self.runBatch('mute', [(coordinator, self.setGroupMute(coordinator, mute)) for coordinator in coordinators]+
+                                                [(player, self.setPlayerValue(player, 'mute', mute)) for player in singles])
+
+        async def batchTransport(self, players, action):
+            
+            # Transport commands always go to the group coordinator, so each group is only sent the command once
+            coordinators=[]
+            for player in players:
+                coordinator=self.registry.coordinator(player) or player
+                if coordinator not in coordinators:
+                    coordinators.append(coordinator)
+            return await self.runBatch(action.lower(), [(coordinator, self.batchTransportAction(coordinator, action)) for coordinator in coordinators])
+
+        async def batchTransportAction(self, coordinator, action):
+            
+            # a group that is already stopped has no Pause or Stop to offer, which is not a failure
+            if action in await self.getPlayerActions(coordinator, action):
+                await self.runAction(coordinator.avTransport, action, [('InstanceID', 0), ('Speed', 1)])
+
         def getPlayerCoordinator(self, player):
             try:
-                coord=player.group.coordinator.uid
-                return self.dataset.nativeDevices['player'][coord]
+                coordinator=self.registry.coordinator(player)
+                return self.dataset.nativeDevices['player'][coordinator.uid]
             except:
                 self.log.error('Error getting coordinator', exc_info=True)
  
@@ -928,26 +1724,242 @@ class sonos(sofabase):
                 player=self.getPlayer(device)
                 if player==None:
                     return None
-                if player.group==None:
+                coordinator=self.registry.coordinator(player)
+                if coordinator==None:
                     return None
-                return self.dataset.nativeDevices['player'][player.group.coordinator.uid]
+                return self.dataset.nativeDevices['player'][coordinator.uid]
             except:
                 self.log.error('Error getting coordinator', exc_info=True)
             return None
            
             
+        def updateNowPlaying(self, uid):
+            
+            try:
+                self.nowplaying[uid]=self.buildNowPlaying(uid, self.dataset.nativeDevices['player'][uid]['AVTransport'])
+            except:
+                self.log.error('Error building now playing for %s' % uid, exc_info=True)
+                self.nowplaying.pop(uid, None)
+
+        def buildNowPlaying(self, uid, avtransport):
+            
+            # Everything MusicController reports, worked out once per AVTransport update rather than on every property read
+            nowplaying=self.emptyNowPlaying()
+            
+            # CHEESE 6/13 - Sonos has clearly made some changes to the way they are handling lineinput in their data reporting
+            # and the item_id check no longer works. Now the line-in seems to get labeled "AirPlay Device: (device name)"
+            try:
+                if avtransport['av_transport_uri_meta_data']['item_id']=='lineinput':
+                    nowplaying['source']='linein'
+            except:
+                pass
+            try:
+                if avtransport['av_transport_uri_meta_data']['title'].startswith('AirPlay Device:'):
+                    nowplaying['source']='linein'
+            except:
+                pass
+
+            if nowplaying['source']=='linein':
+                nowplaying.update({'title': 'Line-In', 'url': 'lineinput'})
+                return nowplaying
+            nowplaying['source']='stream'
+
+            track=avtransport.get('current_track_meta_data', {})
+            enqueued=avtransport.get('enqueued_transport_uri_meta_data', {})
+            if not isinstance(track, dict):
+                track={}
+            if not isinstance(enqueued, dict):
+                enqueued={}
+            
+            # Images for services like soundcloud do not seem to use the album_art_uri - they populate it with a link that will
+            # generate a 404.  In these cases you must get the data from avtransport/enqueued_transport_uri_meta_data
+            if 'creator' in track:
+                nowplaying['artist']=track['creator']
+            elif 'artist' in track:
+                nowplaying['artist']=track['artist']
+            elif enqueued.get('creator'):
+                nowplaying['artist']=enqueued['creator']
+
+            if track.get('title'):
+                nowplaying['title']=title_cleanup.sub("", track['title'])
+            elif enqueued.get('title'):
+                nowplaying['title']=title_cleanup.sub("", enqueued['title'])
+
+            nowplaying['album']=track.get('album', '')
+            nowplaying['url']=avtransport.get('enqueued_transport_uri', '')
+
+            if enqueued.get('album_art_uri'):
+                nowplaying['art']=self.versionedArt("/image/sonos/player/%s/AVTransport/enqueued_transport_uri_meta_data/album_art_uri" % uid)
+            elif 'album' in track and 'album_art_uri' in track:
+                nowplaying['art']=self.versionedArt("/image/sonos/player/%s/AVTransport/current_track_meta_data/album_art_uri?album=%s" % (uid, track['album']))
+            elif 'album' in track and 'album_art' in track:
+                nowplaying['art']=self.versionedArt("/image/sonos/player/%s/AVTransport/current_track_meta_data/album_art?album=%s" % (uid, track['album']))
+            return nowplaying
+
+        def versionedArt(self, url):
+            
+            # Adding the content hash means the url changes exactly when the image does, so clients can cache it forever
+            imagehash=self.imageHash(url.split('?',1)[0][len('/image/sonos/'):])
+            # relative unless art_base_url says where clients can reach the adapter's own server
+            if self.config.art_base_url:
+                url=self.config.art_base_url.rstrip('/')+url
+            if not imagehash:
+                return url
+            return "%s%sv=%s" % (url, '&' if '?' in url else '?', imagehash)
+
+        def emptyNowPlaying(self):
+            
+            return dict(empty_now_playing, art=self.versionedArt('/image/sonos/logo'))
+
+        def imageHash(self, path, size=None):
+            
+            if path in self.logohashes:
+                if size==None:
+                    return self.logohashes[path]
+                return self.artcache.hash("%s@%s" % (path, size))
+            if size==None:
+                return self.artcache.hash(self.artpaths[path]) if path in self.artpaths else None
+            return self.artcache.hash("%s@%s" % (self.artpaths.get(path, path), size))
+
+        def setArtPath(self, path, key):
+            
+            if self.artpaths.get(path)==key:
+                return
+            self.artpaths[path]=key
+            # now playing art urls carry the image hash, so they need rebuilding once the image is known
+            parts=path.split('/')
+            if len(parts)>2 and parts[0]=='player' and parts[2]=='AVTransport' and parts[1] in self.nowplaying:
+                self.updateNowPlaying(parts[1])
+
+        async def imageHandler(self, request):
+            
+            try:
+                path=request.match_info['path']
+                size=thumbnailSize(request.query.get('width'), request.query.get('height'))
+                etag=self.imageHash(path, size)
+                if etag and request.query.get('v')==self.imageHash(path):
+                    headers={'Cache-Control': 'public, max-age=31536000, immutable'}
+                else:
+                    headers={'Cache-Control': 'public, max-age=60'}
+                if etag:
+                    headers['ETag']='"%s"' % etag
+                    matches=[tag.strip().replace('W/','') for tag in request.headers.get('If-None-Match', '').split(',')]
+                    if headers['ETag'] in matches or '*' in matches:
+                        self.stats['image_not_modified']+=1
+                        return web.Response(status=304, headers=headers)
+
+                if size:
+                    image=await self.virtualThumbnail(path, width=size, height=size)
+                else:
+                    image=await self.virtualImage(path)
+                if not etag:
+                    etag=self.imageHash(path, size)
+                    if etag:
+                        headers['ETag']='"%s"' % etag
+                self.stats['image_sent']+=1
+                return web.Response(body=image, content_type=contentType(image), headers=headers)
+            except:
+                self.log.error('Error serving image %s' % request.path, exc_info=True)
+                return web.Response(status=500)
+
+        def addGauges(self):
+            
+            # read only when /metrics is requested, so none of this costs anything on the hot path
+            self.metrics.gauge('subscriptions', lambda: len(self.subscriptions))
+            self.metrics.gauge('players', lambda: len(self.registry))
+            self.metrics.gauge('players_offline', lambda: len([health for health in self.health.values() if health['state']!='online']))
+            self.metrics.gauge('event_queue_depth', self.eventQueueDepth)
+            self.metrics.gauge('art_queue_depth', lambda: self.artqueue.qsize() if self.artqueue else 0)
+            self.metrics.gauge('art_inflight', lambda: len(self.artinflight))
+            self.metrics.gauge('thumbnails_inflight', lambda: len(self.thumbnailinflight))
+            self.metrics.gauge('pending_ingest_players', lambda: len(self.pendingingest))
+            self.metrics.gauge('sets_waiting', lambda: len(self.pendingsets))
+            self.metrics.gauge('lanes_busy', lambda: len([lane for lane in self.lanes.values() if lane.locked()]))
+            self.metrics.gauge('actions_cache_hit_rate', lambda: self.hitRate(self.stats['actions_cache_hit'], self.stats['actions_cache_miss']))
+            self.metrics.gauge('track_info_hit_rate', lambda: self.hitRate(self.stats['track_info_saved_complete']+self.stats['track_info_saved_cached'], self.stats['track_info_queries']))
+            self.metrics.gauge('art_cache_hit_rate', lambda: self.hitRate(self.artcache.stats['hits']+self.artcache.stats['disk_hits'], self.artcache.stats['misses']))
+            self.metrics.gauge('art_cache', self.artcache.summary)
+            self.metrics.gauge('soap', lambda: dict(self.soap.stats))
+
+        def eventQueueDepth(self):
+            
+            if self.eventqueue:
+                return self.eventqueue.qsize()
+            # soco keeps a queue on each subscription in the polling fallback
+            return sum([subscription.events.qsize() for subscription in self.subscriptions if hasattr(subscription, 'events')])
+
+        def hitRate(self, hits, misses):
+            
+            return round(hits/(hits+misses), 3) if hits+misses else None
+
+        async def metricsHandler(self, request):
+            
+            try:
+                return web.json_response({**self.metrics.snapshot(), 'counters': dict(self.stats)})
+            except:
+                self.log.error('Error serving metrics', exc_info=True)
+                return web.Response(status=500)
+
+        def getNowPlaying(self, device):
+            
+            try:
+                coordinator=self.registry.coordinator(self.getPlayer(device))
+                return self.nowplaying.get(coordinator.uid) or self.emptyNowPlaying()
+            except:
+                return self.emptyNowPlaying()
+
         async def virtualThumbnail(self, path, client=None, width=None, height=None):
             
             try:
-                return await self.virtualImage(path, client=client)
+                image=await self.virtualImage(path, client=client)
+                size=thumbnailSize(width, height)
+                if size==None or not image or sonosart.Image==None:
+                    return image
+
+                key="%s@%s" % (self.artpaths.get(path, path), size)
+                thumbnail=await self.artcache.get(key)
+                if thumbnail:
+                    return thumbnail
+
+                render=self.thumbnailinflight.get(key)
+                if not render:
+                    render=asyncio.ensure_future(self.renderThumbnail(key, image, size))
+                    self.thumbnailinflight[key]=render
+                    render.add_done_callback(lambda f: self.thumbnailinflight.pop(key, None))
+                return await asyncio.shield(render)
             except:
-                self.log.error('Couldnt get art for %s' % playerObject, exc_info=True)
+                self.log.error('Couldnt get thumbnail for %s' % path, exc_info=True)
                 #return {'name':playerObject['name'], 'id':playerObject['speaker']['uid'], 'image':""}
 
-        async def getArt(self, path, album, url="", ip=""):
+        async def renderThumbnail(self, key, image, size):
+            
+            try:
+                # decoding and scaling a large jpeg takes long enough to stall event handling, so keep it off the loop.  It
+                # goes to the loop's default executor rather than the soco one, so renders never hold up player calls.
+                if len(image)>65536:
+                    thumbnail=await asyncio.get_event_loop().run_in_executor(None, renderThumbnail, image, size)
+                else:
+                    thumbnail=renderThumbnail(image, size)
+                self.artcache.put(key, thumbnail)
+                return thumbnail
+            except:
+                self.log.error('Error rendering %spx thumbnail for %s' % (size, key), exc_info=True)
+                return image
+
+        def artKey(self, album, url, artist=''):
+            
+            # The same album is served under a different /getaa url for every track, so key on the album where there is one
+            if album:
+                return "album:%s/%s" % (artist, album)
+            return "url:%s" % url
+
+        async def getArt(self, path, album, url="", ip="", artist=''):
             try:
-                if path in self.artcache and self.artcache[path]['album']==album:
-                    return self.artcache[path]['image']
+                key=self.artKey(album, url, artist)
+                image=await self.artcache.get(key)
+                if image:
+                    self.setArtPath(path, key)
+                    return image
                     
                 if url.find('http')==0:
                     pass
@@ -959,15 +1971,104 @@ class sonos(sofabase):
                 else:
                     return self.sonoslogo
 
-                timeout = aiohttp.ClientTimeout(total=10)
-                async with aiohttp.ClientSession(timeout=timeout) as client:
-                    self.log.info('.. downloading and caching album art: %s' % url)
-                    async with client.get(url, timeout=10) as response:
-                        result=await response.read()
-                        if result:
-                            self.artcache[path]={'url':url, 'album': album, 'image':result}
-                            #self.log.info('artcache %s' % self.artcache.keys())
-                            return result            
+                if url in self.artfailures:
+                    if time.time()-self.artfailures[url]<self.config.art_retry_delay:
+                        self.stats['art_negative_hits']+=1
+                        return self.sonoslogo
+                    del self.artfailures[url]
+
+                # Group members and UI clients tend to ask for the same art at the same moment, so share one download
+                fetch=self.artinflight.get(url)
+                if fetch:
+                    self.stats['art_shared_fetches']+=1
+                else:
+                    fetch=asyncio.ensure_future(self.fetchArt(key, url, path))
+                    self.artinflight[url]=fetch
+                    fetch.add_done_callback(lambda f: self.artinflight.pop(url, None))
+                result=await asyncio.shield(fetch)
+                if result:
+                    self.setArtPath(path, key)
+                    return result
+
+            except concurrent.futures._base.CancelledError:
+                self.log.error('.! Attempt to get art from sonos device cancelled for %s ' % (path))
+            except:
+                self.log.error('Couldnt get art for %s' % path, exc_info=True)
+                
+            return self.sonoslogo
+
+        def queueArt(self, priority, path, album, url, ip, artist=''):
+            
+            # 0 is the track playing now, 1 is upcoming queue items and 2 is favorites
+            if not url or (url, path) in self.artqueued or self.artqueue==None:
+                return
+            self.artqueued.add((url, path))
+            self.artsequence+=1
+            job={'path': path, 'album': album, 'url': url, 'ip': ip, 'artist': artist}
+            # virtualImage looks here for art that is asked for before a worker gets to it
+            self.artjobs[path]=job
+            self.artqueue.put_nowait((priority, self.artsequence, job))
+
+        async def artWorker(self):
+            
+            while True:
+                priority, sequence, job=await self.artqueue.get()
+                try:
+                    with self.metrics.timer('art'):
+                        await self.getArt(job['path'], job['album'], job['url'], job['ip'], artist=job['artist'])
+                except:
+                    self.log.error('Error prefetching art for %s' % job['path'], exc_info=True)
+                finally:
+                    self.artqueued.discard((job['url'], job['path']))
+                    if self.artjobs.get(job['path']) is job:
+                        del self.artjobs[job['path']]
+                    self.artqueue.task_done()
+
+        def checkTrackChange(self, uid, update):
+            
+            try:
+                track_uri=update.get('current_track_uri')
+                if not track_uri or self.lasttrack.get(uid)==track_uri:
+                    return
+                self.lasttrack[uid]=track_uri
+                player=self.registry.get(uid)
+                # members share the coordinator's queue so only look ahead once per group
+                if player and self.registry.coordinator(player) in (None, player):
+                    asyncio.ensure_future(self.queueUpcomingArt(player, int(update.get('current_track') or 0)))
+            except:
+                self.log.error('Error checking track change for %s' % uid, exc_info=True)
+
+        async def queueUpcomingArt(self, player, position):
+            
+            try:
+                # current_track is 1-based, so it is also the queue index of the next track
+                tracks=await self.runPlayer(player, player.get_queue, start=position, max_items=self.config.art_prefetch_depth)
+                for index, track in enumerate(tracks):
+                    if getattr(track, 'album_art_uri', ''):
+                        self.queueArt(1, 'player/%s/queue/%s/album_art_uri' % (player.uid, position+index), getattr(track, 'album', ''), 
+                                        track.album_art_uri, player.ip_address, artist=getattr(track, 'creator', ''))
+            except:
+                self.log.error('Error getting upcoming art for %s' % self.registry.name(player), exc_info=True)
+
+        async def fetchArt(self, key, url, path):
+            
+            try:
+                if self.http==None:
+                    self.http=self.httpSession()
+                self.log.info('.. downloading and caching album art: %s' % url)
+                started=time.time()
+                async with self.http.get(url) as response:
+                    result=await response.read()
+                    elapsed=time.time()-started
+                    self.metrics.observe('art_fetch', elapsed)
+                    self.stats['art_fetches']+=1
+                    self.stats['art_fetch_seconds']+=elapsed
+                    self.stats['art_fetch_max_seconds']=max(self.stats['art_fetch_max_seconds'], elapsed)
+                    if response.status==200 and result:
+                        self.artcache.put(key, result)
+                        #self.log.info('artcache %s' % self.artcache.summary())
+                        return result            
+                    self.log.warning('.! No art returned from %s (%s)' % (url, response.status))
 
             except concurrent.futures._base.TimeoutError:
                 self.log.error('.! Attempt to get art from sonos device timed out for %s ' % (path))
@@ -978,8 +2079,13 @@ class sonos(sofabase):
             except:
                 self.log.error('Couldnt get art for %s' % path, exc_info=True)
                 #return {'name':playerObject['name'], 'id':playerObject['speaker']['uid'], 'image':""}
-                
-            return self.sonoslogo
+
+            self.stats['art_failures']+=1
+            now=time.time()
+            for failed in [failed for failed in self.artfailures if now-self.artfailures[failed]>self.config.art_retry_delay]:
+                del self.artfailures[failed]
+            self.artfailures[url]=now
+            return None
 
         async def virtualImage(self, path, client=None, width=None, height=None):
             
@@ -996,16 +2102,24 @@ class sonos(sofabase):
                 playerObject=self.dataset.getObjectFromPath(self.dataset.getObjectPath("/"+path))
                 url=self.dataset.getObjectFromPath("/"+path)
 
-                if path in self.artcache:
-                    return self.artcache[path]['image']
+                if path in self.artpaths:
+                    image=await self.artcache.get(self.artpaths[path])
+                    if image:
+                        return image
+
+                # the art is queued but no worker has got to it yet, so fetch it now.  getArt shares the download with
+                # the worker if it has just started on it.
+                job=self.artjobs.get(path)
+                if job:
+                    self.stats['art_queued_requests']+=1
+                    return await self.getArt(job['path'], job['album'], job['url'], job['ip'], artist=job['artist'])
 
             except concurrent.futures._base.CancelledError:
                 self.log.error('Attempt to get art cancelled for %s %s' % (path,url))
                 #self.connect_needed=True
                 
             except AttributeError:
-                self.log.error('Couldnt get art for %s' % playerObject, exc_info=True)
-                self.connect_needed=True
+                self.log.error('Couldnt get art for %s' % path, exc_info=True)
                 
             except:
                 self.log.error('Couldnt get art for %s' % playerObject, exc_info=True)
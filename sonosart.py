@@ -0,0 +1,214 @@
+#!/usr/bin/python3
+
+import os
+import io
+import asyncio
+import hashlib
+from collections import OrderedDict, defaultdict
+
+try:
+    from PIL import Image
+except ImportError:
+    Image=None
+
+# thumbnails are only ever rendered at these sizes, so each image has at most this many renditions
+thumbnail_sizes=[64, 128, 256, 512]
+
+
+def thumbnailSize(width=None, height=None):
+
+    # width and height come straight from the query string, so anything that is not a number means no size
+    try:
+        requested=max(int(width or 0), int(height or 0))
+    except (TypeError, ValueError):
+        return None
+    if not requested:
+        return None
+    for size in thumbnail_sizes:
+        if size>=requested:
+            return size
+    return None
+
+
+def contentHash(image):
+
+    return hashlib.sha1(image).hexdigest()[:16]
+
+
+def contentType(image):
+
+    if image[:8]==b'\x89PNG\r\n\x1a\n':
+        return 'image/png'
+    if image[:3]==b'\xff\xd8\xff':
+        return 'image/jpeg'
+    if image[:6] in (b'GIF87a', b'GIF89a'):
+        return 'image/gif'
+    if image[:4]==b'RIFF' and image[8:12]==b'WEBP':
+        return 'image/webp'
+    return 'application/octet-stream'
+
+
+def renderThumbnail(image, size):
+
+    source=Image.open(io.BytesIO(image))
+    if max(source.size)<=size:
+        return image
+    source.thumbnail((size, size))
+    output=io.BytesIO()
+    if source.mode in ('RGBA', 'LA', 'P'):
+        source.save(output, format='PNG', optimize=True)
+    else:
+        source.convert('RGB').save(output, format='JPEG', quality=85)
+    return output.getvalue()
+
+
+class artCache(object):
+
+    # Two tier album art cache.  Recently used images are kept in memory up to max_bytes, and every image is also
+    # written to directory so the cache survives restarts.  The directory is trimmed oldest first to max_disk_bytes.
+    # Once the index is loaded, all file reads, writes and removals run in the loop's default executor.
+
+    def __init__(self, log=None, max_bytes=32*1024*1024, directory='', max_disk_bytes=256*1024*1024):
+        self.log=log
+        self.max_bytes=max_bytes
+        self.directory=directory
+        self.max_disk_bytes=max_disk_bytes
+        self.entries=OrderedDict()
+        self.hashes={}
+        self.size=0
+        self.disk=OrderedDict()
+        self.disk_size=0
+        self.writes=set()
+        self.stats=defaultdict(int)
+        if self.directory:
+            self.loadDiskIndex()
+
+    def __contains__(self, key):
+        return key in self.entries or self.filename(key) in self.disk
+
+    def loadDiskIndex(self):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            files=[]
+            for name in os.listdir(self.directory):
+                stat=os.stat(os.path.join(self.directory, name))
+                files.append((stat.st_mtime, name, stat.st_size))
+            for mtime, name, size in sorted(files):
+                self.disk[name]=size
+                self.disk_size+=size
+            self.removeFiles(self.trimDisk())
+        except:
+            self.log.error('!! Error reading art cache directory %s' % self.directory, exc_info=True)
+            self.directory=''
+
+    def filename(self, key):
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+    async def get(self, key):
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.stats['hits']+=1
+            return self.entries[key]
+
+        name=self.filename(key)
+        if name in self.disk:
+            try:
+                image=await asyncio.get_event_loop().run_in_executor(None, self.readFile, name)
+                if key in self.entries:
+                    # put while the file was being read
+                    return self.entries[key]
+                self.disk.move_to_end(name)
+                self.stats['disk_hits']+=1
+                self.remember(key, image)
+                return image
+            except OSError:
+                self.forgetDisk(name)
+
+        self.stats['misses']+=1
+        return None
+
+    def hash(self, key):
+        # content hash of the image in memory, worked out once when it was cached.  Images only on disk have no hash
+        # until something reads them back.
+        return self.hashes.get(key)
+
+    def put(self, key, image):
+        self.remember(key, image)
+        if self.directory:
+            self.store(key, image)
+
+    def remember(self, key, image):
+        if key in self.entries:
+            self.size-=len(self.entries.pop(key))
+        # an image bigger than the whole budget would just flush everything else
+        if len(image)>self.max_bytes:
+            return
+        self.hashes[key]=contentHash(image)
+        self.entries[key]=image
+        self.size+=len(image)
+        while self.size>self.max_bytes:
+            oldkey, oldimage=self.entries.popitem(last=False)
+            self.hashes.pop(oldkey, None)
+            self.size-=len(oldimage)
+            self.stats['evictions']+=1
+
+    def store(self, key, image):
+        # the file only joins the disk index once it has been written
+        name=self.filename(key)
+        write=asyncio.get_event_loop().run_in_executor(None, self.writeFile, name, image)
+        self.writes.add(write)
+        write.add_done_callback(lambda f: self.stored(f, key, name, len(image)))
+
+    def stored(self, write, key, name, size):
+        self.writes.discard(write)
+        if write.cancelled():
+            return
+        if write.exception():
+            self.log.error('!! Error writing art cache file for %s' % key, exc_info=write.exception())
+            return
+        if name in self.disk:
+            self.disk_size-=self.disk.pop(name)
+        self.disk[name]=size
+        self.disk_size+=size
+        removed=self.trimDisk()
+        if removed:
+            removal=asyncio.get_event_loop().run_in_executor(None, self.removeFiles, removed)
+            self.writes.add(removal)
+            removal.add_done_callback(self.writes.discard)
+
+    async def drain(self):
+        # waits for files still being written or removed, before shutting down
+        while self.writes:
+            await asyncio.wait(list(self.writes))
+
+    def readFile(self, name):
+        with open(os.path.join(self.directory, name), 'rb') as artfile:
+            return artfile.read()
+
+    def writeFile(self, name, image):
+        with open(os.path.join(self.directory, name), 'wb') as artfile:
+            artfile.write(image)
+
+    def removeFiles(self, names):
+        for name in names:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+    def forgetDisk(self, name):
+        if name in self.disk:
+            self.disk_size-=self.disk.pop(name)
+
+    def trimDisk(self):
+        # drops the oldest files from the index and returns their names for removeFiles
+        removed=[]
+        while self.disk_size>self.max_disk_bytes and self.disk:
+            name, size=self.disk.popitem(last=False)
+            self.disk_size-=size
+            self.stats['disk_evictions']+=1
+            removed.append(name)
+        return removed
+
+    def summary(self):
+        return {**self.stats, 'entries': len(self.entries), 'bytes': self.size, 'disk_entries': len(self.disk), 'disk_bytes': self.disk_size}
@@ -0,0 +1,410 @@
+#!/usr/bin/python3
+
+# Asyncio GENA event receiver for Sonos players.  Instead of letting soco's threaded event listener fill a queue per
+# subscription that has to be polled, the adapter subscribes to each service itself with a callback pointing at its
+# aiohttp server, and every NOTIFY is parsed and pushed straight onto a single asyncio queue that the adapter awaits.
+
+import asyncio
+import socket
+import time
+import xml.etree.ElementTree as et
+from collections import namedtuple
+
+import aiohttp
+from aiohttp import web
+
+from soco.exceptions import DIDLMetadataError
+from soco.utils import camel_to_underscore
+from soco.xml import ns_tag
+from soco.data_structures import didl_class_to_soco_class, DidlFavorite
+
+
+# decoded events carry variables that are already in the shape unpackEvent produces, and the parsed xml documents
+# (zone_group_state) in elements so they do not have to be parsed again
+genaEvent=namedtuple('genaEvent', ['sid', 'seq', 'service', 'timestamp', 'variables', 'decoded', 'elements'], defaults=(False, None))
+
+property_tag='{urn:schemas-upnp-org:event-1-0}property'
+instance_tags=['{urn:schemas-upnp-org:metadata-1-0/AVT/}InstanceID', '{urn:schemas-upnp-org:metadata-1-0/RCS/}InstanceID',
+                '{urn:schemas-sonos-com:metadata-1-0/Queue/}QueueID']
+class_tag=ns_tag('upnp', 'class')
+title_tag=ns_tag('dc', 'title')
+res_tag=ns_tag('', 'res')
+desc_tag=ns_tag('', 'desc')
+resource_fields=[('import_uri', 'importUri', False), ('size', 'size', True), ('duration', 'duration', False), ('bitrate', 'bitrate', True),
+                    ('sample_frequency', 'sampleFrequency', True), ('bits_per_sample', 'bitsPerSample', True),
+                    ('nr_audio_channels', 'nrAudioChannels', True), ('resolution', 'resolution', False), ('color_depth', 'colorDepth', True),
+                    ('protection', 'protection', False)]
+
+# NOTIFYs for a sid that is not registered are held briefly, since a player's initial event often beats the SUBSCRIBE
+# response.  Anything else, like events for a subscription from a previous run, is dropped after orphan_ttl seconds.
+orphan_sids=64
+orphan_events=4
+orphan_ttl=10
+
+# the same few dozen variable names and DIDL classes arrive over and over, so their translations are worked out once
+variable_names={}
+didl_fields={}
+
+
+class channelValues(dict):
+
+    # per channel values like {'Master': '24', 'LF': '100'}.  These are the only decoded values that are merged when
+    # events are coalesced, everything else is replaced by the newest value.
+    pass
+
+
+class didlError(DIDLMetadataError):
+    pass
+
+
+def variableName(tag):
+
+    try:
+        return variable_names[tag]
+    except KeyError:
+        name=camel_to_underscore(tag.split('}', 1)[-1])
+        variable_names[tag]=name
+        return name
+
+
+def didlFields(item_class):
+
+    try:
+        return didl_fields[item_class]
+    except KeyError:
+        cls=didl_class_to_soco_class(item_class)
+        fields=(cls is DidlFavorite, [(key, ns_tag(*value)) for key, value in cls._translation.items()])
+        didl_fields[item_class]=fields
+        return fields
+
+
+def decodeResource(res):
+
+    # same as DidlResource.from_element(res).to_dict(), including soco's quirk for a missing protocolInfo
+    attrib=res.attrib
+    uri=res.text
+    protocol_info=attrib.get('protocolInfo')
+    if protocol_info is None:
+        protocol_info='sonos.com-spotify:*:audio/x-spotify.*' if uri and uri.startswith('x-sonos-spotify') else 'DUMMY_ADDED_BY_QUIRK'
+        uri=uri or ''
+    resource={'uri': uri, 'protocol_info': protocol_info}
+    for key, name, numeric in resource_fields:
+        value=attrib.get(name)
+        if numeric and value is not None:
+            try:
+                value=int(value)
+            except ValueError:
+                raise didlError('Could not convert %s to an integer' % name)
+        resource[key]=value
+    return resource
+
+
+def decodeDidl(value):
+
+    # Decodes the first item of a DIDL-Lite document straight to the dict DidlObject.to_dict() would give, without
+    # building the soco objects.
+    root=et.fromstring(value)
+    for element in root:
+        tag=element.tag
+        if not (tag.endswith('item') or tag.endswith('container')):
+            raise didlError('Illegal child of DIDL element: <%s>' % tag)
+        favorite, fields=didlFields(element.findtext(class_tag))
+        item_id=element.get('id')
+        parent_id=element.get('parentID')
+        if item_id is None or parent_id is None:
+            raise didlError('Missing id or parentID attribute')
+        item={}
+        for key, fieldtag in fields:
+            text=element.findtext(fieldtag)
+            if text is not None:
+                item[key]=text
+        if 'original_track_number' in item:
+            item['original_track_number']=int(item['original_track_number'])
+        item['parent_id']=parent_id
+        item['item_id']=item_id
+        item['restricted']=element.get('restricted') not in [0, 'false', 'False']
+        item['title']=element.findtext(title_tag) or ''
+        # favorites without a resource still have an empty <res/>, which soco skips
+        resources=[decodeResource(res) for res in element.findall(res_tag) if res.attrib or not favorite]
+        if resources:
+            item['resources']=resources
+        item['desc']=element.findtext(desc_tag)
+        return item
+    raise didlError('Empty DIDL element')
+
+
+def elementValue(element):
+
+    # the value etree_to_dict gives an element, built in one pass without wrapping every node in its own dict
+    attrib=element.attrib
+    text=element.text
+    if len(element):
+        value={}
+        for child in element:
+            tag=child.tag
+            childvalue=elementValue(child)
+            if tag not in value:
+                value[tag]=childvalue
+            elif isinstance(value[tag], list):
+                value[tag].append(childvalue)
+            else:
+                value[tag]=[value[tag], childvalue]
+    elif attrib:
+        value={}
+    else:
+        return text.strip() if text else None
+    for name, attribute in attrib.items():
+        value['@'+name]=attribute
+    if text:
+        text=text.strip()
+        if text:
+            value['#text']=text
+    return value
+
+
+def decodeValue(value, elements, name, didl=False):
+
+    # only LastChange variables can hold DIDL metadata, any other xml is turned into an etree_to_dict style dict
+    if didl and value.startswith('<DIDL-Lite'):
+        try:
+            return decodeDidl(value)
+        except (DIDLMetadataError, et.ParseError, ValueError, TypeError):
+            return {}
+    if value[0]=='<':
+        try:
+            element=et.fromstring(value)
+        except et.ParseError:
+            return value
+        elements[name]=element
+        return {element.tag: elementValue(element)}
+    return value
+
+
+def decodeEvent(body):
+
+    # Single pass replacement for parse_event_xml followed by unpackEvent/didlunpack/etree_to_dict.  The result has
+    # the same shape, with DIDL metadata as dicts, xml documents as etree_to_dict style dicts and per channel values
+    # as channelValues.  Metadata that cannot be decoded becomes {}, as a SoCoFault did before.
+    variables={}
+    elements={}
+    tree=et.fromstring(body)
+    for prop in tree.iter(property_tag):
+        for variable in prop:
+            if variable.tag!='LastChange':
+                value=variable.text
+                name=variableName(variable.tag)
+                variables[name]=decodeValue(value, elements, name) if value else value
+                continue
+            lastchange=et.fromstring(variable.text)
+            for tag in instance_tags:
+                instance=lastchange.find(tag)
+                if instance is not None:
+                    break
+            else:
+                continue
+            for item in instance:
+                name=variableName(item.tag)
+                value=item.get('val')
+                if value is None:
+                    value=item.text
+                channel=item.get('channel')
+                if channel is None:
+                    variables[name]=decodeValue(value, elements, name, didl=True) if value else value
+                else:
+                    if not isinstance(variables.get(name), channelValues):
+                        variables[name]=channelValues()
+                    variables[name][channel]=value
+    return variables, elements
+
+
+def coalesceEvents(events):
+
+    # Merge a burst of events into one per player and service, keeping the latest value of each variable.  Channel
+    # variables like volume arrive as {'Master': .., 'LF': ..} and are merged one level down.  In decoded events the
+    # DIDL metadata is a dict as well, so only channelValues are merged there.
+    merged={}
+    for event in events:
+        key=(event.service.soco.uid, event.service.service_id)
+        decoded=getattr(event, 'decoded', False)
+        if key not in merged:
+            merged[key]=genaEvent(event.sid, event.seq, event.service, event.timestamp, dict(event.variables), decoded, dict(getattr(event, 'elements', None) or {}))
+            continue
+        variables=merged[key].variables
+        for name, value in event.variables.items():
+            channels=isinstance(value, channelValues) if decoded else isinstance(value, dict)
+            if channels and isinstance(variables.get(name), dict):
+                variables[name]=channelValues({**variables[name], **value}) if decoded else {**variables[name], **value}
+            else:
+                variables[name]=value
+        merged[key].elements.update(getattr(event, 'elements', None) or {})
+        merged[key]=merged[key]._replace(sid=event.sid, seq=event.seq)
+    return list(merged.values())
+
+
+class genaSubscription(object):
+
+    def __init__(self, receiver, service, timeout=180):
+        self.receiver=receiver
+        self.service=service
+        self.requested_timeout=timeout
+        self.timeout=timeout
+        self.sid=None
+        self.is_subscribed=False
+        self.renew_task=None
+
+    @property
+    def event_url(self):
+        return self.service.base_url+self.service.event_subscription_url
+
+    async def subscribe(self):
+        headers={   'CALLBACK': '<%s>' % self.receiver.callbackUrl(self.service.soco.ip_address),
+                    'NT': 'upnp:event',
+                    'TIMEOUT': 'Second-%s' % self.requested_timeout }
+        async with self.receiver.session.request('SUBSCRIBE', self.event_url, headers=headers) as response:
+            if response.status!=200:
+                self.receiver.log.error('!! GENA subscribe to %s failed: %s' % (self.event_url, response.status))
+                return False
+            self.updateFromHeaders(response.headers)
+        self.is_subscribed=True
+        self.receiver.register(self)
+        self.renew_task=asyncio.ensure_future(self.autoRenew())
+        return True
+
+    async def renew(self):
+        headers={ 'SID': self.sid, 'TIMEOUT': 'Second-%s' % self.requested_timeout }
+        async with self.receiver.session.request('SUBSCRIBE', self.event_url, headers=headers) as response:
+            if response.status!=200:
+                return False
+            self.updateFromHeaders(response.headers)
+        return True
+
+    async def unsubscribe(self):
+        if self.renew_task:
+            self.renew_task.cancel()
+            self.renew_task=None
+        if not self.is_subscribed:
+            return
+        self.is_subscribed=False
+        self.receiver.unregister(self)
+        try:
+            async with self.receiver.session.request('UNSUBSCRIBE', self.event_url, headers={'SID': self.sid}) as response:
+                pass
+        except:
+            # The player may already be gone, and in that case the subscription will simply time out
+            pass
+
+    def updateFromHeaders(self, headers):
+        self.sid=headers.get('SID', self.sid)
+        try:
+            self.timeout=int(headers.get('TIMEOUT', '').split('-')[1])
+        except (IndexError, ValueError):
+            self.timeout=self.requested_timeout
+
+    async def autoRenew(self):
+        try:
+            while self.is_subscribed:
+                await asyncio.sleep(self.timeout*0.85)
+                try:
+                    renewed=await self.renew()
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    renewed=False
+                if not renewed:
+                    self.receiver.log.warning('.! GENA renewal failed for %s/%s' % (self.service.soco.uid, self.service.service_id))
+                    self.is_subscribed=False
+                    self.receiver.unregister(self)
+                    self.receiver.expired(self)
+        except asyncio.CancelledError:
+            pass
+
+
+class genaReceiver(object):
+
+    # NOTIFY requests are served by the adapter's own web app, which listens on web_port (1401 by default) and also
+    # serves images and metrics.  The receiver only adds its route, the adapter starts and stops the server.
+
+    def __init__(self, log=None, queue=None, app=None, port=1401, address='', on_expired=None, metrics=None):
+        self.log=log
+        self.metrics=metrics
+        self.queue=queue
+        self.port=port
+        self.address=address
+        self.on_expired=on_expired
+        self.subscriptions={}
+        self.orphans={}
+        self.session=None
+        app.router.add_route('NOTIFY', '/{tail:.*}', self.handleNotify)
+
+    async def start(self):
+        self.session=aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=10))
+        self.log.info('.. GENA event receiver using callbacks on port %s' % self.port)
+
+    async def stop(self):
+        for sub in list(self.subscriptions.values()):
+            await sub.unsubscribe()
+        if self.session:
+            await self.session.close()
+
+    def callbackUrl(self, player_ip):
+        return 'http://%s:%s/' % (self.localAddress(player_ip), self.port)
+
+    def localAddress(self, player_ip):
+        if self.address:
+            return self.address
+        # Pick whichever local interface routes to the player
+        s=socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            s.connect((player_ip, 1400))
+            return s.getsockname()[0]
+        finally:
+            s.close()
+
+    def register(self, subscription):
+        self.subscriptions[subscription.sid]=subscription
+        # The initial event is often sent before the SUBSCRIBE response has been processed
+        self.expireOrphans(time.time())
+        for body, seq, timestamp in self.orphans.pop(subscription.sid, []):
+            self.enqueue(subscription, body, seq, timestamp)
+
+    def unregister(self, subscription):
+        self.subscriptions.pop(subscription.sid, None)
+
+    def expired(self, subscription):
+        if self.on_expired:
+            self.on_expired(subscription)
+
+    def enqueue(self, subscription, body, seq, timestamp):
+        try:
+            started=time.perf_counter()
+            variables, elements=decodeEvent(body)
+            if self.metrics:
+                self.metrics.observe('decode', time.perf_counter()-started)
+        except:
+            self.log.error('!! Error parsing GENA event for %s: %s' % (subscription.sid, body), exc_info=True)
+            return
+        self.queue.put_nowait(genaEvent(subscription.sid, seq, subscription.service, timestamp, variables, True, elements))
+
+    async def handleNotify(self, request):
+        sid=request.headers.get('SID')
+        seq=request.headers.get('SEQ')
+        body=await request.read()
+        subscription=self.subscriptions.get(sid)
+        if subscription:
+            self.enqueue(subscription, body, seq, time.time())
+        elif sid:
+            now=time.time()
+            self.expireOrphans(now)
+            events=self.orphans.setdefault(sid, [])
+            # the first events carry the full state, so later ones for the same sid are the ones dropped
+            if len(events)<orphan_events:
+                events.append((body, seq, now))
+            if len(self.orphans)>orphan_sids:
+                self.orphans.pop(next(iter(self.orphans)))
+        return web.Response(status=200)
+
+    def expireOrphans(self, now):
+        # orphans are kept in the order their sids were first seen, so the oldest are always at the front
+        while self.orphans:
+            sid=next(iter(self.orphans))
+            if now-self.orphans[sid][0][2]<orphan_ttl:
+                break
+            del self.orphans[sid]
@@ -0,0 +1,106 @@
+#!/usr/bin/python3
+
+# Latency metrics for the adapter's hot paths.  Every stage keeps a count, a running total, the worst case and a fixed
+# set of histogram buckets, so recording a sample is a few additions and a bisect.  Gauges are callables that are only
+# evaluated when the metrics are read.
+
+import bisect
+import functools
+import time
+from collections import defaultdict
+
+# bucket upper bounds in seconds, from half a millisecond to ten seconds
+bucket_bounds=[.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10]
+
+
+class latencyHistogram(object):
+
+    __slots__=('count', 'total', 'max', 'buckets')
+
+    def __init__(self):
+        self.count=0
+        self.total=0.0
+        self.max=0.0
+        self.buckets=[0]*(len(bucket_bounds)+1)
+
+    def observe(self, seconds):
+        self.count+=1
+        self.total+=seconds
+        if seconds>self.max:
+            self.max=seconds
+        self.buckets[bisect.bisect_left(bucket_bounds, seconds)]+=1
+
+    def quantile(self, q):
+        # the upper bound of the bucket the quantile falls in, which is as precise as the buckets allow
+        if not self.count:
+            return 0.0
+        target=q*self.count
+        seen=0
+        for index, count in enumerate(self.buckets):
+            seen+=count
+            if seen>=target:
+                return min(bucket_bounds[index], self.max) if index<len(bucket_bounds) else self.max
+        return self.max
+
+    def summary(self):
+        return {'count': self.count, 'mean_ms': round(self.total/self.count*1000, 3) if self.count else 0, 'max_ms': round(self.max*1000, 3),
+                'p50_ms': round(self.quantile(.5)*1000, 3), 'p95_ms': round(self.quantile(.95)*1000, 3), 'p99_ms': round(self.quantile(.99)*1000, 3),
+                'buckets': dict(zip(['le_%gms' % (bound*1000) for bound in bucket_bounds]+['inf'], self.buckets))}
+
+
+class stageTimer(object):
+
+    __slots__=('histogram', 'started')
+
+    def __init__(self, histogram):
+        self.histogram=histogram
+
+    def __enter__(self):
+        self.started=time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter()-self.started)
+        return False
+
+
+class adapterMetrics(object):
+
+    def __init__(self):
+        self.histograms=defaultdict(latencyHistogram)
+        self.gauges={}
+        self.started=time.time()
+
+    def observe(self, stage, seconds):
+        self.histograms[stage].observe(seconds)
+
+    def timer(self, stage):
+        return stageTimer(self.histograms[stage])
+
+    def gauge(self, name, func):
+        self.gauges[name]=func
+
+    def snapshot(self):
+        gauges={}
+        for name, func in self.gauges.items():
+            try:
+                gauges[name]=func()
+            except Exception:
+                gauges[name]=None
+        return {'uptime_seconds': round(time.time()-self.started, 1), 'gauges': gauges,
+                'stages': { stage: histogram.summary() for stage, histogram in sorted(self.histograms.items()) }}
+
+
+def timedCommand(func):
+
+    # Wraps a controller command handler so its time is recorded under command.<Controller>.<handler>
+    stage='command.%s' % '.'.join(func.__qualname__.split('.')[-2:])
+
+    @functools.wraps(func)
+    async def wrapper(self, *args, **kwargs):
+        started=time.perf_counter()
+        try:
+            return await func(self, *args, **kwargs)
+        finally:
+            self.adapter.metrics.observe(stage, time.perf_counter()-started)
+    return wrapper
@@ -0,0 +1,129 @@
+#!/usr/bin/python3
+
+# Async UPnP action client for Sonos speakers.  Requests go out on one aiohttp session that keeps a small pool of
+# keep-alive connections open to each speaker, every call has its own timeout, and the envelope for each action is
+# built once and then filled in with the argument values.  Replies are read with ElementTree rather than xmltodict.
+# Faults are raised as soco's exceptions so callers can handle them the same way as calls made through soco.
+
+import asyncio
+import xml.etree.ElementTree as et
+from collections import defaultdict
+from xml.sax.saxutils import escape
+
+import aiohttp
+from soco.exceptions import SoCoUPnPException, UnknownSoCoException
+
+envelope_head='<?xml version="1.0"?><s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/" s:encodingStyle="http://schemas.xmlsoap.org/soap/encoding/"><s:Body>'
+envelope_tail='</s:Body></s:Envelope>'
+body_tag='{http://schemas.xmlsoap.org/soap/envelope/}Body'
+fault_tag='{http://schemas.xmlsoap.org/soap/envelope/}Fault'
+error_code_path='.//{urn:schemas-upnp-org:control-1-0}errorCode'
+error_description_path='.//{urn:schemas-upnp-org:control-1-0}errorDescription'
+
+# built on first use for each service, action and set of argument names
+envelopes={}
+
+
+class envelopeTemplate(object):
+
+    __slots__=('template', 'headers')
+
+    def __init__(self, service_type, action, names):
+        arguments=''.join(['<%s>%%s</%s>' % (name, name) for name in names])
+        self.template=envelope_head+'<u:%s xmlns:u="%s">' % (action, service_type)+arguments+'</u:%s>' % action+envelope_tail
+        self.headers={'Content-Type': 'text/xml; charset="utf-8"', 'SOAPACTION': '"%s#%s"' % (service_type, action)}
+
+    def render(self, values):
+        return (self.template % tuple([escape(str(value)) for value in values])).encode('utf-8')
+
+
+def envelope(service_type, action, names):
+
+    key=(service_type, action, names)
+    template=envelopes.get(key)
+    if template is None:
+        template=envelopes[key]=envelopeTemplate(service_type, action, names)
+    return template
+
+
+def parseResponse(body):
+
+    # <s:Envelope><s:Body><u:ActionResponse><Name>value</Name>...  The out arguments are plain text, anything like DIDL
+    # metadata arrives escaped, so one level of children is all there is to read.
+    result=et.fromstring(body).find(body_tag)[0]
+    if result.tag==fault_tag:
+        return None
+    return { child.tag: child.text or '' for child in result }
+
+
+def upnpFault(ip, body):
+
+    try:
+        fault=et.fromstring(body)
+        code=fault.findtext(error_code_path)
+        description=fault.findtext(error_description_path) or ''
+    except et.ParseError:
+        code=None
+    if code is None:
+        return UnknownSoCoException(body)
+    return SoCoUPnPException(message='UPnP Error %s received: %s from %s' % (code, description, ip), error_code=code,
+                                error_description=description, error_xml=body)
+
+
+class soapClient(object):
+
+    def __init__(self, log=None, connections=2, timeout=5, port=1400):
+        self.log=log
+        self.connections=connections
+        self.timeout=aiohttp.ClientTimeout(total=timeout)
+        self.port=port
+        self.session=None
+        self.stats=defaultdict(int)
+
+    def start(self):
+        trace=aiohttp.TraceConfig()
+        trace.on_connection_create_end.append(self.countConnection)
+        trace.on_connection_reuseconn.append(self.countConnection)
+        connector=aiohttp.TCPConnector(limit_per_host=self.connections, keepalive_timeout=60)
+        self.session=aiohttp.ClientSession(connector=connector, timeout=self.timeout, trace_configs=[trace])
+
+    async def stop(self):
+        if self.session:
+            await self.session.close()
+            self.session=None
+
+    async def countConnection(self, session, context, params):
+        if isinstance(params, aiohttp.TraceConnectionReuseconnParams):
+            self.stats['connections_reused']+=1
+        else:
+            self.stats['connections_created']+=1
+
+    async def call(self, ip, control_url, service_type, action, arguments=(), timeout=None):
+
+        # arguments are (name, value) pairs in the order the service description lists them, as with soco
+        if self.session==None:
+            self.start()
+        template=envelope(service_type, action, tuple([name for name, value in arguments]))
+        # the session timeout applies unless this call asks for its own
+        options={'timeout': aiohttp.ClientTimeout(total=timeout)} if timeout else {}
+        self.stats['calls']+=1
+        try:
+            async with self.session.post('http://%s:%s%s' % (ip, self.port, control_url), data=template.render([value for name, value in arguments]),
+                                            headers=template.headers, **options) as response:
+                body=await response.read()
+        except asyncio.TimeoutError:
+            self.stats['timeouts']+=1
+            raise
+        except aiohttp.ClientError:
+            self.stats['connection_errors']+=1
+            raise
+        try:
+            result=parseResponse(body) if response.status==200 else None
+        except (et.ParseError, IndexError, TypeError, AttributeError):
+            # a 200 that is not a SOAP response at all, reported the same way as any other bad reply
+            self.stats['malformed']+=1
+            raise UnknownSoCoException(body)
+        if result is None:
+            self.stats['faults']+=1
+            raise upnpFault(ip, body)
+        return result
@@ -0,0 +1,121 @@
+#!/usr/bin/python3
+
+# Non-blocking SSDP discovery for Sonos players.  Searches are sent from an asyncio datagram endpoint and every player
+# is reported the moment it answers, rather than after the whole multicast timeout like soco.discover().  A passive
+# listener also picks up the ssdp:alive announcements players send when they are added or power cycled.
+
+import asyncio
+import socket
+import struct
+
+ssdp_address='239.255.255.250'
+ssdp_port=1900
+zoneplayer='urn:schemas-upnp-org:device:ZonePlayer:1'
+search_request=('M-SEARCH * HTTP/1.1\r\nHOST: %s:%s\r\nMAN: "ssdp:discover"\r\nMX: 1\r\nST: %s\r\n\r\n' % (ssdp_address, ssdp_port, zoneplayer)).encode('ascii')
+
+
+def parseHeaders(data):
+
+    lines=data.decode('utf-8', errors='replace').split('\r\n')
+    headers={}
+    for line in lines[1:]:
+        if ':' in line:
+            name, value=line.split(':', 1)
+            headers[name.strip().upper()]=value.strip()
+    return lines[0], headers
+
+
+def usnUid(usn):
+
+    # uuid:RINCON_000E58XXXXXX01400::urn:schemas-upnp-org:device:ZonePlayer:1
+    if usn and usn.startswith('uuid:'):
+        return usn[5:].split('::', 1)[0]
+    return None
+
+
+class ssdpProtocol(asyncio.DatagramProtocol):
+
+    def __init__(self, callback):
+        self.callback=callback
+
+    def datagram_received(self, data, addr):
+        try:
+            status, headers=parseHeaders(data)
+        except:
+            return
+        if zoneplayer not in (headers.get('ST'), headers.get('NT')):
+            return
+        if headers.get('NTS', 'ssdp:alive')!='ssdp:alive':
+            return
+        self.callback(addr[0], headers)
+
+    def error_received(self, exc):
+        pass
+
+
+class ssdpDiscovery(object):
+
+    def __init__(self, log=None, on_found=None, interval=60, timeout=3, interface=''):
+        self.log=log
+        self.on_found=on_found
+        self.interval=interval
+        self.timeout=timeout
+        self.interface=interface
+        self.listener=None
+        self.task=None
+
+    def found(self, ip, headers):
+        try:
+            self.on_found(ip, headers)
+        except:
+            self.log.error('!! Error handling discovered player %s' % ip, exc_info=True)
+
+    async def search(self):
+        sock=socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 2)
+        if self.interface:
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(self.interface))
+        sock.bind(('', 0))
+        sock.setblocking(False)
+        transport, protocol=await asyncio.get_event_loop().create_datagram_endpoint(lambda: ssdpProtocol(self.found), sock=sock)
+        try:
+            # UDP is lossy, so send the search a few times over the timeout window
+            for attempt in range(3):
+                transport.sendto(search_request, (ssdp_address, ssdp_port))
+                await asyncio.sleep(self.timeout/3)
+        finally:
+            transport.close()
+
+    async def listen(self):
+        try:
+            sock=socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            if hasattr(socket, 'SO_REUSEPORT'):
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            sock.bind(('', ssdp_port))
+            membership=struct.pack('4s4s', socket.inet_aton(ssdp_address), socket.inet_aton(self.interface or '0.0.0.0'))
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+            sock.setblocking(False)
+            self.listener, protocol=await asyncio.get_event_loop().create_datagram_endpoint(lambda: ssdpProtocol(self.found), sock=sock)
+        except OSError:
+            self.log.warning('.! Could not listen for SSDP announcements, relying on periodic searches', exc_info=True)
+
+    async def run(self):
+        await self.listen()
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.search()
+            except OSError:
+                self.log.error('!! Error sending SSDP search', exc_info=True)
+
+    def start(self):
+        self.task=asyncio.ensure_future(self.run())
+
+    def stop(self):
+        if self.task:
+            self.task.cancel()
+            self.task=None
+        if self.listener:
+            self.listener.close()
+            self.listener=None
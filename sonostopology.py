@@ -0,0 +1,186 @@
+#!/usr/bin/python3
+
+import xml.etree.ElementTree as et
+
+
+class zoneTopology(object):
+
+    # In-memory model of the household built from a ZoneGroupState document.  Every speaker sends the same document
+    # whenever any group changes, so it is parsed once here and group membership is answered without asking soco.
+
+    def __init__(self):
+        self.groups={}
+        self.players={}
+
+    def update(self, zone_group_state):
+
+        if isinstance(zone_group_state, (str, bytes)):
+            zone_group_state=et.fromstring(zone_group_state)
+        groups={}
+        players={}
+        # Older firmware sends <ZoneGroups> at the root, newer wraps it in <ZoneGroupState>
+        for group in zone_group_state.iter('ZoneGroup'):
+            groupid=group.get('ID')
+            coordinator=group.get('Coordinator')
+            members=[]
+            for member in group.findall('ZoneGroupMember'):
+                uid=member.get('UUID')
+                members.append(uid)
+                players[uid]={  'group': groupid, 'coordinator': coordinator, 'name': member.get('ZoneName'),
+                                'visible': member.get('Invisible')!='1', 'location': member.get('Location') }
+                # home theatre subs and surrounds are listed inside the room's member and never show as rooms themselves
+                for satellite in member.findall('Satellite'):
+                    uid=satellite.get('UUID')
+                    members.append(uid)
+                    players[uid]={  'group': groupid, 'coordinator': coordinator, 'name': satellite.get('ZoneName'),
+                                    'visible': False, 'location': satellite.get('Location') }
+            groups[groupid]={'coordinator': coordinator, 'members': members}
+
+        changed=(groups!=self.groups or players!=self.players)
+        self.groups=groups
+        self.players=players
+        return changed
+
+    def groupInfo(self, uid):
+
+        try:
+            group=self.groups[self.players[uid]['group']]
+            return {"members": list(group['members']), "coordinator": group['coordinator']}
+        except KeyError:
+            return None
+
+    def coordinator(self, uid):
+
+        try:
+            return self.players[uid]['coordinator']
+        except KeyError:
+            return None
+
+    def visible(self, uid):
+
+        try:
+            return self.players[uid]['visible']
+        except KeyError:
+            return None
+
+    def shortLabel(self, uid):
+
+        # Same form as soco's ZoneGroup.short_label, e.g. "Kitchen + 2"
+        try:
+            group=self.groups[self.players[uid]['group']]
+        except KeyError:
+            return None
+        names=sorted(self.players[member]['name'] for member in group['members'] if self.players[member]['visible'])
+        if not names:
+            return ''
+        if len(names)>1:
+            return "%s + %s" % (names[0], len(names)-1)
+        return names[0]
+
+
+class playerRegistry(object):
+
+    # Players indexed by uid, endpointId and room name.  The topology model is shared so coordinators resolve with
+    # two dict lookups instead of scanning the player list (and asking soco for player.group).
+
+    def __init__(self, topology=None):
+        self.topology=topology if topology is not None else zoneTopology()
+        self.byuid={}
+        self.byendpoint={}
+        self.byname={}
+
+    def __iter__(self):
+        return iter(list(self.byuid.values()))
+
+    def __len__(self):
+        return len(self.byuid)
+
+    def set(self, players):
+        self.byuid={}
+        self.byendpoint={}
+        self.byname={}
+        for player in players:
+            self.add(player)
+
+    def add(self, player, name=None):
+        uid=player.uid
+        self.byuid[uid]=player
+        self.byendpoint['sonos:player:%s' % uid]=player
+        self.addName(name or self.name(player), player)
+
+    def addName(self, name, player):
+        # a bonded sub or surround shares the room's name, and must never stand in for the room
+        if name not in self.byname or self.isVisible(player):
+            self.byname[name]=player
+
+    def remove(self, uid):
+        player=self.byuid.pop(uid, None)
+        if player:
+            self.byendpoint.pop('sonos:player:%s' % uid, None)
+            for name in [name for name in self.byname if self.byname[name] is player]:
+                del self.byname[name]
+        return player
+
+    def name(self, player):
+        # never player.player_name, which asks the speaker for the topology on every read
+        try:
+            return self.topology.players[player.uid]['name']
+        except KeyError:
+            return player.speaker_info.get('zone_name') or player.ip_address
+
+    def refresh(self):
+        # rooms can be renamed, so rebuild the name index after each topology change
+        self.byname={}
+        for player in self.byuid.values():
+            self.addName(self.name(player), player)
+
+    def get(self, uid):
+        return self.byuid.get(uid)
+
+    def byEndpointId(self, endpointId):
+        return self.byendpoint.get(endpointId)
+
+    def byName(self, name):
+        return self.byname.get(name)
+
+    def find(self, reference):
+        # inputs are given either as a room name or something ending in the uid like sonos:player:RINCON_xxx
+        return self.byname.get(reference) or self.byuid.get(reference.rsplit(':',1)[-1])
+
+    def coordinator(self, player):
+        uid=self.topology.coordinator(player.uid)
+        if uid is None:
+            return None
+        return self.byuid.get(uid)
+
+    def groupMembers(self, player):
+        # the visible players in the same group, the player itself included
+        info=self.topology.groupInfo(player.uid)
+        if not info:
+            return [player]
+        return [self.byuid[uid] for uid in info['members'] if uid in self.byuid and self.topology.visible(uid)] or [player]
+
+    def partition(self, players):
+        # Splits a set of players into the coordinators of groups that are wholly in the set, which can be driven with
+        # one GroupRenderingControl call each, and the remaining players that have to be driven one by one
+        selected={ player.uid for player in players }
+        coordinators=[]
+        singles=[]
+        seen=set()
+        for player in players:
+            if player.uid in seen:
+                continue
+            info=self.topology.groupInfo(player.uid)
+            coordinator=self.byuid.get(info['coordinator']) if info else None
+            members=[uid for uid in info['members'] if self.topology.visible(uid)] if info else []
+            if coordinator and members and all(uid in selected for uid in members):
+                coordinators.append(coordinator)
+                seen.update(members)
+            else:
+                singles.append(player)
+                seen.add(player.uid)
+        return coordinators, singles
+
+    def isVisible(self, player):
+        visible=self.topology.visible(player.uid)
+        return True if visible is None else visible
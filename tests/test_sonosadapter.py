@@ -0,0 +1,415 @@
+#!/usr/bin/python3
+
+# adapterProcess logic that does not need a speaker, run against the sofabase stand-ins when sofabase is not installed
+
+import sys, os
+sys.path.append(os.path.join(os.path.dirname(__file__),'..'))
+try:
+    import sofabase
+except ImportError:
+    sys.path.append(os.path.join(os.path.dirname(__file__),'..','benchmarks','standins'))
+
+import asyncio
+import logging
+import types
+
+import sonos
+
+
+class datasetRecorder(object):
+
+    # stands in for the sofabase dataset, keeping every ingest and failing the next ones on request
+
+    def __init__(self):
+        self.nativeDevices={}
+        self.ingests=[]
+        self.failures=0
+
+    async def ingest(self, data, overwriteLevel=None):
+        if self.failures:
+            self.failures-=1
+            raise ConnectionError('dataset unavailable')
+        self.ingests.append((data, overwriteLevel))
+
+
+def adapterConfig(**overrides):
+    config=dict(players='', event_mode='gena', event_address='', web_port=0, soco_workers=2, setup_concurrency=2, discovery='manual',
+                discovery_interval=60, discovery_timeout=3, health_backoff=2, health_backoff_max=300, actions_max_age=600,
+                art_connections=2, art_cache_bytes=1024*1024, art_cache_dir='', art_disk_bytes=0, art_retry_delay=60, art_workers=1,
+                art_prefetch_depth=0, soap_connections=2, soap_timeout=5, art_base_url='')
+    config.update(overrides)
+    return types.SimpleNamespace(**config)
+
+
+def makeAdapter(dataset=None, **overrides):
+    adapter=sonos.sonos.adapterProcess(log=logging.getLogger('sonos-test'), loop=asyncio.get_event_loop(), dataset=dataset or datasetRecorder(),
+                                        config=adapterConfig(**overrides))
+    adapter.running=True
+    return adapter
+
+
+def player(uid='RINCON_1', ip='10.0.0.1'):
+    return types.SimpleNamespace(uid=uid, ip_address=ip)
+
+
+def test_repair_backs_off_to_the_cap(monkeypatch):
+    delays=[]
+    realsleep=asyncio.sleep
+    async def sleep(delay):
+        delays.append(delay)
+        await realsleep(0)
+    monkeypatch.setattr(asyncio, 'sleep', sleep)
+
+    async def repair():
+        adapter=makeAdapter(health_backoff=2, health_backoff_max=10)
+        speaker=player()
+        attempts=[]
+        async def resubscribePlayer(target):
+            attempts.append(adapter.health[target.ip_address]['state'])
+            return len(attempts)>5
+        adapter.resubscribePlayer=resubscribePlayer
+        adapter.playerOnline(speaker)
+        adapter.playerFailed(speaker)
+        await adapter.repairs[speaker.ip_address]
+        return adapter, speaker, attempts
+
+    adapter, speaker, attempts=asyncio.run(repair())
+    assert delays==[2, 4, 8, 10, 10, 10]
+    # the first retry runs while reconnecting, after that the player is offline until it comes back
+    assert attempts==['reconnecting']+['offline']*5
+    assert adapter.health[speaker.ip_address]['state']=='online'
+    assert adapter.health[speaker.ip_address]['failures']==0
+    assert adapter.stats['player_repairs']==1
+    assert adapter.repairs=={}
+
+
+def test_one_repair_per_player():
+    async def fail():
+        adapter=makeAdapter()
+        speaker=player()
+        adapter.playerFailed(speaker)
+        repair=adapter.repairs[speaker.ip_address]
+        adapter.playerFailed(speaker)
+        assert adapter.repairs[speaker.ip_address] is repair
+        assert adapter.stats['player_failures']==2
+        repair.cancel()
+
+    asyncio.run(fail())
+
+
+def test_command_failed_repairs_only_connection_errors():
+    async def fail():
+        adapter=makeAdapter()
+        speaker=player()
+        device=types.SimpleNamespace(endpointId='sonos:player:RINCON_1')
+        adapter.commandFailed(device, player=speaker, error=ValueError('bad payload'))
+        adapter.commandFailed(device, player=speaker, error=sonos.soco.exceptions.SoCoUPnPException('701', '701', ''))
+        assert adapter.repairs=={}
+        adapter.commandFailed(device, player=speaker, error=ConnectionError())
+        assert speaker.ip_address in adapter.repairs
+        adapter.repairs[speaker.ip_address].cancel()
+
+    asyncio.run(fail())
+
+
+class trackPlayer(object):
+
+    # answers get_current_track_info with a set uri and counts the questions
+
+    def __init__(self, uri, uid='RINCON_1', ip='10.0.0.1'):
+        self.uid=uid
+        self.ip_address=ip
+        self.uri=uri
+        self.queries=0
+
+    def get_current_track_info(self):
+        self.queries+=1
+        return {'title': 'Song %s' % self.queries, 'artist': 'Artist', 'album': '', 'uri': self.uri, 'metadata': '<DIDL-Lite/>'}
+
+
+def trackUpdate(uri, stream_content=''):
+    return {'current_track_uri': uri, 'current_track_meta_data': {'title': '', 'creator': '', 'album': '', 'stream_content': stream_content}}
+
+
+def test_track_info_not_asked_for_complete_metadata():
+    async def ask():
+        adapter=makeAdapter()
+        speaker=trackPlayer('x-file:song')
+        update={'current_track_uri': 'x-file:song', 'current_track_meta_data': {'title': 'Song', 'creator': 'Artist', 'album': 'Album'}}
+        assert await adapter.getTrackInfo(speaker, update) is None
+        return adapter, speaker
+
+    adapter, speaker=asyncio.run(ask())
+    assert speaker.queries==0
+    assert adapter.stats['track_info_saved_complete']==1
+
+
+def test_track_info_cached_per_uri_and_stream_content():
+    async def ask():
+        adapter=makeAdapter()
+        speaker=trackPlayer('x-rincon-mp3radio:station')
+        first=await adapter.getTrackInfo(speaker, trackUpdate(speaker.uri, 'Artist - Song 1'))
+        again=await adapter.getTrackInfo(speaker, trackUpdate(speaker.uri, 'Artist - Song 1'))
+        # the station keeps its uri when the song changes
+        changed=await adapter.getTrackInfo(speaker, trackUpdate(speaker.uri, 'Artist - Song 2'))
+        return adapter, speaker, first, again, changed
+
+    adapter, speaker, first, again, changed=asyncio.run(ask())
+    assert 'metadata' not in first
+    assert again is first
+    assert changed['title']=='Song 2'
+    assert speaker.queries==2
+    assert adapter.stats['track_info_saved_cached']==1
+    assert adapter.stats['track_info_queries']==2
+
+
+def test_track_info_not_cached_without_uri():
+    async def ask():
+        adapter=makeAdapter()
+        speaker=trackPlayer('')
+        await adapter.getTrackInfo(speaker, trackUpdate(None))
+        await adapter.getTrackInfo(speaker, trackUpdate(None))
+        return adapter, speaker
+
+    adapter, speaker=asyncio.run(ask())
+    assert speaker.queries==2
+    assert adapter.trackinfo=={}
+
+
+def test_track_info_not_cached_for_another_track():
+    async def ask():
+        adapter=makeAdapter()
+        # the player has already moved on from the track the event was about
+        speaker=trackPlayer('x-file:next')
+        await adapter.getTrackInfo(speaker, trackUpdate('x-file:song'))
+        await adapter.getTrackInfo(speaker, trackUpdate('x-file:song'))
+        return adapter, speaker
+
+    adapter, speaker=asyncio.run(ask())
+    assert speaker.queries==2
+    assert adapter.trackinfo=={}
+
+
+def ingestUpdate(adapter, uid, service, update):
+    delta=adapter.changedVariables((uid, service), update)
+    if delta:
+        adapter.queueIngest(uid, {service: delta})
+    return delta
+
+
+def test_changed_variables_sends_only_the_delta():
+    async def ingest():
+        adapter=makeAdapter()
+        first=ingestUpdate(adapter, 'RINCON_1', 'rendering', {'volume': 20, 'mute': False})
+        # staged but not yet flushed still counts as sent
+        repeat=ingestUpdate(adapter, 'RINCON_1', 'rendering', {'volume': 20, 'mute': False})
+        await adapter.flushIngest()
+        changed=ingestUpdate(adapter, 'RINCON_1', 'rendering', {'volume': 25, 'mute': False})
+        await adapter.flushIngest()
+        return adapter, first, repeat, changed
+
+    adapter, first, repeat, changed=asyncio.run(ingest())
+    assert first=={'volume': 20, 'mute': False}
+    assert repeat=={}
+    assert changed=={'volume': 25}
+    assert adapter.ingested[('RINCON_1', 'rendering')]=={'volume': 25, 'mute': False}
+    assert adapter.dataset.ingests==[({'player': {'RINCON_1': {'rendering': {'volume': 20, 'mute': False}}}}, None),
+                                        ({'player': {'RINCON_1': {'rendering': {'volume': 25}}}}, None)]
+    assert adapter.stats['ingest_suppressed']==1
+    assert adapter.stats['ingest_shrunk']==1
+
+
+def test_failed_ingest_is_not_remembered():
+    async def ingest():
+        adapter=makeAdapter()
+        adapter.dataset.failures=1
+        ingestUpdate(adapter, 'RINCON_1', 'rendering', {'volume': 20})
+        await adapter.flushIngest()
+        assert adapter.ingested=={}
+        assert adapter.stagedingest=={}
+        # the next event with the same value tries again
+        retried=ingestUpdate(adapter, 'RINCON_1', 'rendering', {'volume': 20})
+        await adapter.flushIngest()
+        return adapter, retried
+
+    adapter, retried=asyncio.run(ingest())
+    assert retried=={'volume': 20}
+    assert adapter.ingested[('RINCON_1', 'rendering')]=={'volume': 20}
+    assert adapter.stats['ingest_failures']==1
+    assert len(adapter.dataset.ingests)==1
+
+
+def test_forget_ingested_only_touches_one_player():
+    async def ingest():
+        adapter=makeAdapter()
+        ingestUpdate(adapter, 'RINCON_1', 'rendering', {'volume': 20})
+        ingestUpdate(adapter, 'RINCON_2', 'rendering', {'volume': 30})
+        await adapter.flushIngest()
+        ingestUpdate(adapter, 'RINCON_1', 'transport', {'state': 'PLAYING'})
+        adapter.forgetIngested('RINCON_1')
+        return adapter
+
+    adapter=asyncio.run(ingest())
+    assert adapter.ingested=={('RINCON_2', 'rendering'): {'volume': 30}}
+    assert adapter.stagedingest=={}
+    assert ingestUpdate(adapter, 'RINCON_1', 'rendering', {'volume': 20})=={'volume': 20}
+
+
+def queueGroup(adapter, uid, group):
+    # what ingestGroups does for each player
+    if adapter.subtreeChanged((uid, 'group'), group):
+        adapter.queueOverwrite((uid, 'group'), group, group['members'], "/player/%s/group/members" % uid)
+        adapter.queueIngest(uid, {'group': {'coordinator': group['coordinator']}})
+        return True
+    return False
+
+
+def test_group_members_and_coordinator_go_out_together():
+    async def ingest():
+        adapter=makeAdapter()
+        group={'members': ['RINCON_1', 'RINCON_2'], 'coordinator': 'RINCON_1'}
+        assert queueGroup(adapter, 'RINCON_2', group)
+        await adapter.flushIngest()
+        # unchanged after the flush
+        assert not queueGroup(adapter, 'RINCON_2', dict(group))
+        return adapter, group
+
+    adapter, group=asyncio.run(ingest())
+    assert adapter.dataset.ingests==[(['RINCON_1', 'RINCON_2'], '/player/RINCON_2/group/members'),
+                                        ({'player': {'RINCON_2': {'group': {'coordinator': 'RINCON_1'}}}}, None)]
+    assert adapter.ingested[('RINCON_2', 'group')]==group
+    assert adapter.pendingoverwrites=={}
+
+
+def test_subtree_changed_checks_the_queued_overwrite():
+    async def ingest():
+        adapter=makeAdapter()
+        alone={'members': ['RINCON_2'], 'coordinator': 'RINCON_2'}
+        grouped={'members': ['RINCON_1', 'RINCON_2'], 'coordinator': 'RINCON_1'}
+        queueGroup(adapter, 'RINCON_2', alone)
+        await adapter.flushIngest()
+        assert queueGroup(adapter, 'RINCON_2', grouped)
+        assert not queueGroup(adapter, 'RINCON_2', grouped)
+        # back to what was ingested before the flush, but the queued group would be sent last
+        assert queueGroup(adapter, 'RINCON_2', alone)
+        await adapter.flushIngest()
+        return adapter, alone
+
+    adapter, alone=asyncio.run(ingest())
+    assert adapter.ingested[('RINCON_2', 'group')]==alone
+    assert [overwriteLevel for data, overwriteLevel in adapter.dataset.ingests if overwriteLevel]==['/player/RINCON_2/group/members']*2
+
+
+def test_failed_overwrite_is_sent_again():
+    async def ingest():
+        adapter=makeAdapter()
+        adapter.dataset.failures=1
+        group={'members': ['RINCON_1'], 'coordinator': 'RINCON_1'}
+        queueGroup(adapter, 'RINCON_1', group)
+        await adapter.flushIngest()
+        assert ('RINCON_1', 'group') not in adapter.ingested
+        assert queueGroup(adapter, 'RINCON_1', group)
+        await adapter.flushIngest()
+        return adapter, group
+
+    adapter, group=asyncio.run(ingest())
+    assert adapter.ingested[('RINCON_1', 'group')]==group
+    assert adapter.stats['ingest_failures']==1
+
+
+class valueRecorder(object):
+
+    # takes the place of sendPlayerValue, holding each set until the test releases it
+
+    def __init__(self, error=None):
+        self.sent=[]
+        self.release=asyncio.Event()
+        self.error=error
+
+    async def send(self, player, name, value):
+        self.sent.append((player.uid, name, value))
+        await self.release.wait()
+        if self.error:
+            raise self.error
+
+
+async def settle():
+    for step in range(10):
+        await asyncio.sleep(0)
+
+
+def test_set_player_value_last_write_wins():
+    async def setVolume():
+        adapter=makeAdapter()
+        recorder=valueRecorder()
+        adapter.sendPlayerValue=recorder.send
+        speaker=player()
+        calls=[asyncio.ensure_future(adapter.setPlayerValue(speaker, 'volume', volume)) for volume in (10, 20, 30, 40)]
+        await settle()
+        recorder.release.set()
+        results=await asyncio.gather(*calls)
+        return adapter, recorder, results
+
+    adapter, recorder, results=asyncio.run(setVolume())
+    # the first set was already out, the ones behind it collapse into the latest
+    assert recorder.sent==[('RINCON_1', 'volume', 10), ('RINCON_1', 'volume', 40)]
+    assert results==[True]*4
+    assert adapter.stats['set_commands']==4
+    assert adapter.stats['set_commands_dropped']==2
+    assert adapter.stats['set_commands_sent']==2
+    assert adapter.activesets==set() and adapter.pendingsets=={}
+
+
+def test_set_player_value_keeps_players_and_properties_apart():
+    async def setValues():
+        adapter=makeAdapter()
+        recorder=valueRecorder()
+        adapter.sendPlayerValue=recorder.send
+        first=player()
+        second=player('RINCON_2', '10.0.0.2')
+        calls=[asyncio.ensure_future(adapter.setPlayerValue(first, 'volume', 10)), asyncio.ensure_future(adapter.setPlayerValue(first, 'mute', True)),
+                asyncio.ensure_future(adapter.setPlayerValue(second, 'volume', 20))]
+        await settle()
+        recorder.release.set()
+        await asyncio.gather(*calls)
+        return adapter, recorder
+
+    adapter, recorder=asyncio.run(setValues())
+    assert sorted(recorder.sent)==[('RINCON_1', 'mute', True), ('RINCON_1', 'volume', 10), ('RINCON_2', 'volume', 20)]
+    assert adapter.stats['set_commands_dropped']==0
+
+
+def test_set_player_value_errors_reach_the_replaced_callers():
+    async def setVolume():
+        adapter=makeAdapter()
+        recorder=valueRecorder(error=ConnectionError('speaker gone'))
+        adapter.sendPlayerValue=recorder.send
+        speaker=player()
+        calls=[asyncio.ensure_future(adapter.setPlayerValue(speaker, 'volume', volume)) for volume in (10, 20, 30)]
+        await settle()
+        recorder.release.set()
+        return await asyncio.gather(*calls, return_exceptions=True)
+
+    results=asyncio.run(setVolume())
+    assert all(isinstance(result, ConnectionError) for result in results)
+
+
+def test_cancelled_caller_does_not_strand_queued_values():
+    async def setVolume():
+        adapter=makeAdapter()
+        recorder=valueRecorder()
+        adapter.sendPlayerValue=recorder.send
+        speaker=player()
+        first=asyncio.ensure_future(adapter.setPlayerValue(speaker, 'volume', 10))
+        await settle()
+        second=asyncio.ensure_future(adapter.setPlayerValue(speaker, 'volume', 20))
+        await settle()
+        # the directive that started the sends goes away, the queued value still goes out
+        first.cancel()
+        recorder.release.set()
+        return adapter, recorder, await second
+
+    adapter, recorder, result=asyncio.run(setVolume())
+    assert result is True
+    assert recorder.sent==[('RINCON_1', 'volume', 10), ('RINCON_1', 'volume', 20)]
+    assert adapter.activesets==set()
@@ -0,0 +1,94 @@
+#!/usr/bin/python3
+
+import sys, os
+sys.path.append(os.path.join(os.path.dirname(__file__),'..'))
+
+import asyncio
+import logging
+
+from sonosart import artCache, thumbnailSize, contentType, contentHash
+
+
+def test_thumbnail_size_rounds_up():
+    assert thumbnailSize() is None
+    assert thumbnailSize(0, 0) is None
+    assert thumbnailSize(10)==64
+    assert thumbnailSize(64)==64
+    assert thumbnailSize(65)==128
+    assert thumbnailSize('100', '300')==512
+    assert thumbnailSize(height=200)==256
+    # bigger than the largest rendition means the original
+    assert thumbnailSize(1024) is None
+
+
+def test_thumbnail_size_ignores_bad_values():
+    assert thumbnailSize('wide') is None
+    assert thumbnailSize('64', 'x') is None
+    assert thumbnailSize('1.5') is None
+    assert thumbnailSize([64]) is None
+
+
+def test_content_type():
+    assert contentType(b'\x89PNG\r\n\x1a\n....')=='image/png'
+    assert contentType(b'\xff\xd8\xff\xe0')=='image/jpeg'
+    assert contentType(b'GIF89a...')=='image/gif'
+    assert contentType(b'RIFF\x00\x00\x00\x00WEBP')=='image/webp'
+    assert contentType(b'nothing')=='application/octet-stream'
+
+
+def test_lru_evicts_least_recently_used():
+    cache=artCache(max_bytes=100)
+    cache.put('a', b'a'*40)
+    cache.put('b', b'b'*40)
+    assert asyncio.run(cache.get('a'))==b'a'*40
+    cache.put('c', b'c'*40)
+    assert 'b' not in cache
+    assert 'a' in cache and 'c' in cache
+    assert cache.size==80
+    assert cache.stats['evictions']==1
+    assert cache.hash('b') is None
+    assert cache.hash('a')==contentHash(b'a'*40)
+
+
+def test_lru_skips_images_over_budget():
+    cache=artCache(max_bytes=100)
+    cache.put('a', b'a'*40)
+    cache.put('huge', b'h'*200)
+    assert 'huge' not in cache
+    assert 'a' in cache
+
+
+def test_replacing_an_entry_keeps_size():
+    cache=artCache(max_bytes=100)
+    cache.put('a', b'a'*40)
+    cache.put('a', b'A'*60)
+    assert cache.size==60
+    assert cache.hash('a')==contentHash(b'A'*60)
+
+
+def test_miss_counts():
+    cache=artCache(max_bytes=100)
+    assert asyncio.run(cache.get('missing')) is None
+    assert cache.stats['misses']==1
+
+
+def test_disk_tier_survives_restart(tmp_path):
+    async def fill():
+        cache=artCache(log=logging.getLogger(), max_bytes=100, directory=str(tmp_path), max_disk_bytes=150)
+        cache.put('a', b'a'*60)
+        cache.put('b', b'b'*60)
+        cache.put('c', b'c'*60)
+        await cache.drain()
+        return cache
+
+    cache=asyncio.run(fill())
+    # the disk is trimmed oldest first to max_disk_bytes
+    assert cache.disk_size==120
+    assert len(os.listdir(str(tmp_path)))==2
+
+    reloaded=artCache(log=logging.getLogger(), max_bytes=100, directory=str(tmp_path), max_disk_bytes=150)
+    assert reloaded.hash('c') is None
+    assert asyncio.run(reloaded.get('c'))==b'c'*60
+    assert asyncio.run(reloaded.get('a')) is None
+    assert reloaded.stats['disk_hits']==1
+    assert reloaded.hash('c')==contentHash(b'c'*60)
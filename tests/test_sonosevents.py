@@ -0,0 +1,108 @@
+#!/usr/bin/python3
+
+# decodeEvent and coalesceEvents against the recorded NOTIFY bodies in benchmarks/payloads
+
+import sys, os
+sys.path.append(os.path.join(os.path.dirname(__file__),'..'))
+
+import asyncio
+import types
+
+from aiohttp import web
+
+import sonosevents
+from sonosevents import decodeEvent, coalesceEvents, channelValues, genaEvent, genaReceiver
+
+payloads=os.path.join(os.path.dirname(__file__), '..', 'benchmarks', 'payloads')
+
+
+def payload(name):
+    with open(os.path.join(payloads, name), 'rb') as payloadfile:
+        return payloadfile.read()
+
+
+def event(uid, service_id, variables, seq=0):
+    service=types.SimpleNamespace(soco=types.SimpleNamespace(uid=uid), service_id=service_id)
+    return genaEvent('uuid:%s' % uid, seq, service, 0, variables, True, {})
+
+
+def test_renderingcontrol_channels():
+    variables, elements=decodeEvent(payload('renderingcontrol.xml'))
+    assert isinstance(variables['volume'], channelValues)
+    assert variables['volume']=={'Master': '24', 'LF': '100', 'RF': '100'}
+    assert variables['mute']['Master']=='0'
+    assert variables['bass']=='2'
+    assert elements=={}
+
+
+def test_avtransport_track_metadata():
+    variables, elements=decodeEvent(payload('avtransport_track.xml'))
+    assert variables['transport_state']=='PLAYING'
+    assert variables['current_track_uri'].startswith('x-sonos-spotify:')
+    assert isinstance(variables['current_track_meta_data'], dict)
+
+
+def test_avtransport_radio_stream_content():
+    variables, elements=decodeEvent(payload('avtransport_radio.xml'))
+    assert variables['current_track_meta_data']['stream_content']=='ARTIST=The Cure|TITLE=Just Like Heaven'
+    assert variables['current_track_duration']==''
+
+
+def test_deviceproperties_plain_values():
+    variables, elements=decodeEvent(payload('deviceproperties.xml'))
+    assert variables['zone_name']=='Kitchen'
+    assert variables['invisible']=='0'
+    assert variables['channel_map_set'] is None
+
+
+def test_zonegrouptopology_keeps_elements():
+    variables, elements=decodeEvent(payload('zonegrouptopology.xml'))
+    assert 'zone_group_state' in elements
+    groups=variables['zone_group_state']['ZoneGroupState']['ZoneGroups']['ZoneGroup']
+    assert isinstance(groups, list) and groups
+    assert variables['zone_player_uui_ds_in_group'].split(',')[0]=='RINCON_000E58A0B10001400'
+
+
+def test_coalesce_merges_channels_and_keeps_latest():
+    first=event('RINCON_A', 'RenderingControl', {'volume': channelValues({'Master': '10', 'LF': '100'}), 'bass': '1'}, seq=1)
+    second=event('RINCON_A', 'RenderingControl', {'volume': channelValues({'Master': '20'}), 'bass': '2'}, seq=2)
+    other=event('RINCON_B', 'RenderingControl', {'bass': '5'}, seq=1)
+    merged=coalesceEvents([first, other, second])
+    assert len(merged)==2
+    kitchen=[item for item in merged if item.service.soco.uid=='RINCON_A'][0]
+    assert kitchen.variables['volume']=={'Master': '20', 'LF': '100'}
+    assert isinstance(kitchen.variables['volume'], channelValues)
+    assert kitchen.variables['bass']=='2'
+    assert kitchen.seq==2
+    # the original events are left alone
+    assert first.variables['volume']['Master']=='10'
+
+
+def notify(receiver, sid, seq=0):
+    async def read():
+        return payload('renderingcontrol.xml')
+    request=types.SimpleNamespace(headers={'SID': sid, 'SEQ': str(seq)}, read=read)
+    return asyncio.run(receiver.handleNotify(request))
+
+
+def test_orphan_events_are_capped_per_sid():
+    receiver=genaReceiver(app=web.Application())
+    for seq in range(10):
+        assert notify(receiver, 'uuid:stale', seq).status==200
+    assert [seq for body, seq, timestamp in receiver.orphans['uuid:stale']]==['0', '1', '2', '3']
+
+
+def test_orphan_sids_are_capped():
+    receiver=genaReceiver(app=web.Application())
+    for index in range(sonosevents.orphan_sids+5):
+        notify(receiver, 'uuid:sid%s' % index)
+    assert len(receiver.orphans)==sonosevents.orphan_sids
+    assert 'uuid:sid0' not in receiver.orphans
+
+
+def test_orphans_expire():
+    receiver=genaReceiver(app=web.Application())
+    notify(receiver, 'uuid:old')
+    receiver.orphans['uuid:old']=[(body, seq, timestamp-sonosevents.orphan_ttl-1) for body, seq, timestamp in receiver.orphans['uuid:old']]
+    notify(receiver, 'uuid:new')
+    assert list(receiver.orphans)==['uuid:new']
@@ -0,0 +1,80 @@
+#!/usr/bin/python3
+
+import sys, os
+sys.path.append(os.path.join(os.path.dirname(__file__),'..'))
+
+import asyncio
+import types
+
+from sonosmetrics import latencyHistogram, adapterMetrics, timedCommand, bucket_bounds
+
+
+def test_histogram_buckets():
+    histogram=latencyHistogram()
+    for seconds in [.0002, .0005, .003, .003, 20]:
+        histogram.observe(seconds)
+    assert histogram.count==5
+    assert histogram.max==20
+    # bounds are inclusive upper limits, anything past the last bound is counted in the overflow bucket
+    assert histogram.buckets[0]==2
+    assert histogram.buckets[bucket_bounds.index(.005)]==2
+    assert histogram.buckets[-1]==1
+
+
+def test_histogram_quantiles():
+    histogram=latencyHistogram()
+    assert histogram.quantile(.5)==0.0
+    for sample in range(99):
+        histogram.observe(.002)
+    histogram.observe(.3)
+    assert histogram.quantile(.5)==.0025
+    assert histogram.quantile(.99)==.0025
+    # the last bucket's bound is capped at the worst sample seen
+    assert histogram.quantile(1)==.3
+
+
+def test_summary_in_milliseconds():
+    histogram=latencyHistogram()
+    histogram.observe(.004)
+    summary=histogram.summary()
+    assert summary['count']==1
+    assert summary['mean_ms']==4.0
+    assert summary['max_ms']==4.0
+    assert summary['p50_ms']==4.0
+    assert summary['buckets']['le_5ms']==1
+    assert summary['buckets']['inf']==0
+    assert latencyHistogram().summary()['mean_ms']==0
+
+
+def test_snapshot_reads_gauges():
+    metrics=adapterMetrics()
+    metrics.gauge('depth', lambda: 3)
+    metrics.gauge('broken', lambda: 1/0)
+    with metrics.timer('cycle'):
+        pass
+    metrics.observe('cycle', .01)
+    snapshot=metrics.snapshot()
+    assert snapshot['gauges']=={'depth': 3, 'broken': None}
+    assert snapshot['stages']['cycle']['count']==2
+
+
+def test_timed_command_records_under_controller_name():
+
+    class SpeakerController(object):
+
+        def __init__(self):
+            self.adapter=types.SimpleNamespace(metrics=adapterMetrics())
+
+        @timedCommand
+        async def SetVolume(self, payload):
+            if payload is None:
+                raise ValueError('no payload')
+            return payload
+
+    controller=SpeakerController()
+    assert asyncio.run(controller.SetVolume(5))==5
+    try:
+        asyncio.run(controller.SetVolume(None))
+    except ValueError:
+        pass
+    assert controller.adapter.metrics.histograms['command.SpeakerController.SetVolume'].count==2
@@ -0,0 +1,80 @@
+#!/usr/bin/python3
+
+import sys, os
+sys.path.append(os.path.join(os.path.dirname(__file__),'..'))
+
+import asyncio
+
+from aiohttp import web
+from soco.exceptions import SoCoUPnPException, UnknownSoCoException
+
+from sonossoap import envelope, parseResponse, upnpFault, soapClient
+
+response='''<?xml version="1.0"?><s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/" s:encodingStyle="http://schemas.xmlsoap.org/soap/encoding/"><s:Body>%s</s:Body></s:Envelope>'''
+
+fault=response % ('<s:Fault><faultcode>s:Client</faultcode><faultstring>UPnPError</faultstring><detail>'
+                    '<UPnPError xmlns="urn:schemas-upnp-org:control-1-0"><errorCode>701</errorCode>'
+                    '<errorDescription>Transition not available</errorDescription></UPnPError></detail></s:Fault>')
+
+
+def test_parse_response_out_arguments():
+    body=response % ('<u:GetVolumeResponse xmlns:u="urn:schemas-upnp-org:service:RenderingControl:1">'
+                        '<CurrentVolume>24</CurrentVolume><Note>&lt;DIDL-Lite/&gt;</Note><Empty></Empty></u:GetVolumeResponse>')
+    assert parseResponse(body.encode('utf-8'))=={'CurrentVolume': '24', 'Note': '<DIDL-Lite/>', 'Empty': ''}
+
+
+def test_parse_response_without_out_arguments():
+    body=response % '<u:PlayResponse xmlns:u="urn:schemas-upnp-org:service:AVTransport:1"></u:PlayResponse>'
+    assert parseResponse(body.encode('utf-8'))=={}
+
+
+def test_parse_response_fault():
+    assert parseResponse(fault.encode('utf-8')) is None
+
+
+def test_upnp_fault_error_code():
+    error=upnpFault('10.0.0.1', fault.encode('utf-8'))
+    assert isinstance(error, SoCoUPnPException)
+    assert error.error_code=='701'
+    assert error.error_description=='Transition not available'
+    assert '10.0.0.1' in str(error)
+
+
+def test_upnp_fault_without_soap_body():
+    assert isinstance(upnpFault('10.0.0.1', b'<html>Not Found</html>'), UnknownSoCoException)
+    assert isinstance(upnpFault('10.0.0.1', b'not xml at all'), UnknownSoCoException)
+
+
+def test_envelope_render_escapes_values():
+    template=envelope('urn:schemas-upnp-org:service:AVTransport:1', 'SetAVTransportURI', ('InstanceID', 'CurrentURI', 'CurrentURIMetaData'))
+    body=template.render([0, 'x-file:a&b.mp3', '<DIDL-Lite id="1"/>']).decode('utf-8')
+    assert '<InstanceID>0</InstanceID>' in body
+    assert '<CurrentURI>x-file:a&amp;b.mp3</CurrentURI>' in body
+    assert '<CurrentURIMetaData>&lt;DIDL-Lite id="1"/&gt;</CurrentURIMetaData>' in body
+    assert template.headers['SOAPACTION']=='"urn:schemas-upnp-org:service:AVTransport:1#SetAVTransportURI"'
+    # built once per service, action and argument names
+    assert envelope('urn:schemas-upnp-org:service:AVTransport:1', 'SetAVTransportURI', ('InstanceID', 'CurrentURI', 'CurrentURIMetaData')) is template
+
+
+def test_call_reports_malformed_reply_as_soco_exception():
+    async def notSoap(request):
+        return web.Response(body=b'<notsoap/>')
+
+    async def call():
+        app=web.Application()
+        app.router.add_post('/control', notSoap)
+        runner=web.AppRunner(app)
+        await runner.setup()
+        site=web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        port=runner.addresses[0][1]
+        client=soapClient(port=port)
+        try:
+            await client.call('127.0.0.1', '/control', 'urn:schemas-upnp-org:service:AVTransport:1', 'Play', [('InstanceID', 0), ('Speed', 1)])
+        except UnknownSoCoException:
+            return client.stats['malformed']
+        finally:
+            await client.stop()
+            await runner.cleanup()
+
+    assert asyncio.run(call())==1
@@ -0,0 +1,130 @@
+#!/usr/bin/python3
+
+import sys, os
+sys.path.append(os.path.join(os.path.dirname(__file__),'..'))
+
+import types
+
+from sonostopology import zoneTopology, playerRegistry
+
+state='''<ZoneGroupState><ZoneGroups>
+<ZoneGroup Coordinator="RINCON_A" ID="RINCON_A:1">
+  <ZoneGroupMember UUID="RINCON_A" ZoneName="Kitchen" Location="http://10.0.0.1:1400/xml/device_description.xml"/>
+  <ZoneGroupMember UUID="RINCON_B" ZoneName="Dining" Location="http://10.0.0.2:1400/xml/device_description.xml"/>
+  <ZoneGroupMember UUID="RINCON_S" ZoneName="Kitchen" Invisible="1" Location="http://10.0.0.9:1400/xml/device_description.xml"/>
+</ZoneGroup>
+<ZoneGroup Coordinator="RINCON_C" ID="RINCON_C:2">
+  <ZoneGroupMember UUID="RINCON_C" ZoneName="Office" Location="http://10.0.0.3:1400/xml/device_description.xml"/>
+</ZoneGroup>
+</ZoneGroups></ZoneGroupState>'''
+
+
+def player(uid, ip):
+    return types.SimpleNamespace(uid=uid, ip_address=ip, speaker_info={})
+
+
+def registry():
+    topology=zoneTopology()
+    topology.update(state)
+    players=playerRegistry(topology)
+    players.set([player('RINCON_A', '10.0.0.1'), player('RINCON_B', '10.0.0.2'), player('RINCON_C', '10.0.0.3')])
+    return players
+
+
+def test_update_reports_changes():
+    topology=zoneTopology()
+    assert topology.update(state)
+    assert not topology.update(state)
+    assert topology.update(state.replace('ZoneName="Office"', 'ZoneName="Study"'))
+
+
+def test_groups_and_visibility():
+    topology=zoneTopology()
+    topology.update(state)
+    assert topology.groupInfo('RINCON_B')=={'members': ['RINCON_A', 'RINCON_B', 'RINCON_S'], 'coordinator': 'RINCON_A'}
+    assert topology.coordinator('RINCON_C')=='RINCON_C'
+    assert topology.visible('RINCON_S') is False
+    assert topology.visible('RINCON_A') is True
+    assert topology.visible('RINCON_X') is None
+    assert topology.groupInfo('RINCON_X') is None
+    # the invisible satellite is left out of the label
+    assert topology.shortLabel('RINCON_A')=='Dining + 1'
+
+
+# the shape real home theatre rooms send, with the sub and surrounds nested in the room's member
+home_theatre='''<ZoneGroupState><ZoneGroups>
+<ZoneGroup Coordinator="RINCON_TV" ID="RINCON_TV:7">
+  <ZoneGroupMember UUID="RINCON_TV" ZoneName="Living Room" Location="http://10.0.0.20:1400/xml/device_description.xml"
+                   HTSatChanMapSet="RINCON_TV:LF,RF;RINCON_SUB:SW;RINCON_SL:LR;RINCON_SR:RR">
+    <Satellite UUID="RINCON_SUB" ZoneName="Living Room" Location="http://10.0.0.21:1400/xml/device_description.xml"
+               HTSatChanMapSet="RINCON_TV:LF,RF;RINCON_SUB:SW;RINCON_SL:LR;RINCON_SR:RR" Invisible="1"/>
+    <Satellite UUID="RINCON_SL" ZoneName="Living Room" Location="http://10.0.0.22:1400/xml/device_description.xml"
+               HTSatChanMapSet="RINCON_TV:LF,RF;RINCON_SUB:SW;RINCON_SL:LR;RINCON_SR:RR" Invisible="1"/>
+    <Satellite UUID="RINCON_SR" ZoneName="Living Room" Location="http://10.0.0.23:1400/xml/device_description.xml"
+               HTSatChanMapSet="RINCON_TV:LF,RF;RINCON_SUB:SW;RINCON_SL:LR;RINCON_SR:RR"/>
+  </ZoneGroupMember>
+</ZoneGroup>
+</ZoneGroups></ZoneGroupState>'''
+
+
+def test_satellites_are_invisible_group_members():
+    topology=zoneTopology()
+    topology.update(home_theatre)
+    assert topology.groupInfo('RINCON_TV')=={'members': ['RINCON_TV', 'RINCON_SUB', 'RINCON_SL', 'RINCON_SR'], 'coordinator': 'RINCON_TV'}
+    # satellites are never rooms, whether or not the element carries Invisible
+    for uid in ('RINCON_SUB', 'RINCON_SL', 'RINCON_SR'):
+        assert topology.visible(uid) is False
+        assert topology.coordinator(uid)=='RINCON_TV'
+    assert topology.visible('RINCON_TV') is True
+    assert topology.shortLabel('RINCON_SUB')=='Living Room'
+
+
+def test_registry_lookups():
+    players=registry()
+    assert players.byName('Office').uid=='RINCON_C'
+    assert players.find('sonos:player:RINCON_B').uid=='RINCON_B'
+    assert players.find('Kitchen').uid=='RINCON_A'
+    assert players.coordinator(players.get('RINCON_B')).uid=='RINCON_A'
+    assert players.find('Garage') is None
+
+
+def test_registry_name_falls_back_without_topology():
+    players=playerRegistry()
+    unknown=player('RINCON_Z', '10.0.0.26')
+    assert players.name(unknown)=='10.0.0.26'
+    unknown.speaker_info['zone_name']='Porch'
+    assert players.name(unknown)=='Porch'
+
+
+def test_partition_whole_groups():
+    players=registry()
+    coordinators, singles=players.partition([players.get('RINCON_A'), players.get('RINCON_B'), players.get('RINCON_C')])
+    assert [player.uid for player in coordinators]==['RINCON_A', 'RINCON_C']
+    assert singles==[]
+
+
+def test_partition_part_of_a_group():
+    players=registry()
+    coordinators, singles=players.partition([players.get('RINCON_B')])
+    assert coordinators==[]
+    assert [player.uid for player in singles]==['RINCON_B']
+
+
+def test_group_members_are_visible_players():
+    players=registry()
+    assert [player.uid for player in players.groupMembers(players.get('RINCON_B'))]==['RINCON_A', 'RINCON_B']
+    assert [player.uid for player in players.groupMembers(players.get('RINCON_C'))]==['RINCON_C']
+
+
+def test_satellite_never_replaces_the_room_name():
+    topology=zoneTopology()
+    topology.update(home_theatre)
+    players=playerRegistry(topology)
+    room=player('RINCON_TV', '10.0.0.20')
+    sub=player('RINCON_SUB', '10.0.0.21')
+    players.add(room)
+    players.add(sub)
+    assert players.find('Living Room') is room
+    players.refresh()
+    assert players.find('Living Room') is room
+    assert not players.isVisible(sub)